@@ -0,0 +1,61 @@
+import math
+import random
+
+SUBJECTS = ['语文', '数学', '英语', '物理', '化学', '生物', '历史', '地理', '政治', '体育', '音乐', '美术']
+DAYS = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+PERIODS_PER_DAY = 12
+# Lessons a class has per week, so the generated grid looks like a real school
+LESSONS_PER_CLASS = 40
+
+def _period_times(period):
+    """Start and end time of a period (45 minute lessons, 10 minute breaks from 08:00)"""
+    start = 8 * 60 + (period - 1) * 55
+    end = start + 45
+    return f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+
+def generate_courses(count, teachers=None, classes=None, rooms=None, conflict_density=0.0,
+                     notes_length=0, seed=0):
+    """Generate a synthetic school timetable of count courses
+
+    Classes default to count / 40 (40 lessons a week each), teachers and rooms to
+    enough for a conflict-free timetable. conflict_density is the fraction of
+    courses moved onto the teacher or room of another course in the same slot,
+    notes_length the length of the 备注 text of every course.
+    """
+    rng = random.Random(seed)
+    classes = classes or max(1, math.ceil(count / LESSONS_PER_CLASS))
+    teachers = teachers or max(1, math.ceil(classes * 1.2))
+    rooms = rooms or classes
+    slots = [(day, period) for day in DAYS for period in range(1, PERIODS_PER_DAY + 1)]
+
+    courses = []
+    by_slot = {}
+    for index in range(count):
+        class_index = index % classes
+        # Each class gets its lessons in distinct slots spread over the week (5 is coprime to 84)
+        slot_index = (index // classes * 5 + class_index) % len(slots)
+        day, period = slots[slot_index]
+        start_time, end_time = _period_times(period)
+        # Distinct per slot as long as there are at least as many teachers/rooms as classes
+        course = {
+            '课程名称': SUBJECTS[(class_index + index // classes) % len(SUBJECTS)],
+            '教师': f"教师{(class_index + slot_index) % teachers}",
+            '班级': f"{class_index + 1}班",
+            '地点': f"教室{(class_index + slot_index) % rooms}",
+            '星期': day,
+            '节次': period,
+            '开始时间': start_time,
+            '结束时间': end_time,
+            '备注': ''.join(rng.choice('注意事项需要携带课本实验器材') for _ in range(notes_length))
+        }
+        courses.append(course)
+        by_slot.setdefault((day, period), []).append(course)
+
+    # Introduce conflicts by sharing the teacher or room of another course in the same slot
+    for course in rng.sample(courses, int(count * conflict_density)):
+        neighbours = by_slot[(course['星期'], course['节次'])]
+        if len(neighbours) > 1:
+            other = rng.choice(neighbours)
+            field = rng.choice(['教师', '地点'])
+            course[field] = other[field]
+    return courses
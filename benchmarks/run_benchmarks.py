@@ -0,0 +1,192 @@
+"""Benchmarks for conflict detection, Excel/Word/PNG/PDF export and Excel import at school scale
+
+Usage (from the repository root):
+
+    python benchmarks/run_benchmarks.py --sizes 100,1000,10000 --output results.json
+    python benchmarks/run_benchmarks.py --compare old.json --output new.json
+
+Each case is timed over --repeat runs (median latency and throughput) and run
+once more under tracemalloc for the peak memory. Results are written as JSON so
+runs of different releases can be diffed. Cases that cannot run on this host
+(PNG/PDF without a Chinese font) are recorded as skipped.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_courses
+from services.batch_export_service import group_courses, unique_sheet_names
+from services.conflict_service import detect_conflicts
+from services.excel_export_service import ExcelExportService
+from services.image_export_service import FontUnavailable, ImageExportService, require_font
+from services.import_service import ExcelImportService
+from services.word_export_service import WordExportService
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+# Cases rendering text with the Chinese font
+FONT_CASES = ('png_per_class', 'pdf_per_class')
+
+def _class_sheets(courses):
+    """One (sheet name, courses, title) per class, as the whole-school export builds them"""
+    groups = group_courses(courses, 'class')
+    return [(sheet_name, group, f"{name}课程表")
+            for sheet_name, (name, group) in zip(unique_sheet_names(groups), groups.items())]
+
+def _export_each_class(create_export, courses):
+    """Render one file per class, the work of a per-class batch export"""
+    for name, group in group_courses(courses, 'class').items():
+        create_export({'courses': group, 'title': f"{name}课程表"})
+
+def _workbook_bytes(courses):
+    return b''.join(ExcelExportService().iter_excel_stream(_class_sheets(courses)))
+
+def build_cases(courses):
+    """Benchmark name -> (setup returning the argument, function to measure)"""
+    excel = ExcelExportService()
+    word = WordExportService()
+    image = ImageExportService()
+    importer = ExcelImportService()
+    return {
+        'conflicts_slot': (lambda: courses, lambda data: detect_conflicts(data, 'slot')),
+        'conflicts_all': (lambda: courses, lambda data: detect_conflicts(data, 'all')),
+        'excel_per_class': (lambda: courses, lambda data: _export_each_class(excel.create_excel_export, data)),
+        'excel_workbook_stream': (lambda: courses, _workbook_bytes),
+        'word_per_class': (lambda: courses, lambda data: _export_each_class(word.create_word_export, data)),
+        'png_per_class': (lambda: courses, lambda data: _export_each_class(image.create_image_export, data)),
+        'pdf_per_class': (lambda: courses, lambda data: _export_each_class(image.create_pdf_export, data)),
+        'import_workbook': (lambda: _workbook_bytes(courses),
+                            lambda content: importer.parse_workbook(io.BytesIO(content), 'class'))
+    }
+
+def measure(setup, function, repeat):
+    """Median wall time over repeat runs, then peak traced memory of one more run"""
+    argument = setup()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(timings), min(timings), peak
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def skipped_cases():
+    """Case name -> reason for the cases this host cannot run"""
+    try:
+        require_font()
+    except FontUnavailable as e:
+        return dict.fromkeys(FONT_CASES, str(e))
+    return {}
+
+def run(sizes, benchmarks, repeat, conflict_density, notes_length, seed, teachers=None, classes=None, rooms=None):
+    results = []
+    skipped = skipped_cases()
+    for size in sizes:
+        courses = generate_courses(size, teachers=teachers, classes=classes, rooms=rooms,
+                                   conflict_density=conflict_density, notes_length=notes_length, seed=seed)
+        cases = build_cases(courses)
+        for name in benchmarks:
+            if name in skipped:
+                results.append({'benchmark': name, 'courses': size, 'skipped': skipped[name]})
+                print(f"{name:<24}{size:>8} courses  skipped: {skipped[name]}", flush=True)
+                continue
+            setup, function = cases[name]
+            median, best, peak = measure(setup, function, repeat)
+            result = {
+                'benchmark': name,
+                'courses': size,
+                'median_seconds': round(median, 6),
+                'min_seconds': round(best, 6),
+                'courses_per_second': round(size / median, 1) if median else None,
+                'peak_memory_bytes': peak
+            }
+            results.append(result)
+            print(f"{name:<24}{size:>8} courses  {median * 1000:>10.1f} ms  "
+                  f"{result['courses_per_second'] or 0:>12.0f} courses/s  {peak / 1048576:>8.1f} MiB", flush=True)
+    return results
+
+def compare(results, baseline_file):
+    """Print the latency and memory ratio of each case against a previous result file"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r['benchmark'], r['courses']): r for r in json.load(f)['results']}
+    print(f"\nCompared with {baseline_file} (ratio > 1 means slower / more memory):")
+    for result in results:
+        old = baseline.get((result['benchmark'], result['courses']))
+        if 'skipped' in result or not old or not old.get('median_seconds'):
+            continue
+        time_ratio = result['median_seconds'] / old['median_seconds']
+        memory_ratio = result['peak_memory_bytes'] / old['peak_memory_bytes'] if old['peak_memory_bytes'] else 0
+        print(f"{result['benchmark']:<24}{result['courses']:>8} courses  time x{time_ratio:.2f}  memory x{memory_ratio:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma separated course counts, e.g. 100,1000,10000,100000')
+    parser.add_argument('--benchmarks', default=None,
+                        help='comma separated benchmark names (default: all)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--conflict-density', type=float, default=0.02)
+    parser.add_argument('--notes-length', type=int, default=8)
+    parser.add_argument('--teachers', type=int, default=None, help='teacher count (default: 1.2 per class)')
+    parser.add_argument('--classes', type=int, default=None, help='class count (default: one per 40 courses)')
+    parser.add_argument('--rooms', type=int, default=None, help='room count (default: one per class)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='previous result file to compare with')
+    args = parser.parse_args()
+
+    available = list(build_cases([]))
+    benchmarks = args.benchmarks.split(',') if args.benchmarks else available
+    unknown = [name for name in benchmarks if name not in available]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)} (available: {', '.join(available)})")
+
+    results = run([int(size) for size in args.sizes.split(',')], benchmarks, args.repeat,
+                  args.conflict_density, args.notes_length, args.seed, args.teachers, args.classes, args.rooms)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'conflict_density': args.conflict_density,
+            'notes_length': args.notes_length,
+            'teachers': args.teachers,
+            'classes': args.classes,
+            'rooms': args.rooms,
+            'seed': args.seed
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 # Color mapping rules (based on requirements analysis report)
 COLOR_MAP = {
    
@@ -52,7 +55,139 @@ FLASK_CONFIG = {
     'template_folder': 'templates'
 }
 
+# Timetable grid: 7 days x 12 periods (上午 1-4, 下午 5-8, 晚自习 9-12)
+GRID_CONFIG = {
+    'days': ['周一', '周二', '周三', '周四', '周五', '周六', '周日'],
+    'periods_per_day': 12
+}
+
 # Export configuration
 EXPORT_CONFIG = {
-    'default_title': '课程表'
-}
\ No newline at end of file
+    'default_title': '课程表',
+    # Worker processes for batch exports (None = CPU count)
+    'batch_workers': None,
+    # Chunk size of streamed workbooks
+    'stream_chunk_size': 64 * 1024
+}
+
+# Course store configuration (SQLite database in WAL mode)
+DATABASE_CONFIG = {
+    'path': os.environ.get('SCHEDULE_DB_PATH', 'schedule.db'),
+    'timeout': 30
+}
+
+# Automatic timetable solver configuration
+SOLVER_CONFIG = {
+    # Slots used when a requirement does not restrict days/periods
+    'default_days': ['周一', '周二', '周三', '周四', '周五'],
+    'default_periods': [1, 2, 3, 4, 5, 6, 7, 8],
+    # Search time budget in seconds
+    'time_limit': 10,
+    'max_time_limit': 60,
+    # Iterations a (lesson, slot) move stays forbidden after an eviction
+    'tabu_tenure': 20,
+    # Portfolio mode: worker processes (None = CPU count) and upper bound on them
+    'workers': None,
+    'max_workers': 32
+}
+
+# PNG/PDF timetable rendering (Pillow)
+IMAGE_EXPORT_CONFIG = {
+    # A font with Chinese glyphs; the first existing candidate is used when not set
+    'font_path': os.environ.get('SCHEDULE_FONT_PATH'),
+    'font_candidates': [
+        'C:/Windows/Fonts/msyh.ttc',
+        'C:/Windows/Fonts/simhei.ttf',
+        '/System/Library/Fonts/PingFang.ttc',
+        '/System/Library/Fonts/STHeiti Medium.ttc',
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+        '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+        '/usr/share/fonts/truetype/arphic/uming.ttc'
+    ],
+    # Pixels per layout unit: 2 matches the html2canvas export, PDF pages are 72 units per inch
+    'scale': 2
+}
+
+# JSON API responses: compression and cached serialised course lists
+RESPONSE_CONFIG = {
+    # Smaller bodies are sent uncompressed
+    'compress_min_bytes': 1024,
+    'gzip_level': 6,
+    # Used when the optional brotli package is installed
+    'brotli_quality': 5,
+    # Serialised / compressed course list bodies kept per process
+    'body_cache_entries': 16
+}
+
+# Live change feed (/api/courses/stream, Server-Sent Events), per worker process
+CHANGE_FEED_CONFIG = {
+    # Seconds between two checks of the store revision (one query per process, not per client)
+    'poll_interval': 0.25,
+    # Seconds between keep-alive comments on an idle stream
+    'keepalive': 15,
+    # Recent revisions kept encoded for reconnecting clients
+    'history': 1024,
+    # Revisions queued for a slow client before its stream is closed (it resumes from the change log)
+    'subscriber_buffer': 256,
+    # Streams per process. Every open stream parks one thread of the threaded Werkzeug
+    # worker for its whole lifetime (the fan-out avoids per-client queries, not
+    # per-client threads), so this also bounds the threads streams can take
+    'max_subscribers': int(os.environ.get('SCHEDULE_STREAM_MAX_SUBSCRIBERS', 64)),
+    # Reconnect delay sent to EventSource clients, in milliseconds
+    'retry_ms': 3000
+}
+
+# Rendered export cache (LRU in memory, optionally spilled to disk)
+EXPORT_CACHE_CONFIG = {
+    'max_entries': 256,
+    'max_bytes': 64 * 1024 * 1024,
+    'disk_dir': os.environ.get('SCHEDULE_EXPORT_CACHE_DIR'),
+    'disk_max_bytes': 512 * 1024 * 1024
+}
+
+# Background export jobs: rendered files and job state live in a directory shared by all worker processes
+EXPORT_JOB_CONFIG = {
+    'dir': os.environ.get('SCHEDULE_EXPORT_JOB_DIR', os.path.join(tempfile.gettempdir(), 'schedule_export_jobs')),
+    # Render threads per process
+    'workers': 2,
+    # Queued + running jobs per process before new jobs are refused
+    'max_pending': 16,
+    # Seconds a finished (or failed) job and its file are kept
+    'ttl': 3600,
+    # Minimum seconds between two progress writes of a job
+    'progress_interval': 0.5
+}
+
+# Usage statistics: counter snapshot plus an append-only event log
+STATISTICS_CONFIG = {
+    'path': os.environ.get('SCHEDULE_STATS_PATH', 'statistics.json'),
+    'event_log': os.environ.get('SCHEDULE_STATS_EVENT_LOG', 'statistics.events.ndjson'),
+    # Pending events are flushed after this many seconds or once this many are queued
+    'flush_interval': 5,
+    'flush_size': 100,
+    # Buckets kept per rollup granularity (None = forever)
+    'rollup_retention': {'minute': 24 * 60, 'hour': 90 * 24, 'day': None},
+    # The event log is compacted into the rollups once it grows past this size
+    'max_log_bytes': 4 * 1024 * 1024,
+    # Upper bound on the buckets returned by one range query
+    'max_range_points': 5000
+}
+
+# /metrics of the preforked server: worker snapshots are merged through a shared directory
+METRICS_CONFIG = {
+    'dir': os.environ.get('SCHEDULE_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'schedule_metrics')),
+    # Seconds between two snapshot writes of a worker
+    'sync_interval': 5
+}
+
+# Production launcher (serve.py): one preloaded master forking worker processes
+SERVER_CONFIG = {
+    'host': os.environ.get('SCHEDULE_HOST', '0.0.0.0'),
+    'port': int(os.environ.get('SCHEDULE_PORT', 5000)),
+    # Worker processes (None = CPU count), each serving requests with threads
+    'workers': int(os.environ['SCHEDULE_WORKERS']) if os.environ.get('SCHEDULE_WORKERS') else None,
+    'backlog': 128
+}
@@ -1,20 +1,681 @@
-from flask import jsonify
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from config import DATABASE_CONFIG
+from services.conflict_service import ConflictIndex
 
-# Global variable to store course data
-courses_data_store = []
+# Courses are persisted in SQLite (WAL mode) so that readers never wait for writers.
+# The full course record is kept as JSON, the columns below only exist for the indexes.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    teacher TEXT,
+    class_name TEXT,
+    location TEXT,
+    day TEXT,
+    period INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_courses_teacher ON courses (teacher);
+CREATE INDEX IF NOT EXISTS idx_courses_class ON courses (class_name);
+CREATE INDEX IF NOT EXISTS idx_courses_location ON courses (location);
+CREATE INDEX IF NOT EXISTS idx_courses_slot ON courses (day, period);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('revision', 0);
+-- History: the courses at the history base revision plus an append-only log of every
+-- insert/update/delete since, so any revision can be rebuilt without full copies
+CREATE TABLE IF NOT EXISTS course_base (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS course_changes (
+    seq INTEGER PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    course_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_changes_revision ON course_changes (revision);
+CREATE INDEX IF NOT EXISTS idx_changes_course ON course_changes (course_id, revision);
+CREATE TABLE IF NOT EXISTS revisions (
+    revision INTEGER PRIMARY KEY,
+    created TEXT NOT NULL,
+    inserted INTEGER NOT NULL,
+    updated INTEGER NOT NULL,
+    deleted INTEGER NOT NULL
+);
+"""
+
+# Change log operations
+CHANGE_OPS = ('insert', 'update', 'delete')
+
+# Query filter name -> indexed column
+_FILTER_COLUMNS = {
+    'teacher': 'teacher',
+    'class_name': 'class_name',
+    'location': 'location',
+    'day': 'day',
+    'period': 'period'
+}
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_schema_lock = threading.Lock()
+_schema_ready = False
+_conflict_index = None
+# Store revision the conflict index reflects (None = rebuild on next use)
+_index_revision = None
+
+def _get_connection():
+    """Get the SQLite connection of the current thread"""
+    global _schema_ready
+    conn = getattr(_local, 'connection', None)
+    # A connection inherited through fork() must not be used by the child
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DATABASE_CONFIG['path'], timeout=DATABASE_CONFIG['timeout'],
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with _schema_lock:
+            if not _schema_ready:
+                conn.executescript(_SCHEMA)
+                _init_history(conn)
+                _schema_ready = True
+        _local.connection = conn
+        _local.pid = os.getpid()
+    return conn
+
+def _init_history(conn):
+    """Start the history at the current revision (a store created before the change log keeps its courses as base)"""
+    if conn.execute("SELECT 1 FROM store_meta WHERE key = 'history_base'").fetchone():
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if not conn.execute("SELECT 1 FROM store_meta WHERE key = 'history_base'").fetchone():
+            conn.execute('INSERT INTO course_base (id, data) SELECT id, data FROM courses')
+            conn.execute("INSERT INTO store_meta (key, value) SELECT 'history_base', value FROM store_meta WHERE key = 'revision'")
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+def _store_revision(conn):
+    """Get the store revision, bumped by every write transaction of any process"""
+    return conn.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()[0]
+
+def _refresh_conflict_index(conn):
+    """Rebuild the conflict index in place if the store changed behind it (caller holds _write_lock)
+
+    Worker processes share the database but each has its own index, a revision
+    other than the one the index reflects means another process wrote.
+    """
+    global _conflict_index, _index_revision
+    # Read the revision before the courses, a write in between only causes another rebuild
+    revision = _store_revision(conn)
+    if _conflict_index is None:
+        _conflict_index = ConflictIndex()
+    if _index_revision != revision:
+        rows = conn.execute('SELECT id, data FROM courses ORDER BY id').fetchall()
+        _conflict_index.rebuild([_row_to_course(row) for row in rows])
+        _index_revision = revision
+    return _conflict_index
+
+class _ChangeLog:
+    """Course changes of one write transaction, logged under a new revision on commit"""
+
+    def __init__(self):
+        self.entries = []
+        # Revision created by the transaction, None if it changed nothing
+        self.revision = None
+
+    def record(self, course_id, op, data=None):
+        """Record an insert/update (data is the stored JSON) or a delete"""
+        self.entries.append((course_id, op, data))
+
+@contextmanager
+def _write_transaction():
+    """Run writes in a single immediate transaction (one writer at a time, readers are not blocked)
+
+    Yields (connection, change log). Writers record every course they touch; a
+    transaction that recorded nothing is rolled back and creates no revision.
+    """
+    global _index_revision
+    conn = _get_connection()
+    changes = _ChangeLog()
+    with _write_lock:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            _refresh_conflict_index(conn)
+            yield conn, changes
+            if changes.entries:
+                conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'revision'")
+                revision = _store_revision(conn)
+                conn.executemany(
+                    'INSERT INTO course_changes (revision, course_id, op, data) VALUES (?, ?, ?, ?)',
+                    [(revision,) + entry for entry in changes.entries]
+                )
+                counts = {op: 0 for op in CHANGE_OPS}
+                for _, op, _ in changes.entries:
+                    counts[op] += 1
+                conn.execute(
+                    'INSERT INTO revisions (revision, created, inserted, updated, deleted) VALUES (?, ?, ?, ?, ?)',
+                    (revision, datetime.now().isoformat(timespec='seconds'),
+                     counts['insert'], counts['update'], counts['delete'])
+                )
+        except Exception:
+            conn.execute('ROLLBACK')
+            # The index may hold changes of the rolled back transaction
+            _index_revision = None
+            raise
+        if changes.entries:
+            conn.execute('COMMIT')
+            _index_revision = changes.revision = revision
+        else:
+            conn.execute('ROLLBACK')
+
+@contextmanager
+def _read_transaction():
+    """Run reads against one consistent snapshot of the store"""
+    conn = _get_connection()
+    conn.execute('BEGIN')
+    try:
+        yield conn
+    finally:
+        conn.execute('COMMIT')
+
+def get_conflict_index():
+    """Get the conflict index of the stored courses (built on first use, rebuilt after writes of other processes)"""
+    conn = _get_connection()
+    if _conflict_index is None or _index_revision != _store_revision(conn):
+        with _write_lock:
+            _refresh_conflict_index(conn)
+    return _conflict_index
+
+def _to_period(value):
+    """Normalize the period (节次) to an integer for indexing"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _index_values(course_data):
+    """Extract the indexed column values from a course"""
+    return (
+        course_data.get('教师') or None,
+        course_data.get('班级') or None,
+        course_data.get('地点') or None,
+        course_data.get('星期') or None,
+        _to_period(course_data.get('节次')),
+        json.dumps({k: v for k, v in course_data.items() if k != 'id'}, ensure_ascii=False)
+    )
+
+def _row_to_course(row):
+    """Convert a database row (id, data) to a course dictionary"""
+    course = json.loads(row[1])
+    course['id'] = row[0]
+    return course
+
+def _course_json(course_id, data):
+    """Serialise a stored course with its id by splicing the stored JSON, without decoding it"""
+    if data == '{}':
+        return f'{{"id": {course_id}}}'
+    return f'{{"id": {course_id}, {data[1:]}'
 
 def get_all_courses():
     """Get all courses"""
-    return courses_data_store
+    rows = _get_connection().execute('SELECT id, data FROM courses ORDER BY id').fetchall()
+    return [_row_to_course(row) for row in rows]
+
+def get_all_courses_json():
+    """Get (revision, JSON array of all courses) from one snapshot"""
+    with _read_transaction() as conn:
+        revision = _store_revision(conn)
+        rows = conn.execute('SELECT id, data FROM courses ORDER BY id').fetchall()
+    return revision, '[' + ', '.join(_course_json(*row) for row in rows) + ']'
+
+def get_course(course_id):
+    """Get a course by id"""
+    row = _get_connection().execute('SELECT id, data FROM courses WHERE id = ?', (course_id,)).fetchone()
+    return _row_to_course(row) if row else None
+
+def query_courses(teacher=None, class_name=None, location=None, day=None, period=None):
+    """Get the courses matching all given filters (uses the secondary indexes)"""
+    if period is not None and _to_period(period) is None:
+        raise ValueError(f"节次格式错误: {period}")
+    filters = {'teacher': teacher, 'class_name': class_name, 'location': location,
+               'day': day, 'period': _to_period(period) if period is not None else None}
+    clauses = []
+    params = []
+    for name, value in filters.items():
+        if value is not None:
+            clauses.append(f"{_FILTER_COLUMNS[name]} = ?")
+            params.append(value)
+    sql = 'SELECT id, data FROM courses'
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    rows = _get_connection().execute(sql + ' ORDER BY id', params).fetchall()
+    return [_row_to_course(row) for row in rows]
+
+def get_courses_by_teacher(teacher):
+    """Get courses of a teacher"""
+    return query_courses(teacher=teacher)
+
+def get_courses_by_class(class_name):
+    """Get courses of a class"""
+    return query_courses(class_name=class_name)
+
+def get_courses_by_location(location):
+    """Get courses held at a location"""
+    return query_courses(location=location)
+
+def get_courses_by_slot(day, period):
+    """Get courses at a (day, period) slot"""
+    return query_courses(day=day, period=period)
 
 def add_course(course_data):
     """Add a course"""
     try:
-        courses_data_store.append(course_data)
-        return {"success": True, "message": "课程添加成功"}
+        if not isinstance(course_data, dict):
+            raise ValueError("课程数据格式错误")
+        index = get_conflict_index()
+        values = _index_values(course_data)
+        with _write_transaction() as (conn, changes):
+            cursor = conn.execute(
+                'INSERT INTO courses (teacher, class_name, location, day, period, data) VALUES (?, ?, ?, ?, ?, ?)',
+                values
+            )
+            course = dict(course_data, id=cursor.lastrowid)
+            changes.record(course['id'], 'insert', values[-1])
+            conflicts = index.add(course['id'], course)
+        return {"success": True, "message": "课程添加成功", "id": course['id'], "conflicts": conflicts,
+                "revision": changes.revision}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+def _to_course_id(value):
+    """Normalize a course id given in a request"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的课程ID: {value}")
+
+def _missing_ids(conn, course_ids):
+    """Get the ids that do not exist in the store"""
+    missing = set(course_ids)
+    ids = list(missing)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT id FROM courses WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        missing.difference_update(row[0] for row in rows)
+    return sorted(missing)
+
+def apply_batch(create=None, update=None, delete=None, replace=False):
+    """Create, update and delete many courses atomically in one transaction
+
+    The whole batch is validated before anything is written. The conflicts
+    returned are those at the slots of the created and updated courses.
+    """
+    try:
+        create = create or []
+        update = update or []
+        delete = delete or []
+        if not all(isinstance(items, list) for items in (create, update, delete)):
+            raise ValueError("批量操作数据格式错误")
+        if not all(isinstance(course_data, dict) for course_data in create + update):
+            raise ValueError("课程数据格式错误")
+        update_ids = [_to_course_id(course_data.get('id')) for course_data in update]
+        delete_ids = [_to_course_id(course_id) for course_id in delete]
+        touched_ids = update_ids + delete_ids
+        if len(set(touched_ids)) != len(touched_ids):
+            raise ValueError("同一课程在批量操作中出现了多次")
+        if replace and touched_ids:
+            raise ValueError("替换模式下只能新增课程")
+
+        index = get_conflict_index()
+        with _write_transaction() as (conn, changes):
+            missing = _missing_ids(conn, touched_ids)
+            if missing:
+                raise ValueError(f"课程不存在: {', '.join(map(str, missing[:20]))}")
+            if replace:
+                for (course_id,) in conn.execute('SELECT id FROM courses ORDER BY id').fetchall():
+                    changes.record(course_id, 'delete')
+                conn.execute('DELETE FROM courses')
+            # One writer holds the transaction, so new ids can be allocated up front
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'courses'").fetchone()
+            next_id = (row[0] if row else 0) + 1
+            created = [dict(course_data, id=next_id + i) for i, course_data in enumerate(create)]
+            updated = [dict(course_data, id=course_id) for course_data, course_id in zip(update, update_ids)]
+            if delete_ids:
+                conn.executemany('DELETE FROM courses WHERE id = ?', [(course_id,) for course_id in delete_ids])
+                for course_id in delete_ids:
+                    changes.record(course_id, 'delete')
+            if updated:
+                rows = [_index_values(course) + (course['id'],) for course in updated]
+                conn.executemany(
+                    'UPDATE courses SET teacher = ?, class_name = ?, location = ?, day = ?, period = ?, data = ? WHERE id = ?',
+                    rows
+                )
+                for row in rows:
+                    changes.record(row[-1], 'update', row[-2])
+            if created:
+                rows = [(course['id'],) + _index_values(course) for course in created]
+                conn.executemany(
+                    'INSERT INTO courses (id, teacher, class_name, location, day, period, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                for row in rows:
+                    changes.record(row[0], 'insert', row[-1])
+
+            if replace:
+                index.rebuild(created)
+                conflicts = index.conflicts()
+            else:
+                with index.lock:
+                    for course_id in delete_ids:
+                        index.remove(course_id)
+                    for course in updated + created:
+                        index.add(course['id'], course)
+                    conflicts = index.conflicts_of(updated + created)
+        return {
+            "success": True,
+            "message": f"批量操作成功：新增{len(created)}门，更新{len(updated)}门，删除{len(delete_ids)}门",
+            "ids": [course['id'] for course in created],
+            "created": len(created),
+            "updated": len(updated),
+            "deleted": len(delete_ids),
+            "conflicts": conflicts,
+            "revision": changes.revision
+        }
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+def add_courses(courses, replace=False):
+    """Add many courses in one transaction, optionally replacing all stored courses"""
+    return apply_batch(create=courses, replace=replace)
+
+def update_course(course_id, course_data):
+    """Update a course"""
+    try:
+        if not isinstance(course_data, dict):
+            raise ValueError("课程数据格式错误")
+        index = get_conflict_index()
+        values = _index_values(course_data)
+        with _write_transaction() as (conn, changes):
+            cursor = conn.execute(
+                'UPDATE courses SET teacher = ?, class_name = ?, location = ?, day = ?, period = ?, data = ? WHERE id = ?',
+                values + (course_id,)
+            )
+            if cursor.rowcount == 0:
+                return {"success": False, "message": "课程不存在"}
+            changes.record(course_id, 'update', values[-1])
+            conflicts = index.update(course_id, dict(course_data, id=course_id))
+        return {"success": True, "message": "课程更新成功", "conflicts": conflicts, "revision": changes.revision}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
+
+def delete_course(course_id):
+    """Delete a course"""
+    try:
+        index = get_conflict_index()
+        with _write_transaction() as (conn, changes):
+            cursor = conn.execute('DELETE FROM courses WHERE id = ?', (course_id,))
+            if cursor.rowcount == 0:
+                return {"success": False, "message": "课程不存在"}
+            changes.record(course_id, 'delete')
+            index.remove(course_id)
+        return {"success": True, "message": "课程删除成功", "revision": changes.revision}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 def clear_courses():
     """Clear all courses (useful for testing)"""
-    courses_data_store.clear()
\ No newline at end of file
+    index = get_conflict_index()
+    with _write_transaction() as (conn, changes):
+        for (course_id,) in conn.execute('SELECT id FROM courses ORDER BY id').fetchall():
+            changes.record(course_id, 'delete')
+        conn.execute('DELETE FROM courses')
+        index.rebuild([])
+
+def _history_base(conn):
+    """Get the revision the change log starts from"""
+    return conn.execute("SELECT value FROM store_meta WHERE key = 'history_base'").fetchone()[0]
+
+def _check_revision(revision, base, current):
+    """Reject revisions outside the recorded history"""
+    if revision < base:
+        raise ValueError(f"版本{revision}早于历史记录起点（版本{base}）")
+    if revision > current:
+        raise ValueError(f"版本{revision}不存在，当前版本为{current}")
+
+def get_revision():
+    """Get the current store revision"""
+    return _store_revision(_get_connection())
+
+def get_changes_since(revision):
+    """Get the courses inserted or updated and the ids deleted after a revision, as JSON
+
+    Returns {"revision", "since", "upserts" (JSON array), "deletes"}, with
+    "upserts" None when the revision is older than the recorded history or more
+    courses changed than there are, so a full reload is cheaper for the client.
+    """
+    with _read_transaction() as conn:
+        current = _store_revision(conn)
+        if revision > current:
+            raise ValueError(f"版本{revision}不存在，当前版本为{current}")
+        changes = {"revision": current, "since": revision, "upserts": None, "deletes": []}
+        if revision == current:
+            changes["upserts"] = '[]'
+            return changes
+        if revision < _history_base(conn):
+            return changes
+        count = conn.execute('SELECT COUNT(*) FROM course_changes WHERE revision > ?', (revision,)).fetchone()[0]
+        if count > conn.execute('SELECT COUNT(*) FROM courses').fetchone()[0]:
+            return changes
+        latest = {}
+        rows = conn.execute('SELECT course_id, op, data FROM course_changes WHERE revision > ? ORDER BY seq', (revision,))
+        for course_id, op, data in rows:
+            latest[course_id] = None if op == 'delete' else data
+    # A course inserted and deleted after the revision was never seen by the client, deleting it is harmless
+    changes["upserts"] = '[' + ', '.join(
+        _course_json(course_id, data) for course_id, data in sorted(latest.items()) if data is not None
+    ) + ']'
+    changes["deletes"] = sorted(course_id for course_id, data in latest.items() if data is None)
+    return changes
+
+def get_change_log(since, limit=None):
+    """Get the change log entries (revision, course id, op, stored JSON or None) after a revision, oldest first
+
+    With a limit, whole revisions are returned until at least limit entries are read.
+    """
+    with _read_transaction() as conn:
+        _check_revision(since, _history_base(conn), _store_revision(conn))
+        sql = 'SELECT revision, course_id, op, data FROM course_changes WHERE revision > ?'
+        params = [since]
+        if limit is not None:
+            last = conn.execute(
+                'SELECT revision FROM course_changes WHERE revision > ? ORDER BY seq LIMIT 1 OFFSET ?', (since, limit - 1)
+            ).fetchone()
+            if last is not None:
+                sql += ' AND revision <= ?'
+                params.append(last[0])
+        return conn.execute(sql + ' ORDER BY seq', params).fetchall()
+
+def list_revisions(limit=50, before=None):
+    """Get the revisions with their insert/update/delete counts, newest first"""
+    with _read_transaction() as conn:
+        sql = 'SELECT revision, created, inserted, updated, deleted FROM revisions'
+        params = []
+        if before is not None:
+            sql += ' WHERE revision < ?'
+            params.append(before)
+        rows = conn.execute(sql + ' ORDER BY revision DESC LIMIT ?', params + [limit]).fetchall()
+        return {
+            "revision": _store_revision(conn),
+            "base": _history_base(conn),
+            "revisions": [
+                {"revision": row[0], "created": row[1], "inserted": row[2], "updated": row[3], "deleted": row[4]}
+                for row in rows
+            ]
+        }
+
+def _courses_at(conn, revision):
+    """Rebuild {id: stored JSON} at a revision: the base replayed with the change log"""
+    base = _history_base(conn)
+    _check_revision(revision, base, _store_revision(conn))
+    courses = dict(conn.execute('SELECT id, data FROM course_base').fetchall())
+    rows = conn.execute(
+        'SELECT course_id, op, data FROM course_changes WHERE revision > ? AND revision <= ? ORDER BY seq',
+        (base, revision)
+    )
+    for course_id, op, data in rows:
+        if op == 'delete':
+            courses.pop(course_id, None)
+        else:
+            courses[course_id] = data
+    return courses
+
+def get_courses_at(revision):
+    """Get all courses as they were at a revision"""
+    with _read_transaction() as conn:
+        courses = _courses_at(conn, revision)
+    return [_row_to_course(row) for row in sorted(courses.items())]
+
+def _states_at(conn, course_ids, revision, base):
+    """Get {id: stored JSON or None} of some courses at a revision, from their last change up to it"""
+    states = {}
+    ids = list(course_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(
+            f"""SELECT c.course_id, c.op, c.data FROM course_changes c JOIN (
+                    SELECT MAX(seq) AS seq FROM course_changes
+                    WHERE revision > ? AND revision <= ? AND course_id IN ({placeholders}) GROUP BY course_id
+                ) last ON c.seq = last.seq""",
+            [base, revision] + chunk
+        ).fetchall()
+        for course_id, op, data in rows:
+            states[course_id] = None if op == 'delete' else data
+        unchanged = [course_id for course_id in chunk if course_id not in states]
+        if unchanged:
+            rows = conn.execute(
+                f"SELECT id, data FROM course_base WHERE id IN ({','.join('?' * len(unchanged))})", unchanged
+            ).fetchall()
+            states.update(rows)
+    for course_id in ids:
+        states.setdefault(course_id, None)
+    return states
+
+def _changed_states(conn, from_revision, to_revision):
+    """Get ({id: JSON at from_revision}, {id: JSON at to_revision}) of the courses changed in between
+
+    Only the change log entries between the two revisions and the last earlier
+    entry of each touched course are read, so the cost follows the size of the edits.
+    """
+    base = _history_base(conn)
+    current = _store_revision(conn)
+    _check_revision(from_revision, base, current)
+    _check_revision(to_revision, base, current)
+    if from_revision > to_revision:
+        raise ValueError("起始版本不能晚于结束版本")
+    after = {}
+    rows = conn.execute(
+        'SELECT course_id, op, data FROM course_changes WHERE revision > ? AND revision <= ? ORDER BY seq',
+        (from_revision, to_revision)
+    )
+    for course_id, op, data in rows:
+        after[course_id] = None if op == 'delete' else data
+    before = _states_at(conn, after, from_revision, base)
+    return before, after
+
+def _slot_of(course):
+    return {'星期': course.get('星期'), '节次': course.get('节次')}
+
+def _count_change(summary, kind, *courses):
+    """Count a change under the teachers and classes of its before/after versions"""
+    for field, key in (('教师', 'by_teacher'), ('班级', 'by_class')):
+        for name in {course.get(field) for course in courses if course.get(field)}:
+            counts = summary[key].setdefault(name, {'added': 0, 'removed': 0, 'moved': 0, 'changed': 0})
+            counts[kind] += 1
+
+def diff_revisions(from_revision, to_revision=None):
+    """Get the courses added, removed, moved (other day/period) and otherwise changed between two revisions"""
+    with _read_transaction() as conn:
+        if to_revision is None:
+            to_revision = _store_revision(conn)
+        before, after = _changed_states(conn, from_revision, to_revision)
+
+    summary = {"from": from_revision, "to": to_revision, "added": [], "removed": [], "moved": [], "changed": [],
+               "by_teacher": {}, "by_class": {}}
+    for course_id in sorted(after):
+        old, new = before[course_id], after[course_id]
+        if old == new:
+            continue
+        old = _row_to_course((course_id, old)) if old is not None else None
+        new = _row_to_course((course_id, new)) if new is not None else None
+        if old is None:
+            summary["added"].append(new)
+            _count_change(summary, 'added', new)
+        elif new is None:
+            summary["removed"].append(old)
+            _count_change(summary, 'removed', old)
+        elif old == new:
+            # Same content stored with another key order
+            continue
+        elif _slot_of(old) != _slot_of(new):
+            summary["moved"].append({"id": course_id, "from": _slot_of(old), "to": _slot_of(new),
+                                     "before": old, "after": new})
+            _count_change(summary, 'moved', old, new)
+        else:
+            summary["changed"].append({"id": course_id, "before": old, "after": new})
+            _count_change(summary, 'changed', old, new)
+    return summary
+
+def revert_to_revision(revision):
+    """Restore the courses of a revision (with their ids) as a new revision"""
+    try:
+        index = get_conflict_index()
+        with _write_transaction() as (conn, changes):
+            target, current = _changed_states(conn, revision, _store_revision(conn))
+            restored = []
+            for course_id in sorted(current):
+                data = target[course_id]
+                if data == current[course_id]:
+                    continue
+                if data is None:
+                    conn.execute('DELETE FROM courses WHERE id = ?', (course_id,))
+                    changes.record(course_id, 'delete')
+                    index.remove(course_id)
+                    continue
+                course = _row_to_course((course_id, data))
+                values = _index_values(course)
+                if current[course_id] is None:
+                    conn.execute(
+                        'INSERT INTO courses (id, teacher, class_name, location, day, period, data) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (course_id,) + values
+                    )
+                    changes.record(course_id, 'insert', values[-1])
+                else:
+                    conn.execute(
+                        'UPDATE courses SET teacher = ?, class_name = ?, location = ?, day = ?, period = ?, data = ? WHERE id = ?',
+                        values + (course_id,)
+                    )
+                    changes.record(course_id, 'update', values[-1])
+                index.update(course_id, course)
+                restored.append(course)
+            conflicts = index.conflicts_of(restored)
+        if changes.revision is None:
+            return {"success": True, "message": f"课程与版本{revision}相同，无需恢复", "revision": get_revision(),
+                    "conflicts": []}
+        return {"success": True, "message": f"已恢复到版本{revision}", "revision": changes.revision,
+                "conflicts": conflicts}
+    except Exception as e:
+        return {"success": False, "message": str(e)}
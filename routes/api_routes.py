@@ -1,21 +1,163 @@
-import pandas as pd
-from flask import jsonify, request, send_file
-from io import StringIO
-import sys
-from models import get_all_courses, add_course
+import json
+import logging
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import quote
+from flask import jsonify, request, send_file, Response
+from io import BytesIO
+from models import get_all_courses_json, get_changes_since, get_revision, add_course, add_courses, apply_batch, update_course, delete_course, query_courses, get_conflict_index, get_courses_at, list_revisions, diff_revisions, revert_to_revision
 from services.conflict_service import detect_conflicts
 # 从新的服务文件导入
-from services.excel_export_service import ExcelExportService
-from services.word_export_service import WordExportService
+from services.batch_export_service import BatchExportService, EXPORT_FORMATS, SINGLE_FILE_FORMATS, group_courses, unique_sheet_names
+from services.base_export_service import BaseExportService, ExportUnavailable
+from services.export_cache_service import export_cache
+from services.export_job_service import export_jobs, ExportQueueFull
+from services.change_feed_service import change_feed, TooManySubscribers
+from services.response_service import EncodedBodyCache, accepted_encoding, dumps, is_not_modified, json_response, not_modified
+from config import EXPORT_CONFIG
 from services.statistics_service import statistics_service
+from services.metrics_service import metrics
+from services.solver_service import TimetableSolver, iter_portfolio, solve_portfolio
+
+logger = logging.getLogger(__name__)
 
 # 创建服务实例
-excel_export_service = ExcelExportService()
-word_export_service = WordExportService()
+batch_export_service = BatchExportService()
+
+# The Excel/Word engines (openpyxl, python-docx) are imported and created on first use,
+# so a worker that never exports does not pay for them
+@lru_cache(maxsize=None)
+def get_excel_export_service():
+    from services.excel_export_service import ExcelExportService
+    return ExcelExportService()
+
+@lru_cache(maxsize=None)
+def get_word_export_service():
+    from services.word_export_service import WordExportService
+    return WordExportService()
+
+@lru_cache(maxsize=None)
+def get_image_export_service():
+    from services.image_export_service import ImageExportService
+    return ImageExportService()
+
+@lru_cache(maxsize=None)
+def get_excel_import_service():
+    from services.import_service import ExcelImportService
+    return ExcelImportService()
+
+def preload_services():
+    """Import and create every lazily loaded service (done once before forking workers)"""
+    get_excel_export_service()
+    get_word_export_service()
+    get_image_export_service()
+    get_excel_import_service()
+
+def _revision_arg(value, name='revision'):
+    """Parse a revision number given in a request"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的版本号: {name}={value}")
+
+def _resolve_courses(data):
+    """Point-in-time export: use the courses of data["revision"] when no courses are posted"""
+    if data and not data.get('courses') and data.get('revision') is not None:
+        data = dict(data, courses=get_courses_at(_revision_arg(data['revision'])))
+    return data
+
+# Serialised course list per store revision, shared by all polling clients of this process
+_course_bodies = EncodedBodyCache()
+
+def _all_courses_response(revision, encoding):
+    """Full course list, serialised and compressed once per revision: (revision, body, applied encoding)"""
+    cached = _course_bodies.get(('courses', revision), encoding)
+    if cached is not None:
+        return (revision,) + cached
+    # The snapshot may already be newer than the revision read before
+    revision, text = get_all_courses_json()
+    return (revision,) + _course_bodies.get(('courses', revision), encoding, lambda: text.encode('utf-8'))
+
+def _changes_response(since):
+    """Changes after a revision, or the full list when the client has to reload"""
+    changes = get_changes_since(since)
+    if changes["upserts"] is None:
+        revision, text = get_all_courses_json()
+        body = f'{{"revision": {revision}, "since": {since}, "full": true, "courses": {text}}}'
+    else:
+        revision = changes["revision"]
+        body = (f'{{"revision": {revision}, "since": {since}, "full": false, '
+                f'"upserts": {changes["upserts"]}, "deletes": {json.dumps(changes["deletes"])}}}')
+    return revision, body.encode('utf-8')
 
 def get_courses():
-    """Get all courses"""
-    return jsonify(get_all_courses())
+    """Get all courses, those matching the teacher/class/location/day/period query filters, or all courses at a revision
+
+    ?since=<revision> returns only the courses changed after it. Responses carry
+    the store revision as a weak ETag, an unchanged store answers 304 without
+    reading any course.
+    """
+    try:
+        if request.args.get('revision') is not None:
+            revision = _revision_arg(request.args['revision'])
+            # Past revisions never change
+            etag = f"at{revision}"
+            if is_not_modified(etag):
+                return not_modified(etag)
+            return json_response(dumps(get_courses_at(revision)), etag=etag)
+
+        since = request.args.get('since')
+        since = _revision_arg(since, 'since') if since is not None else None
+        filters = {
+            'teacher': request.args.get('teacher'),
+            'class_name': request.args.get('class'),
+            'location': request.args.get('location'),
+            'day': request.args.get('day'),
+            'period': request.args.get('period')
+        }
+        filtered = any(value is not None for value in filters.values())
+        if since is not None and filtered:
+            raise ValueError("since不能与筛选条件同时使用")
+
+        revision = get_revision()
+        tag = '' if since is None else f"-s{since}"
+        if filtered:
+            tag = f"-q{zlib.crc32(dumps(filters)):08x}"
+        if is_not_modified(f"r{revision}{tag}"):
+            return not_modified(f"r{revision}{tag}", {'X-Schedule-Revision': str(revision)})
+
+        encoding = None
+        if since is not None:
+            revision, body = _changes_response(since)
+        elif filtered:
+            body = dumps(query_courses(**filters))
+        else:
+            revision, body, encoding = _all_courses_response(revision, accepted_encoding())
+        return json_response(body, encoding, etag=f"r{revision}{tag}",
+                             headers={'X-Schedule-Revision': str(revision)})
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+def stream_courses():
+    """Stream course changes and the conflicts they introduce as Server-Sent Events
+
+    A reconnecting EventSource resumes after its Last-Event-ID (a revision),
+    ?since=<revision> does the same for the first connection after a full load.
+    """
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if request.method == 'HEAD':
+        # Nothing would be read, do not subscribe
+        return Response(mimetype='text/event-stream', headers=headers)
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        events = change_feed.stream(_revision_arg(since, 'since') if since is not None else None)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except TooManySubscribers as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    return Response(events, mimetype='text/event-stream', headers=headers)
 
 def add_course_endpoint():
     """Add course"""
@@ -29,48 +171,201 @@ def add_course_endpoint():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 400
 
+def update_course_endpoint(course_id):
+    """Update course"""
+    result = update_course(course_id, request.get_json(silent=True))
+    if result["success"]:
+        return jsonify(result)
+    return jsonify(result), 404 if result["message"] == "课程不存在" else 400
+
+def delete_course_endpoint(course_id):
+    """Delete course"""
+    result = delete_course(course_id)
+    if result["success"]:
+        return jsonify(result)
+    return jsonify(result), 404 if result["message"] == "课程不存在" else 400
+
+# Operations accepted by the batch endpoint
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+def _parse_ndjson_batch(body):
+    """Parse NDJSON batch lines: {"op": "create|update|delete", ...} or a bare course (create)"""
+    batch = {op: [] for op in BATCH_OPERATIONS}
+    for line_number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f"第{line_number}行不是有效的JSON")
+        if not isinstance(item, dict):
+            raise ValueError(f"第{line_number}行格式错误")
+        op = item.get('op', 'create')
+        if op not in BATCH_OPERATIONS:
+            raise ValueError(f"第{line_number}行不支持的操作: {op}")
+        if op == 'delete':
+            batch['delete'].append(item.get('id'))
+        elif 'course' in item:
+            course = item['course']
+            if op == 'update' and isinstance(course, dict) and 'id' in item:
+                course = dict(course, id=item['id'])
+            batch[op].append(course)
+        else:
+            batch[op].append({k: v for k, v in item.items() if k != 'op'})
+    return batch
+
+def batch_courses():
+    """Create, update and delete many courses in one atomic batch (JSON or NDJSON)"""
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            batch = _parse_ndjson_batch(request.get_data(as_text=True))
+            replace = request.args.get('replace') == 'true'
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, list):
+                # A bare array is a list of courses to create
+                data = {'create': data}
+            if not isinstance(data, dict):
+                raise ValueError("请求数据为空")
+            batch = {op: data.get(op) for op in BATCH_OPERATIONS}
+            replace = bool(data.get('replace'))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    result = apply_batch(batch['create'], batch['update'], batch['delete'], replace=replace)
+    if result["success"]:
+        return jsonify(result)
+    return jsonify(result), 400
+
 def check_conflicts():
-    """Check course conflicts"""
+    """Check course conflicts of the posted courses, or of one course against the stored timetable"""
     try:
-        # Save original stdout
-        old_stdout = sys.stdout
-        sys.stdout = StringIO()
-        
         data = request.json
-        courses = data.get('courses', [])
-        df = pd.DataFrame(courses)
-        conflicts = detect_conflicts(df)
-        
-        # Restore original stdout
-        sys.stdout = old_stdout
+        if 'course' in data:
+            # Incremental check: conflicts a single added/edited course introduces in the stored timetable
+            course = data['course']
+            started = time.perf_counter()
+            conflicts = get_conflict_index().check(course, exclude_key=course.get('id'))
+            metrics.observe_phase('conflict_check', started)
+        else:
+            # Full recheck of the posted course list
+            conflicts = detect_conflicts(data.get('courses', []), data.get('mode', 'slot'))
         
         return jsonify({"conflicts": conflicts})
     except Exception as e:
         return jsonify({"conflicts": [], "error": str(e)}), 400
 
+# Query parameter -> course field of the occupancy resources
+OCCUPANCY_RESOURCES = {'teacher': '教师', 'class': '班级', 'location': '地点'}
+
+def get_free_slots():
+    """Get the slots where the given teacher/class/location are all free"""
+    resources = {field: request.args[param] for param, field in OCCUPANCY_RESOURCES.items() if request.args.get(param)}
+    free_slots = get_conflict_index().free_slots(resources)
+    return jsonify({"free_slots": [{"星期": day, "节次": period} for day, period in free_slots]})
+
+def get_utilisation():
+    """Get slot utilisation of every teacher, class or location"""
+    resource = request.args.get('resource', 'location')
+    if resource not in OCCUPANCY_RESOURCES:
+        return jsonify({"success": False, "message": f"不支持的资源类型: {resource}"}), 400
+    return jsonify({"utilisation": get_conflict_index().utilisation(OCCUPANCY_RESOURCES[resource])})
+
+def _ndjson_stream(first_event, events):
+    """Stream solver events as newline delimited JSON"""
+    yield json.dumps(first_event, ensure_ascii=False) + '\n'
+    for event in events:
+        yield json.dumps(event, ensure_ascii=False) + '\n'
+
+def solve_schedule():
+    """Automatically place course requirements into the timetable grid"""
+    try:
+        data = request.json or {}
+        if data.get('workers') is not None or data.get('stream'):
+            # Portfolio mode: parallel randomized searches across worker processes
+            args = (data.get('requirements'), data.get('courses'), data.get('time_limit'),
+                    data.get('seed'), data.get('workers'))
+            if data.get('stream'):
+                events = iter_portfolio(*args)
+                # Validate before streaming so bad input still gets a 400
+                first_event = next(events)
+                return Response(_ndjson_stream(first_event, events), mimetype='application/x-ndjson')
+            return jsonify(solve_portfolio(*args))
+        solver = TimetableSolver(
+            data.get('requirements'),
+            fixed_courses=data.get('courses'),
+            time_limit=data.get('time_limit'),
+            seed=data.get('seed')
+        )
+        return jsonify(solver.solve())
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+# Export format -> statistics action (PDF is the print-ready output)
+EXPORT_STATISTICS = {'png': 'image', 'pdf': 'print'}
+
+def _export_function(export_format):
+    """Get the create_*_export function rendering a single timetable of a format"""
+    if export_format == 'excel':
+        return get_excel_export_service().create_excel_export
+    if export_format == 'word':
+        return get_word_export_service().create_word_export
+    if export_format == 'png':
+        return get_image_export_service().create_image_export
+    return get_image_export_service().create_pdf_export
+
+def _render_variant(export_format):
+    """Renderer state that is part of the export cache key: the font of PNG/PDF exports
+
+    Raises ExportUnavailable when the format cannot be rendered on this server.
+    """
+    if export_format in ('png', 'pdf'):
+        return get_image_export_service().font_signature()
+    return None
+
+def _cached_export(export_format, data, create_export):
+    """Serve an export from the content-addressed cache, rendering it only on a miss
+
+    The cache key doubles as the ETag, so clients sending If-None-Match get a 304.
+    """
+    if not data:
+        raise ValueError("请求数据为空")
+    key = export_cache.make_key(export_format, data, _render_variant(export_format))
+    # Werkzeug only evaluates conditional requests for GET/HEAD, exports are POSTed
+    if request.if_none_match.contains(key):
+        response = Response(status=304)
+        response.set_etag(key)
+        return response
+    content = export_cache.get(key)
+    if content is None:
+        output, _ = create_export(data)
+        content = output.getvalue()
+        export_cache.put(key, content)
+
+    extension, mimetype = EXPORT_FORMATS[export_format]
+    title = data.get('title', EXPORT_CONFIG['default_title'])
+    response = send_file(
+        BytesIO(content),
+        as_attachment=True,
+        download_name=f"{title}.{extension}",
+        mimetype=mimetype,
+        etag=key
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 def export_excel():
     """Export to Excel"""
     try:
         # Track statistics
         statistics_service.track_export("excel")
         
-        data = request.json
-        output, filename = excel_export_service.create_excel_export(data)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        data = _resolve_courses(request.json)
+        return _cached_export('excel', data, get_excel_export_service().create_excel_export)
     except ValueError as e:
         return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
-        # Record detailed error information
-        import traceback
-        error_info = traceback.format_exc()
-        print(f"Error exporting Excel: {str(e)}")
-        print(f"Detailed error information:\n{error_info}")
+        logger.exception("Error exporting Excel")
         return jsonify({"success": False, "message": f"导出失败: {str(e)}"}), 500
 
 def export_word():
@@ -79,45 +374,259 @@ def export_word():
         # Track statistics
         statistics_service.track_export("word")
         
-        data = request.json
-        output, filename = word_export_service.create_word_export(data)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
+        data = _resolve_courses(request.json)
+        return _cached_export('word', data, get_word_export_service().create_word_export)
     except ValueError as e:
         return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
+        logger.exception("Error exporting Word")
+        return jsonify({"success": False, "message": str(e)}), 400
+
+def _attachment_headers(filename):
+    """Content-Disposition header for a (possibly non-ASCII) download name"""
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+
+def export_batch():
+    """Export one timetable per teacher or class, as a streamed ZIP or one multi-sheet workbook / multi-page PDF"""
+    try:
+        data = _resolve_courses(request.json)
+        groups, export_format, title = batch_export_service.prepare_batch(data)
+        _render_variant(export_format)
+        statistics_service.track_export(EXPORT_STATISTICS.get(export_format, export_format))
+
+        if data.get('mode', 'zip') == 'workbook':
+            if export_format not in SINGLE_FILE_FORMATS:
+                raise ValueError("多工作表模式仅支持Excel和PDF格式")
+            stream = batch_export_service.iter_workbook(groups, title, export_format=export_format,
+                                                        user_selected_colors=data.get('userSelectedColors'))
+            extension, mimetype = EXPORT_FORMATS[export_format]
+            return Response(stream, mimetype=mimetype, headers=_attachment_headers(f"{title}.{extension}"))
+
+        stream = batch_export_service.iter_zip(groups, export_format, title, data.get('userSelectedColors'))
+        return Response(stream, mimetype='application/zip', headers=_attachment_headers(f"{title}.zip"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    except Exception as e:
+        logger.exception("Error exporting batch")
+        return jsonify({"success": False, "message": f"导出失败: {str(e)}"}), 500
+
+def export_excel_stream():
+    """Export a (possibly whole-school) workbook as a chunked stream, one sheet per teacher/class group"""
+    try:
+        data = _resolve_courses(request.json)
+        # Validates the request, the courses are grouped below
+        _, title, _ = get_excel_export_service().prepare_data(data)
+        statistics_service.track_export("excel")
+
+        courses = data['courses']
+        if data.get('group_by'):
+            groups = group_courses(courses, data['group_by'])
+            sheets = [(sheet_name, group, f"{name}{title}")
+                      for sheet_name, (name, group) in zip(unique_sheet_names(groups), groups.items())]
+        else:
+            sheets = [(next(unique_sheet_names([title])), courses, title)]
+        stream = get_excel_export_service().iter_excel_stream(sheets, user_selected_colors=data.get('userSelectedColors'))
+        return Response(stream, mimetype=EXPORT_FORMATS['excel'][1], headers=_attachment_headers(f"{title}.xlsx"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+def _job_renderer(kind, data):
+    """Validate an export job request, returns (render, number of progress steps, tracked format)"""
+    if kind in EXPORT_FORMATS:
+        create_export = _export_function(kind)
+        # Validates the request (prepare_data is shared by every export service)
+        _, title, _ = BaseExportService().prepare_data(data)
+        variant = _render_variant(kind)
+
+        def render(output, progress):
+            # Shares the rendered files with the synchronous endpoints
+            key = export_cache.make_key(kind, data, variant)
+            content = export_cache.get(key)
+            if content is None:
+                content = create_export(data)[0].getvalue()
+                export_cache.put(key, content)
+            output.write(content)
+            extension, mimetype = EXPORT_FORMATS[kind]
+            return f"{title}.{extension}", mimetype
+        return render, 1, EXPORT_STATISTICS.get(kind, kind)
+
+    if kind == 'batch':
+        groups, export_format, title = batch_export_service.prepare_batch(data)
+        _render_variant(export_format)
+        if data.get('mode', 'zip') == 'workbook':
+            if export_format not in SINGLE_FILE_FORMATS:
+                raise ValueError("多工作表模式仅支持Excel和PDF格式")
+
+            def render(output, progress):
+                for chunk in batch_export_service.iter_workbook(groups, title, progress, export_format,
+                                                                data.get('userSelectedColors')):
+                    output.write(chunk)
+                extension, mimetype = EXPORT_FORMATS[export_format]
+                return f"{title}.{extension}", mimetype
+        else:
+            def render(output, progress):
+                for chunk in batch_export_service.iter_zip(groups, export_format, title,
+                                                           data.get('userSelectedColors'), progress):
+                    output.write(chunk)
+                return f"{title}.zip", 'application/zip'
+        return render, len(groups), EXPORT_STATISTICS.get(export_format, export_format)
+
+    raise ValueError(f"不支持的导出类型: {kind}")
+
+def _job_view(job):
+    """Public fields of an export job plus its polling and download URLs"""
+    view = {field: job[field] for field in ('id', 'type', 'status', 'progress', 'created', 'started',
+                                            'finished', 'expires', 'filename', 'size', 'error') if field in job}
+    view['status_url'] = f"/api/export/jobs/{job['id']}"
+    if job['status'] == 'done':
+        view['download_url'] = f"/api/export/jobs/{job['id']}/download"
+    return view
+
+def create_export_job():
+    """Queue an Excel/Word/batch export to be rendered in the background
+
+    The body is the request of the matching synchronous endpoint plus "type"
+    (excel, word, png, pdf or batch). Identical requests share one job.
+    """
+    try:
+        data = dict(request.get_json(silent=True) or {})
+        kind = data.pop('type', None)
+        if not data:
+            raise ValueError("请求数据为空")
+        data = _resolve_courses(data)
+        render, total, export_format = _job_renderer(kind, data)
+        job, created = export_jobs.submit(kind, data, render, total)
+        statistics_service.track_export(export_format)
+        return jsonify({"success": True, "job": _job_view(job)}), 202 if created else 200
+    except ValueError as e:
         return jsonify({"success": False, "message": str(e)}), 400
+    except (ExportQueueFull, ExportUnavailable) as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+
+def get_export_job(job_id):
+    """Get the status and progress of an export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "导出任务不存在或已过期"}), 404
+    return jsonify({"success": True, "job": _job_view(job)})
+
+def download_export_job(job_id):
+    """Download the file of a finished export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "导出任务不存在或已过期"}), 404
+    if job['status'] != 'done':
+        return jsonify({"success": False, "message": "导出任务尚未完成", "job": _job_view(job)}), 409
+    return send_file(export_jobs.artifact_path(job_id), as_attachment=True,
+                     download_name=job['filename'], mimetype=job['mimetype'], etag=job_id)
+
+def _rendered_export(export_format, action):
+    """Render a PNG/PDF timetable when courses are posted, otherwise only track a browser-side action"""
+    statistics_service.track_export(action)
+    data = request.get_json(silent=True)
+    if not data or ('courses' not in data and 'revision' not in data):
+        return jsonify({"success": True})
+    try:
+        data = _resolve_courses(data)
+        return _cached_export(export_format, data, _export_function(export_format))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except ExportUnavailable as e:
+        # The page falls back to drawing the image in the browser
+        return jsonify({"success": False, "message": str(e)}), 503
+    except Exception as e:
+        logger.exception("Error exporting %s", export_format)
+        return jsonify({"success": False, "message": f"导出失败: {str(e)}"}), 500
 
 def export_image():
-    """Track image export"""
-    # Track statistics
-    statistics_service.track_export("image")
-    return jsonify({"success": True})
+    """Export to PNG, or track a browser-side image export"""
+    return _rendered_export('png', 'image')
 
 def print_schedule():
-    """Track print action"""
-    # Track statistics
-    statistics_service.track_export("print")
-    return jsonify({"success": True})
+    """Export a print-ready PDF, or track a browser-side print"""
+    return _rendered_export('pdf', 'print')
 
 def import_schedule():
-    """Track import action"""
-    # Track statistics
+    """Import an uploaded timetable workbook into the store, or only track a browser-side import"""
+    upload = request.files.get('file')
+    if upload is None:
+        # Track statistics
+        statistics_service.track_import()
+        return jsonify({"success": True})
+
+    try:
+        courses, sheets = get_excel_import_service().parse_workbook(upload.stream, request.form.get('sheet_as'))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if not courses:
+        return jsonify({"success": False, "message": "文件中没有可导入的课程"}), 400
+
+    result = add_courses(courses, replace=request.form.get('mode') == 'replace')
+    if not result["success"]:
+        return jsonify(result), 400
     statistics_service.track_import()
-    return jsonify({"success": True})
+    result.update({"imported": len(courses), "sheets": sheets})
+    return jsonify(result)
+
+def _parse_time_arg(name):
+    """Parse an ISO date/time query parameter"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"时间格式错误: {name}={value}")
 
 def get_statistics():
-    """Get usage statistics"""
+    """Get usage statistics, plus per-bucket counts when from/to/bucket are given"""
     stats = statistics_service.get_stats()
+    if any(name in request.args for name in ('from', 'to', 'bucket')):
+        try:
+            stats["range"] = statistics_service.query_range(
+                _parse_time_arg('from'), _parse_time_arg('to'), request.args.get('bucket', 'hour')
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
     # Ensure all required fields exist
     if "export_stats" not in stats:
         stats["export_stats"] = {"excel": 0, "word": 0, "image": 0, "print": 0}
     if "import_stats" not in stats:
         stats["import_stats"] = {"total": 0}
         
-    return jsonify(stats)
\ No newline at end of file
+    return jsonify(stats)
+
+def get_history():
+    """Get the store revisions, newest first (limit / before page through older ones)"""
+    try:
+        limit = min(max(_revision_arg(request.args.get('limit', 50), 'limit'), 1), 500)
+        before = request.args.get('before')
+        return jsonify(list_revisions(limit, _revision_arg(before, 'before') if before is not None else None))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+def get_history_diff():
+    """Get the courses added, removed, moved and changed between revisions from and to (default: current)"""
+    try:
+        if request.args.get('from') is None:
+            raise ValueError("缺少起始版本: from")
+        to_revision = request.args.get('to')
+        return jsonify(diff_revisions(_revision_arg(request.args['from'], 'from'),
+                                      _revision_arg(to_revision, 'to') if to_revision is not None else None))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+def revert_history():
+    """Restore the courses of an earlier revision, recorded as a new revision"""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = revert_to_revision(_revision_arg(data.get('revision')))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify(result), 200 if result["success"] else 400
+
+def get_metrics():
+    """Expose request latency, phase timings, payload sizes and cache statistics (Prometheus text format)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,56 +1,156 @@
-import pandas as pd
-from flask import Flask
+import time
+from flask import Blueprint, Flask, g, request
 from config import FLASK_CONFIG
-from models import courses_data_store
 from routes.main_routes import index
-from routes.api_routes import get_courses, add_course_endpoint, check_conflicts, export_excel, export_word, get_statistics, export_image, print_schedule, import_schedule
+from routes.api_routes import get_courses, stream_courses, add_course_endpoint, update_course_endpoint, delete_course_endpoint, batch_courses, check_conflicts, get_free_slots, get_utilisation, solve_schedule, export_excel, export_word, export_batch, export_excel_stream, create_export_job, get_export_job, download_export_job, get_statistics, export_image, print_schedule, import_schedule, get_history, get_history_diff, revert_history, get_metrics
+from services.metrics_service import metrics
+from services.response_service import compress_response
 
-app = Flask(__name__, 
-            static_folder=FLASK_CONFIG['static_folder'], 
-            template_folder=FLASK_CONFIG['template_folder'])
+routes = Blueprint('schedule', __name__)
+
+def create_app():
+    """Create the Flask application
+
+    Only Flask and the light services are imported here; the Excel/Word engines are
+    loaded on the first export (see serve.py for preloading them before forking).
+    """
+    app = Flask(__name__, 
+                static_folder=FLASK_CONFIG['static_folder'], 
+                template_folder=FLASK_CONFIG['template_folder'])
+    app.register_blueprint(routes)
+    return app
+
+# Request instrumentation
+@routes.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@routes.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The URL rule (not the path) keeps the label set bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('schedule_request_duration_seconds', time.perf_counter() - started,
+                        method=request.method, route=route, status=response.status_code)
+        if request.content_length:
+            metrics.observe('schedule_request_size_bytes', request.content_length, route=route)
+        if not response.is_streamed and response.content_length is not None:
+            metrics.observe('schedule_response_size_bytes', response.content_length, route=route)
+    return response
+
+# Registered after the metrics hook so it runs before it (after-request hooks run in reverse),
+# the recorded response size is the compressed one
+@routes.after_app_request
+def compress_buffered_response(response):
+    return compress_response(response)
 
 # Main route
-@app.route('/')
+@routes.route('/')
 def index_route():
     return index()
 
 # API routes
-@app.route('/api/courses', methods=['GET'])
+@routes.route('/api/courses', methods=['GET'])
 def get_courses_route():
     return get_courses()
 
-@app.route('/api/courses', methods=['POST'])
+@routes.route('/api/courses/stream', methods=['GET'])
+def stream_courses_route():
+    return stream_courses()
+
+@routes.route('/api/courses', methods=['POST'])
 def add_course_route():
     return add_course_endpoint()
 
-@app.route('/api/courses/conflicts', methods=['POST'])
+@routes.route('/api/courses/<int:course_id>', methods=['PUT'])
+def update_course_route(course_id):
+    return update_course_endpoint(course_id)
+
+@routes.route('/api/courses/<int:course_id>', methods=['DELETE'])
+def delete_course_route(course_id):
+    return delete_course_endpoint(course_id)
+
+@routes.route('/api/courses/batch', methods=['POST'])
+def batch_courses_route():
+    return batch_courses()
+
+@routes.route('/api/courses/conflicts', methods=['POST'])
 def check_conflicts_route():
     return check_conflicts()
 
-@app.route('/api/export/excel', methods=['POST'])
+@routes.route('/api/occupancy/free', methods=['GET'])
+def get_free_slots_route():
+    return get_free_slots()
+
+@routes.route('/api/occupancy/utilisation', methods=['GET'])
+def get_utilisation_route():
+    return get_utilisation()
+
+@routes.route('/api/schedule/solve', methods=['POST'])
+def solve_schedule_route():
+    return solve_schedule()
+
+@routes.route('/api/export/excel', methods=['POST'])
 def export_excel_route():
     return export_excel()
 
-@app.route('/api/export/word', methods=['POST'])
+@routes.route('/api/export/word', methods=['POST'])
 def export_word_route():
     return export_word()
 
-@app.route('/api/export/image', methods=['POST'])
+@routes.route('/api/export/batch', methods=['POST'])
+def export_batch_route():
+    return export_batch()
+
+@routes.route('/api/export/excel/stream', methods=['POST'])
+def export_excel_stream_route():
+    return export_excel_stream()
+
+@routes.route('/api/export/jobs', methods=['POST'])
+def create_export_job_route():
+    return create_export_job()
+
+@routes.route('/api/export/jobs/<job_id>', methods=['GET'])
+def get_export_job_route(job_id):
+    return get_export_job(job_id)
+
+@routes.route('/api/export/jobs/<job_id>/download', methods=['GET'])
+def download_export_job_route(job_id):
+    return download_export_job(job_id)
+
+@routes.route('/api/export/image', methods=['POST'])
 def export_image_route():
     return export_image()
 
-@app.route('/api/export/print', methods=['POST'])
+@routes.route('/api/export/print', methods=['POST'])
 def print_schedule_route():
     return print_schedule()
 
-@app.route('/api/import', methods=['POST'])
+@routes.route('/api/import', methods=['POST'])
 def import_schedule_route():
     return import_schedule()
 
-@app.route('/api/statistics', methods=['GET'])
+@routes.route('/api/statistics', methods=['GET'])
 def get_statistics_route():
     return get_statistics()
 
+@routes.route('/api/history', methods=['GET'])
+def get_history_route():
+    return get_history()
+
+@routes.route('/api/history/diff', methods=['GET'])
+def get_history_diff_route():
+    return get_history_diff()
+
+@routes.route('/api/history/revert', methods=['POST'])
+def revert_history_route():
+    return revert_history()
+
+@routes.route('/metrics', methods=['GET'])
+def get_metrics_route():
+    return get_metrics()
+
 # Start Flask application
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
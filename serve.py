@@ -0,0 +1,101 @@
+"""Production launcher: preload the application once, then fork worker processes
+
+The master imports the app and every lazily loaded service (openpyxl, python-docx),
+freezes the garbage collector so the preloaded objects stay in shared copy-on-write
+pages, opens the listening socket and forks the workers. Each worker serves the
+shared socket with a threaded Werkzeug server. Dead workers are replaced; SIGINT /
+SIGTERM stop them all. /metrics of any worker reports the totals of all workers.
+
+    python serve.py [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from werkzeug.serving import make_server
+from config import SERVER_CONFIG
+from schedule import create_app
+from routes.api_routes import preload_services
+from services.metrics_service import metrics
+
+def _serve_worker(app, sock, host, port):
+    """Worker process body, never returns"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # SystemExit unwinds serve_forever, so atexit handlers (statistics flush) still run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    status = 0
+    try:
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        server.serve_forever()
+    except SystemExit as e:
+        status = e.code or 0
+    finally:
+        sys.stdout.flush()
+    sys.exit(status)
+
+def _spawn(app, sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        _serve_worker(app, sock, host, port)
+    return pid
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the timetable app with preforked workers')
+    parser.add_argument('--host', default=SERVER_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG['port'])
+    parser.add_argument('--workers', type=int, default=SERVER_CONFIG['workers'] or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    app = create_app()
+    if not hasattr(os, 'fork'):
+        # No fork() (Windows): a single threaded server
+        app.run(host=args.host, port=args.port, threaded=True)
+        return
+
+    preload_services()
+    # Every worker counts its own requests, /metrics merges them through a shared directory
+    metrics.enable_multiprocess()
+    # Objects created so far are never collected, so the collector does not touch
+    # (and un-share) their pages in the workers
+    gc.freeze()
+
+    sock = socket.create_server((args.host, args.port), backlog=SERVER_CONFIG['backlog'])
+    sock.set_inheritable(True)
+    workers = {_spawn(app, sock, args.host, args.port) for _ in range(args.workers)}
+    print(f" * Serving on http://{args.host}:{args.port} with {len(workers)} workers (master pid {os.getpid()})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        # waitpid() is retried after a handler returns, so stop the workers from here
+        # and let the loop below reap them
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    while workers:
+        try:
+            pid, _ = os.waitpid(-1, 0)
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            # Replace a crashed worker
+            time.sleep(0.5)
+            pid = _spawn(app, sock, args.host, args.port)
+            workers.add(pid)
+            if stopping:
+                os.kill(pid, signal.SIGTERM)
+    sock.close()
+
+if __name__ == '__main__':
+    main()
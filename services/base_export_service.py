@@ -1,7 +1,10 @@
-import pandas as pd
-from io import BytesIO
+import time
 from config import EXPORT_CONFIG
-from services.color_service import get_course_color
+from services.course_record import to_records
+from services.metrics_service import metrics
+
+class ExportUnavailable(Exception):
+    """Raised when the server cannot render a format at all (e.g. no font for PNG/PDF)"""
 
 class BaseExportService:
     """Base export service class"""
@@ -20,5 +23,7 @@ class BaseExportService:
         if not courses:
             raise ValueError("没有课程数据可供导出")
         
-        df = pd.DataFrame(courses)
-        return df, title, data
\ No newline at end of file
+        started = time.perf_counter()
+        records = to_records(courses)
+        metrics.observe_phase('prepare_data', started)
+        return records, title, data
\ No newline at end of file
@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import EXPORT_CONFIG
+
+# Accepted group_by values -> course field
+GROUP_FIELDS = {'teacher': '教师', 'class': '班级', '教师': '教师', '班级': '班级'}
+
+# Export format -> (file extension, mimetype)
+EXPORT_FORMATS = {
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'word': ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    'png': ('png', 'image/png'),
+    'pdf': ('pdf', 'application/pdf')
+}
+
+# Formats that batch exports can put in one file, a worksheet / page per group
+SINGLE_FILE_FORMATS = ('excel', 'pdf')
+
+_INVALID_NAME_CHARS = re.compile(r'[\\/:*?"<>|\[\]]')
+
+def safe_name(name, max_length=None):
+    """Make a group name usable as a file or sheet name"""
+    name = _INVALID_NAME_CHARS.sub('_', str(name)).strip() or '_'
+    return name[:max_length] if max_length else name
+
+def unique_sheet_names(names):
+    """Make valid, unique worksheet names (at most 31 characters)"""
+    used_names = set()
+    for name in names:
+        sheet_name = safe_name(name, 31)
+        suffix = 1
+        while sheet_name in used_names:
+            suffix += 1
+            sheet_name = f"{safe_name(name, 27)}({suffix})"
+        used_names.add(sheet_name)
+        yield sheet_name
+
+def group_courses(courses, group_by):
+    """Group courses by teacher or class, in order of first appearance"""
+    field = GROUP_FIELDS.get(group_by)
+    if field is None:
+        raise ValueError(f"不支持的分组方式: {group_by}")
+    groups = {}
+    for course in courses:
+        name = course.get(field)
+        if name and name != '未指定':
+            groups.setdefault(name, []).append(course)
+    if not groups:
+        raise ValueError("没有可分组的课程数据")
+    return groups
+
+def _render_group(export_format, data):
+    """Render one group in a worker process, returns the file bytes"""
+    # The export engines are imported on first use (openpyxl / python-docx are slow to import)
+    if export_format == 'excel':
+        from services.excel_export_service import ExcelExportService
+        output, _ = ExcelExportService().create_excel_export(data)
+    elif export_format == 'word':
+        from services.word_export_service import WordExportService
+        output, _ = WordExportService().create_word_export(data)
+    else:
+        from services.image_export_service import ImageExportService
+        service = ImageExportService()
+        output, _ = service.create_image_export(data) if export_format == 'png' else service.create_pdf_export(data)
+    return output.getvalue()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable stream collecting the chunks written by ZipFile"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class BatchExportService:
+    """Per-teacher / per-class timetable export of a whole course list"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or EXPORT_CONFIG['batch_workers'] or os.cpu_count() or 1
+
+    def prepare_batch(self, data):
+        """Validate a batch export request and group its courses"""
+        if not data:
+            raise ValueError("请求数据为空")
+        courses = data.get('courses', [])
+        if not courses:
+            raise ValueError("没有课程数据可供导出")
+        export_format = data.get('format', 'excel')
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {export_format}")
+        title = data.get('title', EXPORT_CONFIG['default_title'])
+        return group_courses(courses, data.get('group_by', 'teacher')), export_format, title
+
+    def _iter_rendered(self, export_format, tasks):
+        """Render groups across a process pool, yielding (name, bytes) in order
+
+        At most two files per worker are in flight, so memory stays bounded no
+        matter how many groups there are.
+        """
+        window = self.workers * 2
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for name, data in tasks:
+                pending.append((name, executor.submit(_render_group, export_format, data)))
+                if len(pending) >= window:
+                    name, future = pending.popleft()
+                    yield name, future.result()
+            while pending:
+                name, future = pending.popleft()
+                yield name, future.result()
+
+    def iter_zip(self, groups, export_format, title, user_selected_colors=None, progress=None):
+        """Stream a ZIP archive with one timetable file per group
+
+        progress(done), if given, is called with the number of groups written so far.
+        """
+        extension = EXPORT_FORMATS[export_format][0]
+        tasks = (
+            (name, {'courses': courses, 'title': f"{safe_name(name)}{title}",
+                    'userSelectedColors': user_selected_colors or {}})
+            for name, courses in groups.items()
+        )
+        sink = _ChunkSink()
+        used_names = set()
+        # Office files are already compressed, storing them avoids deflating twice
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for done, (name, content) in enumerate(self._iter_rendered(export_format, tasks), 1):
+                filename = f"{safe_name(name)}{title}.{extension}"
+                suffix = 1
+                while filename in used_names:
+                    suffix += 1
+                    filename = f"{safe_name(name)}{title}({suffix}).{extension}"
+                used_names.add(filename)
+                archive.writestr(filename, content)
+                if progress:
+                    progress(done)
+                yield sink.drain()
+        yield sink.drain()
+
+    def iter_workbook(self, groups, title, progress=None, export_format='excel', user_selected_colors=None):
+        """Stream one file with a worksheet (Excel) or page (PDF) per group, with bounded memory
+
+        progress(done), if given, is called with the number of groups written so far.
+        """
+        def pages():
+            for done, (name, courses) in enumerate(groups.items()):
+                # The previous group is complete once the next one is requested
+                if progress:
+                    progress(done)
+                yield name, courses, f"{name}{title}"
+
+        if export_format == 'pdf':
+            from services.image_export_service import ImageExportService
+            return ImageExportService().iter_pdf_stream(
+                ((courses, page_title) for _, courses, page_title in pages()), user_selected_colors
+            )
+        from services.excel_export_service import ExcelExportService
+        return ExcelExportService().iter_excel_stream(
+            ((sheet_name, courses, sheet_title)
+             for sheet_name, (_, courses, sheet_title) in zip(unique_sheet_names(groups), pages())),
+            user_selected_colors=user_selected_colors
+        )
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from config import CHANGE_FEED_CONFIG
+from services.conflict_service import ConflictIndex
+
+logger = logging.getLogger(__name__)
+
+# Change log entries replayed to a reconnecting client before it is asked to reload instead
+MAX_REPLAY_ENTRIES = 5000
+
+# Returned by a subscriber whose buffer overflowed, its stream is closed
+_CLOSED = object()
+
+class TooManySubscribers(Exception):
+    """Raised when a process already serves max_subscribers streams"""
+
+def _event(name, payload, event_id=None):
+    """Encode one Server-Sent Event"""
+    lines = f"event: {name}\n"
+    if event_id is not None:
+        lines += f"id: {event_id}\n"
+    return (lines + f"data: {json.dumps(payload, ensure_ascii=False)}\n\n").encode('utf-8')
+
+def _course(course_id, data):
+    course = json.loads(data)
+    course['id'] = course_id
+    return course
+
+class _Subscriber:
+    """Bounded queue of encoded revisions for one stream"""
+
+    def __init__(self, max_buffer, since=None):
+        self.max_buffer = max_buffer
+        # Revisions up to this one are already known to the client
+        self.since = since
+        self.chunks = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+    def push(self, revision, chunk):
+        if self.since is not None and revision <= self.since:
+            return
+        with self.condition:
+            if len(self.chunks) >= self.max_buffer:
+                # Too slow: drop it rather than buffer without bound, the client
+                # reconnects with Last-Event-ID and catches up from the change log
+                self.closed = True
+                self.chunks.clear()
+            elif not self.closed:
+                self.chunks.append(chunk)
+            self.condition.notify()
+
+    def next(self, timeout):
+        """Get the next chunk, None after timeout seconds without one"""
+        with self.condition:
+            if not self.chunks and not self.closed:
+                self.condition.wait(timeout)
+            if self.closed:
+                return _CLOSED
+            return self.chunks.popleft() if self.chunks else None
+
+class ChangeFeed:
+    """Fan-out of course store changes to Server-Sent Events streams
+
+    One watcher thread per process polls the store revision and reads the new
+    change log entries once, encodes them once and appends them to every
+    subscriber queue, so an idle stream costs no queries. It still holds one
+    request thread of the WSGI server while it is open, which is why the
+    streams of a process are capped at max_subscribers. Writes of every worker process go through the shared change log,
+    so each process sees all of them.
+
+    The watcher keeps its own conflict index, applying the changes in log order
+    yields the conflicts each revision introduces.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.subscribers = set()
+        self.thread = None
+        # Revision the feed has published up to, None while not watching
+        self.revision = None
+        self.index = None
+        # (revision, encoded events) of the latest revisions
+        self.history = deque(maxlen=CHANGE_FEED_CONFIG['history'])
+
+    def _encode(self, revision, entries, index=None):
+        """Encode the insert/update/delete events of a revision, its new conflicts and the closing revision event
+
+        Only the revision event carries the SSE id, a client cut off in the middle
+        of a revision resumes before it and gets all of it again.
+        """
+        chunks = []
+        conflicts = []
+        for course_id, op, data in entries:
+            if op == 'delete':
+                if index is not None:
+                    index.remove(course_id)
+                chunks.append(_event('delete', {"id": course_id, "revision": revision}))
+                continue
+            course = _course(course_id, data)
+            if index is not None:
+                conflicts.extend(conflict for conflict in index.add(course_id, course) if conflict not in conflicts)
+            chunks.append(_event(op, {"course": course, "revision": revision}))
+        if conflicts:
+            chunks.append(_event('conflicts', {"conflicts": conflicts, "revision": revision}))
+        chunks.append(_event('revision', {"revision": revision}, event_id=revision))
+        return b''.join(chunks)
+
+    @staticmethod
+    def _group(rows):
+        """Group change log rows by revision"""
+        groups = []
+        for revision, course_id, op, data in rows:
+            if not groups or groups[-1][0] != revision:
+                groups.append((revision, []))
+            groups[-1][1].append((course_id, op, data))
+        return groups
+
+    def _start(self):
+        """Load the store and start watching it (caller holds the lock)"""
+        from models import get_all_courses_json
+        revision, text = get_all_courses_json()
+        self.index = ConflictIndex(json.loads(text))
+        self.revision = revision
+        self.history.clear()
+        self.thread = threading.Thread(target=self._watch, name='change-feed', daemon=True)
+        self.thread.start()
+
+    def _watch(self):
+        from models import get_change_log, get_revision
+        while True:
+            time.sleep(CHANGE_FEED_CONFIG['poll_interval'])
+            with self.lock:
+                if not self.subscribers:
+                    # Nobody listens, stop watching until the next subscriber
+                    self.thread = self.revision = self.index = None
+                    self.history.clear()
+                    return
+                revision = self.revision
+            try:
+                if get_revision() == revision:
+                    continue
+                rows = get_change_log(revision)
+            except Exception:
+                logger.exception("Error reading the course change log")
+                continue
+            with self.lock:
+                for group_revision, entries in self._group(rows):
+                    chunk = self._encode(group_revision, entries, self.index)
+                    self.history.append((group_revision, chunk))
+                    self.revision = group_revision
+                    for subscriber in self.subscribers:
+                        subscriber.push(group_revision, chunk)
+
+    def _backlog(self, since):
+        """Encoded events after a revision for a reconnecting client (caller holds the lock)"""
+        from models import get_change_log, get_revision
+        if since is None or since == self.revision:
+            return []
+        if since > self.revision:
+            # The client may have read a revision the watcher has not published yet
+            if since <= get_revision():
+                return []
+            return [_event('reset', {"revision": self.revision}, event_id=self.revision)]
+        if self.history and since >= self.history[0][0] - 1:
+            return [chunk for revision, chunk in self.history if revision > since]
+        try:
+            rows = get_change_log(since, MAX_REPLAY_ENTRIES)
+        except ValueError:
+            rows = []
+        groups = [group for group in self._group(rows) if group[0] <= self.revision]
+        if not groups or groups[-1][0] < self.revision:
+            # Older than the history or too far behind: the client reloads the whole list
+            return [_event('reset', {"revision": self.revision}, event_id=self.revision)]
+        # Conflicts are only known for the revisions still in the history
+        return [self._encode(revision, entries) for revision, entries in groups]
+
+    def subscribe(self, since=None):
+        """Register a stream, returns (subscriber, encoded events after since, revision they lead to)"""
+        with self.lock:
+            if self.pid != os.getpid():
+                # The watcher thread does not survive fork(), each process runs its own
+                self.pid = os.getpid()
+                self.subscribers = set()
+                self.thread = self.revision = self.index = None
+            if len(self.subscribers) >= CHANGE_FEED_CONFIG['max_subscribers']:
+                raise TooManySubscribers("实时连接过多，请稍后再试")
+            if self.thread is None:
+                self._start()
+            backlog = self._backlog(since)
+            subscriber = _Subscriber(CHANGE_FEED_CONFIG['subscriber_buffer'], max(since or 0, self.revision))
+            self.subscribers.add(subscriber)
+            return subscriber, backlog, self.revision
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, since=None):
+        """Stream the changes after since (None = from now) as Server-Sent Events"""
+        subscriber, backlog, revision = self.subscribe(since)
+
+        def events():
+            yield f"retry: {CHANGE_FEED_CONFIG['retry_ms']}\n\n".encode('utf-8')
+            yield _event('hello', {"revision": revision, "since": since})
+            yield from backlog
+            while True:
+                chunk = subscriber.next(CHANGE_FEED_CONFIG['keepalive'])
+                if chunk is _CLOSED:
+                    return
+                # A comment line keeps proxies from timing the idle stream out and detects gone clients
+                yield chunk if chunk is not None else b': keepalive\n\n'
+
+        return _EventStream(self, subscriber, events())
+
+class _EventStream:
+    """Response body of one stream, closing it unsubscribes
+
+    The WSGI server closes the body when the response ends, also when it was
+    never iterated (HEAD, client gone before the first chunk), where a
+    generator's finally would not run.
+    """
+
+    def __init__(self, feed, subscriber, events):
+        self.feed = feed
+        self.subscriber = subscriber
+        self.events = events
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        self.feed.unsubscribe(self.subscriber)
+
+# Create a global instance
+change_feed = ChangeFeed()
@@ -1,5 +1,25 @@
+import zlib
+from functools import lru_cache
+from types import MappingProxyType
 from config import COLOR_MAP, DEFAULT_COLORS
 
+# Automatic colours without the duplicate entries of DEFAULT_COLORS
+PALETTE = tuple(dict.fromkeys(tuple(color) for color in DEFAULT_COLORS))
+
+def _parse_color(color):
+    """Convert a user colour ("r,g,b" or [r, g, b]) to a tuple"""
+    if isinstance(color, str):
+        return tuple(map(int, color.split(',')))
+    return tuple(color)
+
+def _palette_index(course_name):
+    """Stable palette position of a course name
+
+    CRC32 of the UTF-8 name, unlike hash() it is the same in every process and
+    after restarts, so cached and batch exports agree.
+    """
+    return zlib.crc32(str(course_name).encode('utf-8')) % len(PALETTE)
+
 def get_course_color(course_name, user_selected_colors=None):
     """
     Get course color, priority:
@@ -9,19 +29,54 @@ def get_course_color(course_name, user_selected_colors=None):
     """
     # If the user has selected a color, use the user selected color first
     if user_selected_colors and course_name in user_selected_colors:
-        color = user_selected_colors[course_name]
-        # If the color is in string format, convert it to a tuple
-        if isinstance(color, str):
-            return tuple(map(int, color.split(',')))
-        return color
-    
+        return _parse_color(user_selected_colors[course_name])
+
     # If a predefined color exists, use the predefined color
     if course_name in COLOR_MAP:
-        return COLOR_MAP[course_name]
-    
-    # Generate a stable hash value based on the course name to ensure that 
-    # the same name course always gets the same color
-    # Use a larger color pool to reduce the probability of different name courses getting the same color
-    hash_value = hash(course_name) % (len(DEFAULT_COLORS) * 100)  # Expand color space
-    color_index = hash_value % len(DEFAULT_COLORS)
-    return DEFAULT_COLORS[color_index]
\ No newline at end of file
+        return tuple(COLOR_MAP[course_name])
+
+    return PALETTE[_palette_index(course_name)]
+
+@lru_cache(maxsize=256)
+def _allocate(course_names, user_colors):
+    user_colors = dict(user_colors)
+    colors = {}
+    # User selected and predefined colours are kept as chosen, even when two courses share one
+    for name in course_names:
+        if name in user_colors:
+            colors[name] = user_colors[name]
+        elif name in COLOR_MAP:
+            colors[name] = tuple(COLOR_MAP[name])
+    used = set(colors.values())
+    # The other courses probe the palette from their hashed position to the next unused colour,
+    # in name order so the result only depends on the set of names
+    for name in course_names:
+        if name in colors:
+            continue
+        start = _palette_index(name)
+        color = PALETTE[start]
+        for offset in range(len(PALETTE)):
+            candidate = PALETTE[(start + offset) % len(PALETTE)]
+            if candidate not in used:
+                color = candidate
+                break
+        colors[name] = color
+        used.add(color)
+    return MappingProxyType(colors)
+
+def allocate_colors(course_names, user_selected_colors=None):
+    """Assign a colour to every course name of a timetable, distinct while the palette lasts
+
+    Deterministic for a set of names and user colours, and memoised on them, so
+    Excel, Word and image exports of the same timetable share one allocation.
+    Returns a read-only {course name: (r, g, b)}.
+    """
+    names = {name for name in course_names if name}
+    user_colors = tuple(sorted(
+        (name, _parse_color(color)) for name, color in (user_selected_colors or {}).items() if name in names
+    ))
+    return _allocate(tuple(sorted(names)), user_colors)
+
+def color_hex(color):
+    """Format an (r, g, b) colour as RRGGBB"""
+    return f"{color[0]:02X}{color[1]:02X}{color[2]:02X}"
@@ -1,18 +1,292 @@
-def detect_conflicts(course_data):
-    """Detect course conflicts: course arrangements for the same teacher at the same time"""
+import re
+import time
+from threading import RLock
+from config import GRID_CONFIG
+from services.metrics_service import metrics
+
+# Resources that cannot be double booked: course field checked for each (day, period) slot
+CONFLICT_RESOURCES = ['教师', '班级', '地点']
+
+# Placeholder values used by the frontend for empty fields
+UNSPECIFIED_VALUES = ('', '未指定')
+
+# Conflict detection modes: exact (day, period) slots, 开始时间/结束时间 overlaps, or both
+CONFLICT_MODES = ('slot', 'time', 'all')
+
+# Occupancy bitsets: one bit per (day, period) of the 7 x 12 grid
+GRID_DAYS = GRID_CONFIG['days']
+PERIODS_PER_DAY = GRID_CONFIG['periods_per_day']
+FULL_MASK = (1 << (len(GRID_DAYS) * PERIODS_PER_DAY)) - 1
+_DAY_INDEX = {day: index for index, day in enumerate(GRID_DAYS)}
+
+_TIME_PATTERN = re.compile(r'^\s*(\d{1,2})\s*[:：]\s*(\d{2})')
+
+def resource_name(course, field):
+    """Get the resource name of a course, None if it is not set"""
+    value = course.get(field)
+    # NaN (a float JSON value) is not equal to itself
+    if value is None or value != value or value in UNSPECIFIED_VALUES:
+        return None
+    return value
+
+def course_slot(course):
+    """Get the (day, period) slot of a course, None if it is incomplete"""
+    day = course.get('星期')
+    period = course.get('节次')
+    if not day or period is None or period == '' or period != period:
+        return None
+    try:
+        period = int(period)
+    except (TypeError, ValueError):
+        pass
+    return day, period
+
+def slot_bit(slot):
+    """Get the bitset bit of a (day, period) slot, 0 if it is outside the grid"""
+    day_index = _DAY_INDEX.get(slot[0])
+    period = slot[1]
+    if day_index is None or not isinstance(period, int) or not 1 <= period <= PERIODS_PER_DAY:
+        return 0
+    return 1 << (day_index * PERIODS_PER_DAY + period - 1)
+
+def mask_to_slots(mask):
+    """Convert an occupancy bitset to a list of (day, period) slots"""
+    slots = []
+    while mask:
+        low_bit = mask & -mask
+        index = low_bit.bit_length() - 1
+        slots.append((GRID_DAYS[index // PERIODS_PER_DAY], index % PERIODS_PER_DAY + 1))
+        mask ^= low_bit
+    return slots
+
+def count_slots(mask):
+    """Count the occupied slots of a bitset"""
+    return bin(mask).count('1')
+
+def parse_time_to_minutes(value):
+    """Parse a time such as '08:00' into minutes since midnight, None if it is not a valid time"""
+    if value is None:
+        return None
+    if hasattr(value, 'hour') and hasattr(value, 'minute'):
+        return value.hour * 60 + value.minute
+    match = _TIME_PATTERN.match(str(value))
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 24 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+def _format_minutes(minutes):
+    """Format minutes since midnight as HH:MM"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _conflict_message(field, name, slot, count):
+    """Format a conflict message"""
+    return f"冲突：{field}{name}在{slot[0]}{slot[1]}节有{count}门课程"
+
+def _overlap_message(field, name, day, start, end, count):
+    """Format a time overlap message"""
+    return f"冲突：{field}{name}在{day}{_format_minutes(start)}~{_format_minutes(end)}有{count}门课程时间重叠"
+
+class ConflictIndex:
+    """Occupancy maps per teacher, class and location keyed by (day, period)
+
+    Every add/update/remove only touches the slots of the affected course, so the
+    conflicts a change introduces are known in O(1) per slot. Next to the maps each
+    resource has a 7 x 12 occupancy bitset (a plain int) used for conflict
+    pre-checks, free slot queries and utilisation stats.
+    """
+
+    def __init__(self, courses=None):
+        self.lock = RLock()
+        # field -> {(name, day, period): {course key: course}}
+        self.occupancy = {field: {} for field in CONFLICT_RESOURCES}
+        # field -> {name: occupancy bitset}
+        self.masks = {field: {} for field in CONFLICT_RESOURCES}
+        self.courses = {}
+        if courses is not None:
+            self.rebuild(courses)
+
+    def _slot_keys(self, course):
+        """Yield (field, occupancy key) for every resource slot a course occupies"""
+        slot = course_slot(course)
+        if slot is None:
+            return
+        for field in CONFLICT_RESOURCES:
+            name = resource_name(course, field)
+            if name is not None:
+                yield field, (name,) + slot
+
+    def check(self, course, exclude_key=None):
+        """Get the conflicts a course would introduce, without changing the index"""
+        conflicts = []
+        with self.lock:
+            for field, slot_key in self._slot_keys(course):
+                bit = slot_bit(slot_key[1:])
+                if bit and not self.masks[field].get(slot_key[0], 0) & bit:
+                    # Free slot according to the bitset (slots outside the grid are not covered)
+                    continue
+                occupants = self.occupancy[field].get(slot_key)
+                if not occupants:
+                    continue
+                count = len(occupants) - (1 if exclude_key in occupants else 0)
+                if count > 0:
+                    conflicts.append(_conflict_message(field, slot_key[0], slot_key[1:], count + 1))
+        return conflicts
+
+    def add(self, key, course):
+        """Add a course and return the conflicts it introduces"""
+        with self.lock:
+            if key in self.courses:
+                self.remove(key)
+            conflicts = self.check(course)
+            self.courses[key] = course
+            for field, slot_key in self._slot_keys(course):
+                self.occupancy[field].setdefault(slot_key, {})[key] = course
+                masks = self.masks[field]
+                masks[slot_key[0]] = masks.get(slot_key[0], 0) | slot_bit(slot_key[1:])
+            return conflicts
+
+    def remove(self, key):
+        """Remove a course from the index"""
+        with self.lock:
+            course = self.courses.pop(key, None)
+            if course is None:
+                return
+            for field, slot_key in self._slot_keys(course):
+                occupants = self.occupancy[field].get(slot_key)
+                if occupants is not None:
+                    occupants.pop(key, None)
+                    if not occupants:
+                        del self.occupancy[field][slot_key]
+                        masks = self.masks[field]
+                        mask = masks.get(slot_key[0], 0) & ~slot_bit(slot_key[1:])
+                        if mask:
+                            masks[slot_key[0]] = mask
+                        else:
+                            masks.pop(slot_key[0], None)
+
+    def update(self, key, course):
+        """Replace a course and return the conflicts the new version introduces"""
+        with self.lock:
+            self.remove(key)
+            return self.add(key, course)
+
+    def rebuild(self, courses):
+        """Rebuild the index from scratch (full recheck, e.g. after an import)"""
+        with self.lock:
+            self.occupancy = {field: {} for field in CONFLICT_RESOURCES}
+            self.masks = {field: {} for field in CONFLICT_RESOURCES}
+            self.courses = {}
+            for row, course in enumerate(courses):
+                key = course.get('id')
+                self.add(key if key is not None else ('row', row), course)
+
+    def occupancy_mask(self, field, name):
+        """Get the occupancy bitset of a resource"""
+        with self.lock:
+            return self.masks[field].get(name, 0)
+
+    def free_slots(self, resources):
+        """Get the (day, period) slots where all given resources ({field: name}) are free"""
+        busy = 0
+        with self.lock:
+            for field, name in resources.items():
+                busy |= self.masks[field].get(name, 0)
+        return mask_to_slots(FULL_MASK & ~busy)
+
+    def utilisation(self, field):
+        """Get occupied slot counts and utilisation rates of every resource of a field"""
+        total = len(GRID_DAYS) * PERIODS_PER_DAY
+        with self.lock:
+            masks = list(self.masks[field].items())
+        return [
+            {"name": name, "occupied": count_slots(mask), "rate": round(count_slots(mask) / total, 4)}
+            for name, mask in masks
+        ]
+
+    def conflicts_of(self, courses):
+        """Get the current conflicts at the slots occupied by the given courses, each reported once"""
+        conflicts = []
+        seen = set()
+        with self.lock:
+            for course in courses:
+                for field, slot_key in self._slot_keys(course):
+                    if (field, slot_key) in seen:
+                        continue
+                    seen.add((field, slot_key))
+                    occupants = self.occupancy[field].get(slot_key)
+                    if occupants and len(occupants) > 1:
+                        conflicts.append(_conflict_message(field, slot_key[0], slot_key[1:], len(occupants)))
+        return conflicts
+
+    def conflicts(self):
+        """Get all conflicts currently in the index"""
+        conflicts = []
+        with self.lock:
+            for field in CONFLICT_RESOURCES:
+                for slot_key, occupants in self.occupancy[field].items():
+                    if len(occupants) > 1:
+                        conflicts.append(_conflict_message(field, slot_key[0], slot_key[1:], len(occupants)))
+        return conflicts
+
+def detect_time_overlaps(courses, skip_same_slot=False):
+    """Detect overlapping lessons per teacher, class and location from 开始时间/结束时间
+
+    Intervals are grouped per (resource, day), sorted by start time and swept once,
+    so the whole dataset is checked in O(n log n). Each run of overlapping lessons is
+    reported as one conflict. With skip_same_slot, runs that only contain lessons of
+    the same (day, period) are left out because the slot check already reports them.
+    """
+    intervals = {}
+    for course in courses:
+        day = course.get('星期')
+        start = parse_time_to_minutes(course.get('开始时间'))
+        end = parse_time_to_minutes(course.get('结束时间'))
+        if not day or start is None or end is None or end <= start:
+            continue
+        slot = course_slot(course)
+        for field in CONFLICT_RESOURCES:
+            name = resource_name(course, field)
+            if name is not None:
+                intervals.setdefault((field, name, day), []).append((start, end, slot))
+
     conflicts = []
-    # Group by teacher and time to check
-    if "教师" in course_data.columns and "星期" in course_data.columns and "节次" in course_data.columns:
-        grouped = course_data.groupby(["教师", "星期", "节次"])
-        for key, group in grouped:
-            if len(group) > 1:
-                conflicts.append(f"冲突：教师{key[0]}在{key[1]}{key[2]}节有{len(group)}门课程")
-    
-    # Check course arrangements for the same class at the same time
-    if "班级" in course_data.columns and "星期" in course_data.columns and "节次" in course_data.columns:
-        grouped = course_data.groupby(["班级", "星期", "节次"])
-        for key, group in grouped:
-            if len(group) > 1:
-                conflicts.append(f"冲突：班级{key[0]}在{key[1]}{key[2]}节有{len(group)}门课程")
-    
-    return conflicts
\ No newline at end of file
+    for (field, name, day), items in intervals.items():
+        if len(items) < 2:
+            continue
+        items.sort(key=lambda item: (item[0], item[1]))
+        run = [items[0]]
+        run_end = items[0][1]
+        for item in items[1:] + [None]:
+            if item is not None and item[0] < run_end:
+                run.append(item)
+                run_end = max(run_end, item[1])
+                continue
+            if len(run) > 1 and not (skip_same_slot and len({entry[2] for entry in run}) == 1):
+                conflicts.append(_overlap_message(field, name, day, run[0][0], run_end, len(run)))
+            if item is not None:
+                run = [item]
+                run_end = item[1]
+    return conflicts
+
+def detect_conflicts(course_data, mode='slot'):
+    """Detect course conflicts: the same teacher, class or location booked twice at the same time
+
+    mode 'slot' compares (day, period) slots, 'time' compares 开始时间/结束时间 intervals
+    and 'all' reports both.
+    """
+    if mode not in CONFLICT_MODES:
+        raise ValueError(f"不支持的冲突检测模式: {mode}")
+    started = time.perf_counter()
+    # Course dictionaries and CourseRecords both provide get() with the field names
+    course_data = course_data or []
+
+    conflicts = []
+    if mode in ('slot', 'all'):
+        conflicts.extend(ConflictIndex(course_data).conflicts())
+    if mode in ('time', 'all'):
+        conflicts.extend(detect_time_overlaps(course_data, skip_same_slot=(mode == 'all')))
+    metrics.observe_phase('conflict_grouping', started)
+    return conflicts
@@ -0,0 +1,87 @@
+from sys import intern
+
+# Course field -> CourseRecord attribute
+COURSE_FIELDS = {
+    '课程名称': 'name',
+    '教师': 'teacher',
+    '班级': 'class_name',
+    '地点': 'location',
+    '星期': 'day',
+    '节次': 'period',
+    '开始时间': 'start_time',
+    '结束时间': 'end_time',
+    '备注': 'notes',
+    'id': 'id'
+}
+
+def _text(value):
+    """Normalize a field value: missing -> '', strings interned (teacher/class/room names repeat a lot)"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return intern(value)
+    return value
+
+class CourseRecord:
+    """Compact, read-only view of a course dictionary used on the export and conflict paths
+
+    One slot per known field instead of a dict (or a pandas row) per course.
+    get() mirrors dict.get with the Chinese field names, so code written against
+    course dictionaries works on records unchanged.
+    """
+
+    __slots__ = tuple(COURSE_FIELDS.values())
+
+    def __init__(self, course):
+        get = course.get
+        self.name = _text(get('课程名称'))
+        self.teacher = _text(get('教师'))
+        self.class_name = _text(get('班级'))
+        self.location = _text(get('地点'))
+        self.day = _text(get('星期'))
+        period = get('节次')
+        try:
+            # The grid is keyed by integer periods, the frontend may send '1'
+            self.period = int(period)
+        except (TypeError, ValueError):
+            self.period = _text(period)
+        self.start_time = _text(get('开始时间'))
+        self.end_time = _text(get('结束时间'))
+        self.notes = _text(get('备注'))
+        self.id = get('id')
+
+    def get(self, field, default=None):
+        attribute = COURSE_FIELDS.get(field)
+        if attribute is None:
+            return default
+        return getattr(self, attribute)
+
+    def cell_text(self):
+        """Text of the course in a timetable cell"""
+        text = f"{self.name}"
+        if self.teacher and self.teacher != '未指定':
+            text += f"\n教师：{self.teacher}"
+        if self.location and self.location != '未指定':
+            text += f"\n地点：{self.location}"
+        if self.start_time and self.end_time:
+            text += f"\n时间：{self.start_time}~{self.end_time}"
+        if self.notes:
+            text += f"\n备注：{self.notes}"
+        return text
+
+def to_records(courses):
+    """Convert course dictionaries to CourseRecords (records are passed through)"""
+    return [course if isinstance(course, CourseRecord) else CourseRecord(course) for course in courses]
+
+def bucket_by_slot(records):
+    """Group records by (day, period) in one pass, in input order within a slot"""
+    buckets = {}
+    for record in records:
+        if record.day and record.period:
+            key = (record.day, record.period)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [record]
+            else:
+                bucket.append(record)
+    return buckets
@@ -1,207 +1,269 @@
-import pandas as pd
+import logging
+import tempfile
+import time
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from io import BytesIO
-from config import EXPORT_CONFIG, DEFAULT_COLORS
-from services.color_service import get_course_color
+from config import EXPORT_CONFIG
+from services.color_service import allocate_colors, color_hex
 from services.base_export_service import BaseExportService
+from services.course_record import to_records, bucket_by_slot
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Shared style components, created once instead of per cell
+THIN_SIDE = Side(style='thin', color='000000')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+CENTER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+COURSE_ALIGNMENT = Alignment(wrap_text=True, vertical='center', horizontal='left')
+
+# Named styles of the timetable template: name -> style attributes
+TEMPLATE_STYLES = {
+    'timetable_title': {'font': Font(size=16, bold=True), 'alignment': CENTER_ALIGNMENT, 'border': THIN_BORDER},
+    'timetable_header': {
+        'font': Font(bold=True), 'alignment': CENTER_ALIGNMENT, 'border': THIN_BORDER,
+        'fill': PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+    },
+    'timetable_band': {
+        'font': Font(bold=True), 'alignment': CENTER_ALIGNMENT, 'border': THIN_BORDER,
+        'fill': PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid")
+    },
+    'timetable_period': {
+        'font': DEFAULT_FONT, 'alignment': CENTER_ALIGNMENT, 'border': THIN_BORDER,
+        'fill': PatternFill(start_color="F0F0F0", end_color="F0F0F0", fill_type="solid")
+    },
+    'timetable_empty': {'font': DEFAULT_FONT, 'border': THIN_BORDER},
+    'timetable_course': {'font': DEFAULT_FONT, 'alignment': COURSE_ALIGNMENT, 'border': THIN_BORDER}
+}
+
+# Course colour fills, shared by every export
+_course_fills = {}
+
+def _course_fill(color_hex):
+    """Get the shared fill of a course colour"""
+    fill = _course_fills.get(color_hex)
+    if fill is None:
+        fill = _course_fills[color_hex] = PatternFill(start_color=color_hex, end_color=color_hex, fill_type="solid")
+    return fill
+
+def _build_skeleton():
+    """Precompute the boilerplate of the timetable sheet (everything except course cells)"""
+    cells = [(1, 1, None, 'timetable_title')]  # Title value is filled per export
+    merges = ['A1:H1']
+    headers = ['节次/星期', '星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
+    for col, header in enumerate(headers, 1):
+        cells.append((2, col, header, 'timetable_header'))
+
+    # Morning starts from row 3, afternoon from row 8, evening study from row 13
+    slots = []
+    for i, (band, start_row) in enumerate(zip(['上午', '下午', '晚自习'], [3, 8, 13])):
+        merges.append(f'A{start_row}:H{start_row}')
+        cells.append((start_row, 1, band, 'timetable_band'))
+        for row_offset in range(4):
+            row = start_row + row_offset + 1
+            period_num = row_offset + 1 + i * 4  # Period number: 1-4, 5-8, 9-12
+            cells.append((row, 1, f'第{period_num}节', 'timetable_period'))
+            for col, day in enumerate(headers[1:], 2):
+                # Convert "星期一" etc. to "周一" etc. to match data
+                slots.append((row, col, (day.replace('星期', '周'), period_num)))
+
+    row_heights = {row: 25 if row in (3, 8, 13) else 60 for row in range(1, 18)}
+    period_labels = [value for _, col, value, _ in cells if col == 1 and value and value.startswith('第')]
+    return {'cells': cells, 'merges': merges, 'slots': slots, 'row_heights': row_heights,
+            'period_labels': period_labels}
+
+# Built once at import time and reused by every export
+SKELETON = _build_skeleton()
+
+def _text_width(content):
+    """Estimate the display width of multi-line cell content"""
+    max_width = 0
+    for line in content.split('\n'):
+        # Chinese characters take more space
+        line_width = 0
+        for char in line:
+            if ord(char) > 127:  # Unicode value for non-ASCII characters
+                line_width += 2.5  # Increased width for Chinese characters
+            else:
+                line_width += 1.2  # Slightly more width for English characters
+        max_width = max(max_width, line_width)
+    return max_width
+
+# Width of the period label column never changes
+PERIOD_COLUMN_WIDTH = max([12] + [_text_width(label) for label in SKELETON['period_labels']])
 
 class ExcelExportService(BaseExportService):
     """Excel export service"""
     
-    def generate_excel(self, df, output, title):
+    def generate_excel(self, records, output, title, user_selected_colors=None):
         """Generate Excel file"""
         try:
             # Create workbook and worksheet
             wb = Workbook()
             ws = wb.active
             ws.title = title
-            
-            # Define border style with black color to match requirement
-            thin_border = Border(
-                left=Side(style='thin', color='000000'),
-                right=Side(style='thin', color='000000'),
-                top=Side(style='thin', color='000000'),
-                bottom=Side(style='thin', color='000000')
-            )
-            
-            # Create a dictionary for quick course lookup
-            course_dict = {}
-            for _, course in df.iterrows():
-                # Ensure weekday and period fields exist
-                day = course.get('星期', '')
-                period = course.get('节次', '')
-                if day and period:
-                    key = (day, period)
-                    if key not in course_dict:
-                        course_dict[key] = []
-                    course_dict[key].append(course)
-            
-            # Set title
-            ws.merge_cells('A1:H1')
-            title_cell = ws['A1']  # Get the top-left cell of the merged area
-            title_cell.value = title
-            title_cell.font = Font(size=16, bold=True)
-            title_cell.alignment = Alignment(horizontal='center', vertical='center')
-            title_cell.border = thin_border
-            
-            # Set headers
-            headers = ['节次/星期', '星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=2, column=col, value=header)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-                cell.border = thin_border
-            
-            # Set morning/afternoon/evening study identifiers and courses
-            time_periods = ['上午', '下午', '晚自习']
-            # Each period start row: morning starts from row 3, afternoon from row 8, evening study from row 13
-            period_starts = [3, 8, 13]
-            
-            # Store content for calculating column widths
-            column_contents = {i: [] for i in range(1, 9)}
-            
-            # Keep track of assigned colors to ensure different courses have different colors
-            assigned_colors = {}
-            
-            for i, (period, start_row) in enumerate(zip(time_periods, period_starts)):
-                # Set period identifier (merge cells)
-                ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row, end_column=8)
-                period_cell = ws[f'A{start_row}']  # Get the top-left cell of the merged area
-                period_cell.value = period
-                period_cell.font = Font(bold=True)
-                period_cell.alignment = Alignment(horizontal='center', vertical='center')
-                period_cell.fill = PatternFill(start_color="E2E8F0", end_color="E2E8F0", fill_type="solid")
-                period_cell.border = thin_border
-                
-                # Fill courses for this period (4 classes)
-                for row_offset in range(4):
-                    row = start_row + row_offset + 1  # Start filling courses from period identifier row + 1
-                    period_num = row_offset + 1 + i * 4  # Period number: 1-4, 5-8, 9-12
-                    # Set period
-                    period_cell = ws.cell(row=row, column=1, value=f'第{period_num}节')
-                    period_cell.alignment = Alignment(horizontal='center', vertical='center')
-                    period_cell.fill = PatternFill(start_color="F0F0F0", end_color="F0F0F0", fill_type="solid")
-                    period_cell.border = thin_border
-                    column_contents[1].append(period_cell.value)
-                    
-                    # Fill daily courses
-                    days = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
-                    for col, day in enumerate(days, 2):
-                        # Convert "星期一" etc. to "周一" etc. to match data
-                        day_short = day.replace('星期', '周')
-                        key = (day_short, period_num)
-                        if key in course_dict:
-                            courses = course_dict[key]
-                            # If there are multiple courses at the same time, display all courses
-                            course_texts = []
-                            for course in courses:
-                                # Get course information, ensure fields exist
-                                course_name = course.get('课程名称', '')
-                                teacher = course.get('教师', '')
-                                location = course.get('地点', '')
-                                start_time = course.get('开始时间', '')
-                                end_time = course.get('结束时间', '')
-                                notes = course.get('备注', '')
-                                
-                                course_text = course_name
-                                if teacher and teacher != '未指定':
-                                    course_text += f"\n教师：{teacher}"
-                                if location and location != '未指定':
-                                    course_text += f"\n地点：{location}"
-                                if start_time and end_time:
-                                    course_text += f"\n时间：{start_time}~{end_time}"
-                                if notes:
-                                    course_text += f"\n备注：{notes}"
-                                course_texts.append(course_text)
-                            
-                            cell_content = '\n'.join(course_texts)
-                            cell = ws.cell(row=row, column=col, value=cell_content)
-                            cell.alignment = Alignment(wrap_text=True, vertical='center', horizontal='left')
-                            cell.border = thin_border
-                            column_contents[col].append(cell_content)
-                            
-                            # Get course color - ensure it matches frontend
-                            first_course = courses[0]
-                            course_name = first_course.get('课程名称', '')
-                            user_selected_colors = first_course.get('user_selected_colors', {})
-                            if course_name:
-                                # Check if we've already assigned a color for this course name
-                                if course_name in assigned_colors:
-                                    # Use the already assigned color for consistency
-                                    color_rgb = assigned_colors[course_name]
-                                else:
-                                    # Get color from color service
-                                    color_rgb = get_course_color(course_name, user_selected_colors)
-                                    
-                                    # Ensure this color is not already used by another course
-                                    used_colors = set(assigned_colors.values())
-                                    color_index = 0
-                                    # If the color is already used, find a different one
-                                    while tuple(color_rgb) in used_colors and color_index < len(DEFAULT_COLORS):
-                                        color_rgb = DEFAULT_COLORS[color_index]
-                                        color_index += 1
-                                    
-                                    # Store the assigned color for this course name
-                                    assigned_colors[course_name] = color_rgb
-                                
-                                color_hex = f"{color_rgb[0]:02X}{color_rgb[1]:02X}{color_rgb[2]:02X}"
-                                fill = PatternFill(start_color=color_hex, end_color=color_hex, fill_type="solid")
-                                cell.fill = fill
-                        else:
-                            # Even if no course, add empty content for width calculation
-                            cell = ws.cell(row=row, column=col, value="")
-                            cell.border = thin_border
-                            column_contents[col].append("")
-            
-            # Set column widths based on content
-            for col_idx in range(1, 9):
-                # Calculate width based on content
-                max_width = 12  # Minimum width
-                for content in column_contents[col_idx]:
-                    # Calculate max line width in multi-line content
-                    lines = content.split('\n')
-                    for line in lines:
-                        # For Chinese characters, we need more width
-                        line_width = 0
-                        for char in line:
-                            # Chinese characters take more space
-                            if ord(char) > 127:  # Unicode value for non-ASCII characters
-                                line_width += 2.5  # Increased width for Chinese characters
-                            else:
-                                line_width += 1.2  # Slightly more width for English characters
-                        
-                        max_width = max(max_width, line_width)
-                
-                # Apply adjustments - ensure time can be displayed in one line
-                adjusted_width = min(max(max_width, 15), 50)  # Ensure minimum 15 for time display
-                ws.column_dimensions[chr(64 + col_idx)].width = adjusted_width
-            
-            # Set row heights
-            for row in range(1, 18):  # Update row range to fit new structure
-                if row in [3, 8, 13]:  # Morning/afternoon/evening study rows
-                    ws.row_dimensions[row].height = 25
-                else:
-                    ws.row_dimensions[row].height = 60  # Increased height for better text display
+            self.render_worksheet(ws, records, title, user_selected_colors)
             
             # Save to output stream
+            started = time.perf_counter()
+            wb.save(output)
+            metrics.observe_phase('excel_save', started)
+        except Exception:
+            logger.exception("Error generating Excel")
+            raise
+
+    def _add_template_styles(self, wb):
+        """Register the named styles of the template in a workbook"""
+        for name, attributes in TEMPLATE_STYLES.items():
+            if name not in wb.named_styles:
+                wb.add_named_style(NamedStyle(name=name, **attributes))
+
+    def layout_courses(self, records, user_selected_colors=None):
+        """Compute course cell contents, colours and column widths of a timetable
+
+        Returns ({(row, col): (content, colour hex or None)}, {column letter: width}).
+        """
+        # Create a dictionary for quick course lookup
+        course_dict = bucket_by_slot(records)
+        # Distinct colours per course name, shared with the Word and image exports
+        colors = allocate_colors((record.name for record in records), user_selected_colors)
+
+        course_cells = {}
+        # Maximum content width of each day column
+        column_widths = {col: 12 for col in range(2, 9)}
+
+        for row, col, key in SKELETON['slots']:
+            if key not in course_dict:
+                continue
+
+            courses = course_dict[key]
+            # If there are multiple courses at the same time, display all courses
+            cell_content = '\n'.join(course.cell_text() for course in courses)
+            column_widths[col] = max(column_widths[col], _text_width(cell_content))
+
+            # The cell takes the colour of its first course
+            course_name = courses[0].name
+            course_cells[(row, col)] = (cell_content, color_hex(colors[course_name]) if course_name else None)
+
+        # Apply adjustments - ensure time can be displayed in one line (minimum 15)
+        widths = {'A': min(max(PERIOD_COLUMN_WIDTH, 15), 50)}
+        for col, width in column_widths.items():
+            widths[chr(64 + col)] = min(max(width, 15), 50)
+        return course_cells, widths
+
+    def render_worksheet(self, ws, records, title, user_selected_colors=None):
+        """Draw the timetable of the given courses into a worksheet
+
+        The boilerplate (title, headers, bands, period labels, merges, row heights)
+        comes from the precomputed skeleton and every cell gets a shared named
+        style, so only the course cells are built per export.
+        """
+        self._add_template_styles(ws.parent)
+        started = time.perf_counter()
+        course_cells, widths = self.layout_courses(records, user_selected_colors)
+        metrics.observe_phase('excel_layout', started)
+
+        # Draw the skeleton
+        started = time.perf_counter()
+        for merge in SKELETON['merges']:
+            ws.merge_cells(merge)
+        for row, col, value, style in SKELETON['cells']:
+            cell = ws.cell(row=row, column=col, value=title if value is None else value)
+            cell.style = style
+
+        # Fill course cells
+        for row, col, _ in SKELETON['slots']:
+            content, color_hex = course_cells.get((row, col), ("", None))
+            cell = ws.cell(row=row, column=col, value=content)
+            if (row, col) not in course_cells:
+                cell.style = 'timetable_empty'
+                continue
+            cell.style = 'timetable_course'
+            if color_hex:
+                cell.fill = _course_fill(color_hex)
+
+        # Set column widths based on content
+        for column, width in widths.items():
+            ws.column_dimensions[column].width = width
+
+        # Set row heights
+        for row, height in SKELETON['row_heights'].items():
+            ws.row_dimensions[row].height = height
+        metrics.observe_phase('excel_styling', started)
+
+    def write_only_worksheet(self, ws, records, title, user_selected_colors=None):
+        """Write the timetable into a write-only (streaming) worksheet row by row"""
+        started = time.perf_counter()
+        course_cells, widths = self.layout_courses(records, user_selected_colors)
+        metrics.observe_phase('excel_layout', started)
+        started = time.perf_counter()
+
+        # Dimensions and merges have to be set before the first row is written
+        for column, width in widths.items():
+            ws.column_dimensions[column].width = width
+        for row, height in SKELETON['row_heights'].items():
+            ws.row_dimensions[row].height = height
+        for merge in SKELETON['merges']:
+            ws.merged_cells.add(merge)
+
+        rows = {}
+        for row, col, value, style in SKELETON['cells']:
+            rows.setdefault(row, {})[col] = (title if value is None else value, style, None)
+        for row, col, _ in SKELETON['slots']:
+            if (row, col) in course_cells:
+                content, color_hex = course_cells[(row, col)]
+                rows.setdefault(row, {})[col] = (content, 'timetable_course', color_hex)
+            else:
+                rows.setdefault(row, {})[col] = ("", 'timetable_empty', None)
+
+        for row in range(1, max(rows) + 1):
+            cells = []
+            for col in range(1, 9):
+                value, style, color_hex = rows.get(row, {}).get(col, (None, None, None))
+                cell = WriteOnlyCell(ws, value=value)
+                if style:
+                    cell.style = style
+                if color_hex:
+                    cell.fill = _course_fill(color_hex)
+                cells.append(cell)
+            ws.append(cells)
+        metrics.observe_phase('excel_styling', started)
+
+    def iter_excel_stream(self, sheets, chunk_size=None, user_selected_colors=None):
+        """Stream a multi-sheet workbook in chunks, built with write-only worksheets
+
+        sheets is an iterable of (sheet name, courses, timetable title). Rows go to
+        temporary files while the workbook is written and the finished file is read
+        back in chunks, so memory stays bounded whatever the workbook size.
+        """
+        chunk_size = chunk_size or EXPORT_CONFIG['stream_chunk_size']
+        wb = Workbook(write_only=True)
+        self._add_template_styles(wb)
+        for sheet_name, courses, sheet_title in sheets:
+            ws = wb.create_sheet(sheet_name)
+            self.write_only_worksheet(ws, to_records(courses), sheet_title, user_selected_colors)
+
+        with tempfile.TemporaryFile() as output:
+            started = time.perf_counter()
             wb.save(output)
-        except Exception as e:
-            # Record detailed error information
-            import traceback
-            error_info = traceback.format_exc()
-            print(f"Error generating Excel: {str(e)}")
-            print(f"Detailed error information:\n{error_info}")
-            raise e
+            metrics.observe_phase('excel_save', started)
+            output.seek(0)
+            while True:
+                chunk = output.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
 
     def create_excel_export(self, data):
         """Create Excel export"""
-        df, title, _ = self.prepare_data(data)
+        records, title, raw_data = self.prepare_data(data)
         
         # Generate Excel file to memory
         output = BytesIO()
-        self.generate_excel(df, output, title)
+        self.generate_excel(records, output, title, raw_data.get('userSelectedColors', {}))
         output.seek(0)
         
         # Return file stream directly
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from config import EXPORT_CACHE_CONFIG, EXPORT_CONFIG
+from services.metrics_service import metrics
+
+# Part of every key, bump it when identical requests start rendering differently
+# (2: colours from the stable allocator instead of the per-process salted hash())
+RENDER_VERSION = 2
+
+class ExportCache:
+    """Content-addressed cache of rendered export files
+
+    Entries are keyed by a hash of the canonical export request (courses, title,
+    user selected colours and format), kept in memory with LRU eviction bounded
+    by entry count and total size, and optionally spilled to a disk directory.
+    Evicted entries are picked under the lock and written to disk after it is
+    released, until then they are still served from memory.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, disk_dir=None, disk_max_bytes=None):
+        self.max_entries = max_entries or EXPORT_CACHE_CONFIG['max_entries']
+        self.max_bytes = max_bytes or EXPORT_CACHE_CONFIG['max_bytes']
+        self.disk_dir = disk_dir if disk_dir is not None else EXPORT_CACHE_CONFIG['disk_dir']
+        self.disk_max_bytes = disk_max_bytes or EXPORT_CACHE_CONFIG['disk_max_bytes']
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.disk_entries = OrderedDict()
+        self.disk_bytes = 0
+        # Evicted entries being written to disk
+        self.spilling = {}
+        self.hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(export_format, data, variant=None):
+        """Hash the parts of an export request that affect the rendered file
+
+        variant identifies renderer state that changes the output as well (the
+        font of PNG/PDF exports).
+        """
+        canonical = json.dumps(
+            [
+                RENDER_VERSION,
+                export_format,
+                data.get('courses', []),
+                data.get('title', EXPORT_CONFIG['default_title']),
+                data.get('userSelectedColors', {}),
+                variant
+            ],
+            ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Get cached bytes, None on a miss"""
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return content
+            content = self.spilling.get(key)
+        if content is None:
+            content = self._read_disk(key)
+        with self.lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            victims = self._store(key, content)
+        self._spill(victims)
+        return content
+
+    def put(self, key, content):
+        """Cache rendered bytes"""
+        if len(content) > self.max_bytes:
+            return
+        with self.lock:
+            victims = self._store(key, content)
+        self._spill(victims)
+
+    def _store(self, key, content):
+        """Insert into the memory LRU and evict, returns the evicted entries to spill (caller holds the lock)"""
+        if key in self.entries:
+            self.total_bytes -= len(self.entries.pop(key))
+        self.entries[key] = content
+        self.total_bytes += len(content)
+        victims = []
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+            if (self.disk_dir and evicted_key not in self.disk_entries and evicted_key not in self.spilling
+                    and len(evicted) <= self.disk_max_bytes):
+                self.spilling[evicted_key] = evicted
+                victims.append((evicted_key, evicted))
+        return victims
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _load_disk_index(self):
+        """Index the files already spilled to disk, oldest first"""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.bin'):
+                path = os.path.join(self.disk_dir, name)
+                files.append((os.path.getmtime(path), name[:-4], os.path.getsize(path)))
+        for _, key, size in sorted(files):
+            self.disk_entries[key] = size
+            self.disk_bytes += size
+
+    def _spill(self, victims):
+        """Write evicted entries to disk and drop the oldest files over the limit (without the lock)"""
+        for key, content in victims:
+            path = self._disk_path(key)
+            try:
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(content)
+                os.replace(path + '.tmp', path)
+            except OSError:
+                with self.lock:
+                    self.spilling.pop(key, None)
+                continue
+            removed = []
+            with self.lock:
+                self.spilling.pop(key, None)
+                self.disk_entries[key] = len(content)
+                self.disk_bytes += len(content)
+                while self.disk_bytes > self.disk_max_bytes:
+                    old_key, size = self.disk_entries.popitem(last=False)
+                    self.disk_bytes -= size
+                    removed.append(old_key)
+            for old_key in removed:
+                try:
+                    os.remove(self._disk_path(old_key))
+                except OSError:
+                    pass
+
+    def _read_disk(self, key):
+        """Read a spilled entry, None if it is not on disk"""
+        if not self.disk_dir or key not in self.disk_entries:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            # The file is gone, forget it so the next eviction writes it again
+            with self.lock:
+                size = self.disk_entries.pop(key, None)
+                if size is not None:
+                    self.disk_bytes -= size
+            return None
+
+    def stats(self):
+        """Get cache statistics"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "disk_entries": len(self.disk_entries),
+                "disk_bytes": self.disk_bytes
+            }
+
+    def metric_samples(self):
+        """Cache statistics as /metrics samples"""
+        stats = self.stats()
+        return [
+            ('schedule_export_cache_hits_total', 'counter', 'Export cache hits', {}, stats['hits']),
+            ('schedule_export_cache_misses_total', 'counter', 'Export cache misses', {}, stats['misses']),
+            ('schedule_export_cache_hit_ratio', 'gauge', 'Export cache hit ratio', {}, stats['hit_rate']),
+            ('schedule_export_cache_entries', 'gauge', 'Cached exports', {'tier': 'memory'}, stats['entries']),
+            ('schedule_export_cache_entries', 'gauge', 'Cached exports', {'tier': 'disk'}, stats['disk_entries']),
+            ('schedule_export_cache_bytes', 'gauge', 'Size of the cached exports', {'tier': 'memory'}, stats['bytes']),
+            ('schedule_export_cache_bytes', 'gauge', 'Size of the cached exports', {'tier': 'disk'}, stats['disk_bytes'])
+        ]
+
+# Create a global instance
+export_cache = ExportCache()
+metrics.register_collector(export_cache.metric_samples)
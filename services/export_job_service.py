@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from config import EXPORT_JOB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class ExportQueueFull(Exception):
+    """Raised when a process already has max_pending jobs queued or running"""
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+class ExportJobQueue:
+    """Background rendering of exports that are too slow to run inside a request
+
+    A job goes queued -> running -> done | failed and is identified by the hash of
+    its request, so identical requests share one job and one rendered file until it
+    expires. Each job is a JSON state file plus
+    the rendered file in a directory shared by all worker processes, so a job can
+    be polled and downloaded from any process. Rendering runs on a bounded thread
+    pool in the process that accepted the job.
+    """
+
+    def __init__(self, job_dir=None, workers=None, max_pending=None, ttl=None):
+        self.job_dir = job_dir or EXPORT_JOB_CONFIG['dir']
+        self.workers = workers or EXPORT_JOB_CONFIG['workers']
+        self.max_pending = max_pending or EXPORT_JOB_CONFIG['max_pending']
+        self.ttl = ttl or EXPORT_JOB_CONFIG['ttl']
+        self.lock = Lock()
+        self.executor = None
+        self.executor_pid = None
+        self.pending = 0
+        self.last_cleanup = 0
+
+    @staticmethod
+    def make_id(kind, data):
+        """Hash the whole export request, identical requests get the same job"""
+        canonical = json.dumps([kind, data], ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+    def _state_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.bin")
+
+    def _load(self, job_id):
+        try:
+            with open(self._state_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Missing, or a state file being created by another process
+            return None
+
+    def _save(self, job):
+        path = self._state_path(job['id'])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def _is_stale(self, job):
+        """Expired, or abandoned by a process that died while rendering it"""
+        if job['status'] in ('done', 'failed'):
+            return job['expires'] < time.time()
+        return not _pid_alive(job['pid'])
+
+    def _remove(self, job_id):
+        for path in (self._state_path(job_id), self.artifact_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """Delete expired and abandoned jobs and their files"""
+        self.last_cleanup = time.time()
+        try:
+            names = os.listdir(self.job_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.json'):
+                job = self._load(name[:-5])
+                if job is not None and self._is_stale(job):
+                    self._remove(job['id'])
+
+    def get(self, job_id):
+        """Get the state of a job, None if it is unknown or expired"""
+        if len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        job = self._load(job_id)
+        if job is None or self._is_stale(job):
+            return None
+        return job
+
+    def submit(self, kind, data, render, total=1):
+        """Queue a render, or return the existing job for an identical request
+
+        render(output, progress) writes the file to the binary stream output, may
+        call progress(done) as its total steps complete and returns (download
+        name, mimetype). data only identifies the job. Returns (job, created).
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_id = self.make_id(kind, data)
+        with self.lock:
+            if time.time() - self.last_cleanup > 60:
+                self.cleanup()
+            job = self.get(job_id)
+            if job is not None and job['status'] != 'failed':
+                return job, False
+            if self.pending >= self.max_pending:
+                raise ExportQueueFull("导出任务过多，请稍后再试")
+            job = {
+                'id': job_id,
+                'type': kind,
+                'status': 'queued',
+                'progress': {'done': 0, 'total': total},
+                'created': time.time(),
+                'pid': os.getpid()
+            }
+            try:
+                if self._load(job_id) is None:
+                    # Claim the job, another process may be submitting the same request
+                    with open(self._state_path(job_id), 'x', encoding='utf-8') as f:
+                        json.dump(job, f, ensure_ascii=False)
+                else:
+                    # Replace a failed or stale job
+                    self._save(job)
+            except FileExistsError:
+                return self._load(job_id) or job, False
+            if self.executor is None or self.executor_pid != os.getpid():
+                # Worker threads do not survive fork(), each process gets its own pool
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='export-job')
+                self.executor_pid = os.getpid()
+                self.pending = 0
+            self.pending += 1
+            self.executor.submit(self._run, job, render)
+            return job, True
+
+    def _run(self, job, render):
+        job['status'] = 'running'
+        job['started'] = time.time()
+        self._save(job)
+        last_write = [0]
+
+        def progress(done):
+            job['progress']['done'] = done
+            if time.time() - last_write[0] >= EXPORT_JOB_CONFIG['progress_interval']:
+                last_write[0] = time.time()
+                self._save(job)
+
+        path = self.artifact_path(job['id'])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as output:
+                filename, mimetype = render(output, progress)
+            os.replace(temp_path, path)
+            job.update(status='done', filename=filename, mimetype=mimetype, size=os.path.getsize(path))
+            job['progress']['done'] = job['progress']['total']
+        except Exception as e:
+            logger.exception("Error rendering export job %s", job['id'])
+            job.update(status='failed', error=str(e))
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        finally:
+            job['finished'] = time.time()
+            job['expires'] = job['finished'] + self.ttl
+            self._save(job)
+            with self.lock:
+                self.pending -= 1
+
+# Create a global instance
+export_jobs = ExportJobQueue()
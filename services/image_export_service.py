@@ -0,0 +1,273 @@
+import logging
+import os
+import tempfile
+import time
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
+from config import EXPORT_CONFIG, GRID_CONFIG, IMAGE_EXPORT_CONFIG
+from services.color_service import allocate_colors
+from services.base_export_service import BaseExportService, ExportUnavailable
+from services.course_record import to_records, bucket_by_slot
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Page geometry in layout units (scaled by IMAGE_EXPORT_CONFIG['scale'], 1/72 inch in PDFs)
+MARGIN = 20
+TITLE_HEIGHT = 56
+HEADER_HEIGHT = 32
+BAND_HEIGHT = 26
+PERIOD_HEIGHT = 88
+LABEL_WIDTH = 80
+DAY_WIDTH = 150
+CARD_GAP = 3
+CARD_PADDING = 4
+TITLE_SIZE = 22
+HEADER_SIZE = 14
+NAME_SIZE = 12
+TEXT_SIZE = 10
+
+# Morning, afternoon and evening study: (band label, first period), 4 periods each
+BANDS = [('上午', 1), ('下午', 5), ('晚自习', 9)]
+PERIODS_PER_BAND = 4
+
+# Colours of the web page timetable
+BACKGROUND = (248, 250, 252)
+WHITE = (255, 255, 255)
+HEADER_FILL = (204, 204, 204)
+BAND_FILL = (226, 232, 240)
+PERIOD_FILL = (240, 240, 240)
+LINE_COLOR = (0, 0, 0)
+TEXT_COLOR = (33, 33, 33)
+
+class FontUnavailable(ExportUnavailable):
+    """Raised when no font with Chinese glyphs is installed, every character would render as a box"""
+
+@lru_cache(maxsize=None)
+def _font_path():
+    """The configured font, or the first installed candidate with Chinese glyphs"""
+    for path in [IMAGE_EXPORT_CONFIG['font_path']] + IMAGE_EXPORT_CONFIG['font_candidates']:
+        if path and os.path.exists(path):
+            return path
+    logger.error("No font with Chinese glyphs found, set SCHEDULE_FONT_PATH to enable PNG/PDF exports")
+    return None
+
+def require_font():
+    """Get the font path, raises FontUnavailable without one"""
+    path = _font_path()
+    if path is None:
+        raise FontUnavailable("服务器未安装中文字体，无法生成PNG/PDF，请设置环境变量 SCHEDULE_FONT_PATH")
+    return path
+
+def font_signature():
+    """Identify the font in export cache keys, a render with another font is another file"""
+    path = require_font()
+    stat = os.stat(path)
+    return f"{path}:{stat.st_size}:{int(stat.st_mtime)}"
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    """Load the timetable font at a pixel size, once per size"""
+    return ImageFont.truetype(require_font(), size)
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, font, width):
+    """Break multi-line text into lines no wider than width pixels (per character, as CJK text has no spaces)"""
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        for char in paragraph:
+            if line and font.getlength(line + char) > width:
+                lines.append(line)
+                line = char
+            else:
+                line += char
+        lines.append(line)
+    return tuple(lines)
+
+@lru_cache(maxsize=8192)
+def text_mask(text, font):
+    """Render a line of text once into an alpha mask, returns (mask, offset)
+
+    Times, teacher and room names repeat across cells and timetables, pasting a
+    cached mask is much cheaper than rasterising the glyphs again.
+    """
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font)
+    return mask, (left, top)
+
+class TimetableLayout:
+    """Geometry, fonts and the pre-drawn empty grid of a timetable page at one scale
+
+    Built once per scale and shared by every render, which only copies the grid
+    and draws the title and course cards on it.
+    """
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.title_font = load_font(self.px(TITLE_SIZE))
+        self.header_font = load_font(self.px(HEADER_SIZE))
+        self.name_font = load_font(self.px(NAME_SIZE))
+        self.text_font = load_font(self.px(TEXT_SIZE))
+
+        days = GRID_CONFIG['days']
+        left = self.px(MARGIN)
+        label_right = left + self.px(LABEL_WIDTH)
+        self.columns = [(label_right + self.px(DAY_WIDTH) * i, label_right + self.px(DAY_WIDTH) * (i + 1))
+                        for i in range(len(days))]
+        self.width = self.columns[-1][1] + self.px(MARGIN)
+        right = self.columns[-1][1]
+
+        top = self.px(MARGIN)
+        self.title_box = (left, top, right, top + self.px(TITLE_HEIGHT))
+        y = self.title_box[3]
+        # (box, fill, text, font) of every fixed cell
+        self.fixed_cells = [((left, y, label_right, y + self.px(HEADER_HEIGHT)), HEADER_FILL, '节次/星期', self.header_font)]
+        for day, (x0, x1) in zip(days, self.columns):
+            self.fixed_cells.append(((x0, y, x1, y + self.px(HEADER_HEIGHT)), HEADER_FILL,
+                                     day.replace('周', '星期'), self.header_font))
+        y += self.px(HEADER_HEIGHT)
+
+        # (day, period) -> course cell box
+        self.slots = {}
+        for band, first_period in BANDS:
+            self.fixed_cells.append(((left, y, right, y + self.px(BAND_HEIGHT)), BAND_FILL, band, self.header_font))
+            y += self.px(BAND_HEIGHT)
+            for period in range(first_period, first_period + PERIODS_PER_BAND):
+                bottom = y + self.px(PERIOD_HEIGHT)
+                self.fixed_cells.append(((left, y, label_right, bottom), PERIOD_FILL, f'第{period}节', self.header_font))
+                for day, (x0, x1) in zip(days, self.columns):
+                    self.slots[(day, period)] = (x0, y, x1, bottom)
+                y = bottom
+        self.height = y + self.px(MARGIN)
+        self.grid = self._draw_grid()
+
+    def px(self, units):
+        return round(units * self.scale)
+
+    def _draw_grid(self):
+        """Draw everything that does not depend on the courses"""
+        image = Image.new('RGB', (self.width, self.height), BACKGROUND)
+        draw = ImageDraw.Draw(image)
+        line_width = max(1, self.px(0.5))
+        draw.rectangle(self.title_box, fill=WHITE, outline=LINE_COLOR, width=line_width)
+        for box, fill, text, font in self.fixed_cells:
+            draw.rectangle(box, fill=fill, outline=LINE_COLOR, width=line_width)
+            draw.text(((box[0] + box[2]) / 2, (box[1] + box[3]) / 2), text, fill=TEXT_COLOR, font=font, anchor='mm')
+        for box in self.slots.values():
+            draw.rectangle(box, fill=WHITE, outline=LINE_COLOR, width=line_width)
+        return image
+
+@lru_cache(maxsize=None)
+def get_layout(scale=None):
+    """Get the shared layout of a scale"""
+    return TimetableLayout(scale or IMAGE_EXPORT_CONFIG['scale'])
+
+class ImageExportService(BaseExportService):
+    """PNG/PDF export service, drawing the timetable grid with Pillow"""
+
+    def __init__(self, scale=None):
+        super().__init__()
+        self.scale = scale
+
+    font_signature = staticmethod(font_signature)
+
+    @property
+    def layout(self):
+        # Loaded on first render, so the service can be created (and preloaded) without a font
+        return get_layout(self.scale)
+
+    def _draw_card(self, image, draw, box, record, color):
+        """Draw one course card: coloured box with as many text lines as fit"""
+        layout = self.layout
+        draw.rounded_rectangle(box, radius=layout.px(4), fill=color)
+        padding = layout.px(CARD_PADDING)
+        width = box[2] - box[0] - 2 * padding
+        x = box[0] + padding
+        y = box[1] + padding
+        bottom = box[3] - padding
+        fonts = [layout.name_font] + [layout.text_font] * 5
+        for font, paragraph in zip(fonts, record.cell_text().split('\n')):
+            line_height = round(font.size * 1.25)
+            for line in wrap_text(paragraph, font, width):
+                if y + line_height > bottom:
+                    return
+                if line:
+                    mask, (left, top) = text_mask(line, font)
+                    image.paste(TEXT_COLOR, (x + left, y + top), mask)
+                y += line_height
+
+    def render_image(self, records, title, user_selected_colors=None):
+        """Render a timetable as an RGB image"""
+        started = time.perf_counter()
+        layout = self.layout
+        buckets = bucket_by_slot(records)
+        metrics.observe_phase('image_bucketing', started)
+
+        started = time.perf_counter()
+        image = layout.grid.copy()
+        draw = ImageDraw.Draw(image)
+        box = layout.title_box
+        draw.text(((box[0] + box[2]) / 2, (box[1] + box[3]) / 2), title, fill=TEXT_COLOR,
+                  font=layout.title_font, anchor='mm')
+
+        colors = allocate_colors((record.name for record in records), user_selected_colors)
+        gap = layout.px(CARD_GAP)
+        for slot, courses in buckets.items():
+            cell = layout.slots.get(slot)
+            if cell is None:
+                continue
+            # Courses sharing a slot are stacked as cards, as on the web page
+            card_height = (cell[3] - cell[1] - gap) / len(courses)
+            for index, record in enumerate(courses):
+                color = colors.get(record.name, WHITE)
+                top = cell[1] + gap + index * card_height
+                self._draw_card(image, draw, (cell[0] + gap, round(top), cell[2] - gap, round(top + card_height) - gap),
+                                record, color)
+        metrics.observe_phase('image_drawing', started)
+        return image
+
+    def _save(self, image, output, image_format, **options):
+        started = time.perf_counter()
+        if image_format == 'PDF':
+            # One layout unit per PDF point, the page keeps its size whatever the scale
+            options.setdefault('resolution', 72.0 * self.layout.scale)
+        image.save(output, image_format, **options)
+        metrics.observe_phase('image_save', started)
+
+    def create_image_export(self, data):
+        """Create PNG export"""
+        records, title, raw_data = self.prepare_data(data)
+        output = BytesIO()
+        self._save(self.render_image(records, title, raw_data.get('userSelectedColors', {})), output, 'PNG')
+        output.seek(0)
+        return output, f"{title}.png"
+
+    def create_pdf_export(self, data):
+        """Create PDF export (one page)"""
+        records, title, raw_data = self.prepare_data(data)
+        output = BytesIO()
+        self._save(self.render_image(records, title, raw_data.get('userSelectedColors', {})), output, 'PDF')
+        output.seek(0)
+        return output, f"{title}.pdf"
+
+    def iter_pdf_stream(self, pages, user_selected_colors=None, chunk_size=None):
+        """Stream a PDF with one page per timetable
+
+        pages is an iterable of (courses, timetable title). Each page is appended
+        to a temporary file as soon as it is drawn, so only one page image is in
+        memory whatever the number of timetables.
+        """
+        chunk_size = chunk_size or EXPORT_CONFIG['stream_chunk_size']
+        with tempfile.TemporaryFile() as output:
+            for index, (courses, title) in enumerate(pages):
+                image = self.render_image(to_records(courses), title, user_selected_colors)
+                self._save(image, output, 'PDF', append=index > 0)
+            output.seek(0)
+            while True:
+                chunk = output.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
@@ -0,0 +1,127 @@
+import re
+from openpyxl import load_workbook
+
+# Weekday header -> day value used in course data
+DAY_MAP = {
+    '星期一': '周一',
+    '星期二': '周二',
+    '星期三': '周三',
+    '星期四': '周四',
+    '星期五': '周五',
+    '星期六': '周六',
+    '星期日': '周日'
+}
+
+# Accepted sheet_as values -> course field filled with the sheet name
+SHEET_FIELDS = {'class': '班级', 'teacher': '教师', '班级': '班级', '教师': '教师'}
+
+# Names Excel and openpyxl give new sheets, they do not name a class or teacher
+_DEFAULT_SHEET_PATTERN = re.compile(r'^(Sheet|工作表)\d*$', re.IGNORECASE)
+
+_PERIOD_PATTERN = re.compile(r'^\s*第?\s*(\d+)\s*节?\s*$')
+_FIELD_PATTERN = re.compile(r'^(教师|地点|时间|备注)[：:]\s*(.*?)\s*$')
+
+class ExcelImportService:
+    """Parse timetable workbooks in the layout written by ExcelExportService
+
+    Title row, a 节次/星期 header with 星期一..星期日 columns, 第N节 rows and cells whose
+    first line is the course name followed by 教师：/地点：/时间：/备注： lines. Several
+    courses in one cell are separated by their course name lines.
+    """
+
+    def parse_workbook(self, stream, sheet_as=None):
+        """Parse every sheet of an .xlsx file, returns (courses, sheet summaries)
+
+        Only with sheet_as the sheet name fills the class (or teacher) of its
+        courses, unless it is a default name like Sheet1. Exported sheets are
+        named after the timetable title or the export group, which is not
+        always a class.
+        """
+        sheet_field = None
+        if sheet_as:
+            sheet_field = SHEET_FIELDS.get(sheet_as)
+            if sheet_field is None:
+                raise ValueError(f"不支持的工作表名称用途: {sheet_as}")
+        try:
+            wb = load_workbook(stream, read_only=True, data_only=True)
+        except Exception:
+            raise ValueError("无法读取Excel文件，请上传.xlsx格式的课程表")
+
+        try:
+            # Collect all course cells first, then parse their text in one batch
+            cells = []
+            sheets = []
+            for ws in wb.worksheets:
+                title, sheet_cells = self._scan_sheet(ws)
+                sheet_name = None if _DEFAULT_SHEET_PATTERN.match(ws.title) else ws.title
+                for day, period, text in sheet_cells:
+                    cells.append((day, period, text, sheet_name))
+                sheets.append({"name": ws.title, "title": title, "cells": len(sheet_cells)})
+        finally:
+            wb.close()
+
+        courses = self.parse_cells(cells, sheet_field)
+        return courses, sheets
+
+    def _scan_sheet(self, ws):
+        """Find the title and the non-empty course cells of a sheet"""
+        title = None
+        day_columns = None
+        cells = []
+        for values in ws.iter_rows(values_only=True):
+            if not values:
+                continue
+            first = values[0]
+            if day_columns is None:
+                if isinstance(first, str) and first.strip() == '节次/星期':
+                    day_columns = {
+                        index: DAY_MAP[value.strip()]
+                        for index, value in enumerate(values)
+                        if isinstance(value, str) and value.strip() in DAY_MAP
+                    }
+                elif title is None and first not in (None, ''):
+                    title = str(first).strip()
+                continue
+
+            match = _PERIOD_PATTERN.match(str(first)) if first is not None else None
+            if not match:
+                # Band rows (上午/下午/晚自习) and anything else without a period
+                continue
+            period = int(match.group(1))
+            for index, day in day_columns.items():
+                if index < len(values) and values[index] not in (None, ''):
+                    cells.append((day, period, str(values[index])))
+        return title, cells
+
+    def parse_cells(self, cells, sheet_field=None):
+        """Parse (day, period, text, sheet name) cells into course dictionaries
+
+        The sheet name (None: none) goes into sheet_field, a 教师： line of the cell
+        takes precedence over it.
+        """
+        courses = []
+        for day, period, text, sheet_name in cells:
+            course = None
+            for line in text.replace('\r\n', '\n').split('\n'):
+                line = line.strip()
+                if not line:
+                    continue
+                match = _FIELD_PATTERN.match(line)
+                if match is None or course is None:
+                    # A line without a field prefix starts the next course of the cell
+                    course = {
+                        '课程名称': line, '星期': day, '节次': period, '教师': '',
+                        '地点': '', '备注': '', '开始时间': '', '结束时间': ''
+                    }
+                    if sheet_field and sheet_name:
+                        course[sheet_field] = sheet_name
+                    courses.append(course)
+                    continue
+                field, value = match.groups()
+                if field == '时间':
+                    times = value.split('~')
+                    if len(times) == 2:
+                        course['开始时间'], course['结束时间'] = times[0].strip(), times[1].strip()
+                else:
+                    course[field] = value
+        return courses
@@ -0,0 +1,226 @@
+import atexit
+import glob
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Lock, Thread
+from config import METRICS_CONFIG
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Metric name -> (help text, histogram buckets)
+HISTOGRAMS = {
+    'schedule_request_duration_seconds': ('HTTP request latency by route', LATENCY_BUCKETS),
+    'schedule_request_size_bytes': ('HTTP request body size by route', SIZE_BUCKETS),
+    'schedule_response_size_bytes': ('HTTP response body size by route (unstreamed responses)', SIZE_BUCKETS),
+    'schedule_phase_duration_seconds': ('Duration of instrumented hot-path phases', LATENCY_BUCKETS)
+}
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+class MetricsRegistry:
+    """Process-wide histograms rendered in the Prometheus text format
+
+    Observing a value is a bisect and two additions under a lock. Values owned by
+    other services (cache statistics and the like) are pulled from registered
+    collectors when /metrics is rendered.
+
+    Under serve.py every worker process has its own registry. Once
+    enable_multiprocess() is called in the master, each worker writes a snapshot
+    of its metrics to <directory>/<pid>.json (every sync_interval seconds, at exit
+    and when it renders /metrics) and rendering merges the snapshots of all
+    workers: histograms and counters are summed, so a scrape of any worker shows
+    the totals of the server; gauges keep a worker="<pid>" label and are only
+    reported for live workers. Snapshots of other workers lag by up to
+    sync_interval seconds.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        # name -> {sorted label pairs: [bucket counts, sum, count]}
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.collectors = []
+        # Shared snapshot directory, None for a single process
+        self.directory = None
+        self.pid = os.getpid()
+
+    def enable_multiprocess(self, directory=None):
+        """Aggregate the metrics of the processes forked after this call through a shared directory
+
+        Snapshots left by a previous server run are removed, the metrics recorded
+        so far (in the master, while preloading) are kept as its own snapshot.
+        """
+        directory = directory or METRICS_CONFIG['dir']
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.json')):
+            os.remove(path)
+        self.directory = directory
+        self.pid = os.getpid()
+        self.sync()
+
+    def _forked(self):
+        """Start over in a new worker process (caller holds the lock)
+
+        The histograms copied from the parent are already in its snapshot.
+        """
+        self.pid = os.getpid()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        Thread(target=self._run_sync, name='metrics-sync', daemon=True).start()
+        atexit.register(self.sync)
+
+    def _run_sync(self):
+        while True:
+            time.sleep(METRICS_CONFIG['sync_interval'])
+            self.sync()
+
+    def observe(self, name, value, **labels):
+        """Record one observation of a histogram"""
+        buckets = HISTOGRAMS[name][1]
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(buckets, value)
+        with self.lock:
+            if self.directory and self.pid != os.getpid():
+                self._forked()
+            series = self.histograms[name].get(key)
+            if series is None:
+                series = self.histograms[name][key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_phase(self, phase, started):
+        """Record the duration of a phase that began at time.perf_counter() value started"""
+        self.observe('schedule_phase_duration_seconds', time.perf_counter() - started, phase=phase)
+
+    def register_collector(self, collector):
+        """Register a callable returning [(name, type, help, {labels}, value)] samples"""
+        self.collectors.append(collector)
+
+    def _snapshot(self):
+        """Copy the histograms and collect the samples of this process"""
+        with self.lock:
+            if self.directory and self.pid != os.getpid():
+                self._forked()
+            histograms = {
+                name: {key: ([*series[0]], series[1], series[2]) for key, series in all_series.items()}
+                for name, all_series in self.histograms.items()
+            }
+        samples = [sample for collector in self.collectors for sample in collector()]
+        return histograms, samples
+
+    def sync(self):
+        """Write the snapshot of this process to the shared directory"""
+        if not self.directory:
+            return
+        histograms, samples = self._snapshot()
+        snapshot = {
+            "histograms": {
+                name: [[list(map(list, key)), counts, total, count]
+                       for key, (counts, total, count) in all_series.items()]
+                for name, all_series in histograms.items()
+            },
+            "samples": samples
+        }
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temp_path = path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def _merge(self):
+        """Merge the snapshots of all worker processes"""
+        histograms = {name: {} for name in HISTOGRAMS}
+        samples = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, '*.json'))):
+            try:
+                pid = int(os.path.basename(path)[:-len('.json')])
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, all_series in snapshot["histograms"].items():
+                if name not in histograms:
+                    continue
+                for key, counts, total, count in all_series:
+                    key = tuple(map(tuple, key))
+                    merged = histograms[name].get(key)
+                    if merged is None:
+                        histograms[name][key] = (counts, total, count)
+                    else:
+                        histograms[name][key] = ([a + b for a, b in zip(merged[0], counts)],
+                                                 merged[1] + total, merged[2] + count)
+            alive = _pid_alive(pid)
+            for name, metric_type, help_text, labels, value in snapshot["samples"]:
+                if metric_type == 'counter':
+                    # Counters of exited workers still count, the sum stays monotonic
+                    key = (name, tuple(sorted(labels.items())))
+                    if key in samples:
+                        value += samples[key][4]
+                elif alive:
+                    labels = dict(labels, worker=pid)
+                    key = (name, tuple(sorted(labels.items())))
+                else:
+                    continue
+                samples[key] = (name, metric_type, help_text, labels, value)
+        return histograms, list(samples.values())
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        if self.directory:
+            self.sync()
+            histograms, samples = self._merge()
+        else:
+            histograms, samples = self._snapshot()
+
+        lines = []
+        for name, all_series in histograms.items():
+            help_text, buckets = HISTOGRAMS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (counts, total, count) in sorted(all_series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', _format_bound(bound)))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total!r}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+        # Samples of one metric have to be contiguous, whichever collector yields them
+        collected = {}
+        for name, metric_type, help_text, labels, value in samples:
+            collected.setdefault(name, (metric_type, help_text, []))[2].append((labels, value))
+        for name, (metric_type, help_text, metric_samples) in collected.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in metric_samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+# Create a global instance
+metrics = MetricsRegistry()
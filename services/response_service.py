@@ -0,0 +1,121 @@
+import gzip
+import json
+from collections import OrderedDict
+from threading import Lock
+from flask import Response, request
+from config import RESPONSE_CONFIG
+
+# Optional speedups: orjson serialises faster, brotli compresses smaller than gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Buffered responses worth compressing
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+def dumps(payload):
+    """Serialise to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def accepted_encoding():
+    """Get the best encoding the client accepts (br, gzip), None for identity"""
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=RESPONSE_CONFIG['brotli_quality'])
+    return gzip.compress(body, compresslevel=RESPONSE_CONFIG['gzip_level'], mtime=0)
+
+class EncodedBodyCache:
+    """LRU of serialised response bodies and their compressed variants, keyed by content version
+
+    Many clients polling the same revision cost one serialisation and one
+    compression per encoding instead of one each.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or RESPONSE_CONFIG['body_cache_entries']
+        self.lock = Lock()
+        # (key, encoding) -> body
+        self.entries = OrderedDict()
+
+    def _lookup(self, key, encoding):
+        with self.lock:
+            body = self.entries.get((key, encoding))
+            if body is not None:
+                self.entries.move_to_end((key, encoding))
+            return body
+
+    def _store(self, key, encoding, body):
+        with self.lock:
+            self.entries[(key, encoding)] = body
+            while len(self.entries) > self.max_entries * 3:
+                self.entries.popitem(last=False)
+
+    def get(self, key, encoding, build=None):
+        """Get (body, applied encoding); build() makes the identity body on a miss, None without it"""
+        if encoding is not None:
+            body = self._lookup(key, encoding)
+            if body is not None:
+                return body, encoding
+        identity = self._lookup(key, None)
+        if identity is None:
+            if build is None:
+                return None
+            identity = build()
+            self._store(key, None, identity)
+        if encoding is None or len(identity) < RESPONSE_CONFIG['compress_min_bytes']:
+            return identity, None
+        body = compress(identity, encoding)
+        self._store(key, encoding, body)
+        return body, encoding
+
+def json_response(body, encoding=None, etag=None, headers=None):
+    """Build a response from serialised (possibly already compressed) JSON"""
+    response = Response(body, mimetype='application/json', headers=headers)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        # Cached copies must be revalidated, a 304 is almost free
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def is_not_modified(etag):
+    """Whether the client already holds the representation with this ETag"""
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified(etag, headers=None):
+    response = Response(status=304, headers=headers)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def compress_response(response):
+    """Compress a buffered text/JSON response when the client accepts it (after_request hook)"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    body = response.get_data()
+    if len(body) < RESPONSE_CONFIG['compress_min_bytes']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
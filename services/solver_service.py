@@ -0,0 +1,406 @@
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import SOLVER_CONFIG
+from services.conflict_service import (
+    CONFLICT_RESOURCES, GRID_DAYS, PERIODS_PER_DAY, count_slots, detect_conflicts, resource_name, slot_bit
+)
+
+# Owner marker of slots taken by fixed (already scheduled) courses, these are never evicted
+FIXED_OWNER = -1
+
+def _normalize_day(day):
+    """Convert '星期一' etc. to '周一' etc. to match course data"""
+    return str(day).replace('星期', '周')
+
+def _allowed_mask(days, periods):
+    """Build the bitset of the allowed (day, period) slots"""
+    mask = 0
+    for day in days:
+        for period in periods:
+            mask |= slot_bit((_normalize_day(day), int(period)))
+    return mask
+
+def _slot_of_bit(index):
+    """Get the (day, period) slot of a bit index"""
+    return GRID_DAYS[index // PERIODS_PER_DAY], index % PERIODS_PER_DAY + 1
+
+def _bit_indexes(mask):
+    """Get the indexes of the set bits of a bitset"""
+    indexes = []
+    while mask:
+        low_bit = mask & -mask
+        indexes.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return indexes
+
+class TimetableSolver:
+    """Place course requirements into the 7 x 12 grid without teacher, class or location clashes
+
+    Each requirement (课程名称, 教师, 班级, 地点, 周课时, 可选星期, 可选节次) is expanded into
+    one lesson per weekly hour. Lessons are placed most-constrained first using the
+    same occupancy bitsets as the conflict index. When a lesson has no free slot,
+    the slot with the fewest blocking lessons is taken and the blockers are put back
+    in the queue (conflict-directed repair with a tabu list), until everything is
+    placed or the time budget runs out. The best assignment found is returned.
+    """
+
+    def __init__(self, requirements, fixed_courses=None, time_limit=None, seed=None):
+        if not isinstance(requirements, list) or not requirements:
+            raise ValueError("没有排课需求")
+        if time_limit is None:
+            time_limit = SOLVER_CONFIG['time_limit']
+        self.time_limit = min(float(time_limit), SOLVER_CONFIG['max_time_limit'])
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.random = random.Random(self.seed)
+        self.requirements = requirements
+        self.fixed_courses = fixed_courses or []
+        self._build_lessons()
+
+    def _build_lessons(self):
+        """Expand requirements into lessons"""
+        self.lesson_requirement = []
+        self.lesson_allowed = []
+        self.lesson_resources = []
+        for index, requirement in enumerate(self.requirements):
+            if not isinstance(requirement, dict) or not requirement.get('课程名称'):
+                raise ValueError(f"第{index + 1}条排课需求缺少课程名称")
+            try:
+                hours = int(requirement.get('周课时', 1))
+                allowed = _allowed_mask(requirement.get('可选星期') or SOLVER_CONFIG['default_days'],
+                                        requirement.get('可选节次') or SOLVER_CONFIG['default_periods'])
+            except (TypeError, ValueError):
+                raise ValueError(f"第{index + 1}条排课需求的周课时或可选节次格式错误")
+            resources = tuple(
+                (field, resource_name(requirement, field))
+                for field in CONFLICT_RESOURCES
+                if resource_name(requirement, field) is not None
+            )
+            for _ in range(max(hours, 0)):
+                self.lesson_requirement.append(index)
+                self.lesson_allowed.append(allowed)
+                self.lesson_resources.append(resources)
+
+    def _occupy_fixed(self, masks, owners):
+        """Reserve the slots of fixed courses"""
+        for course in self.fixed_courses:
+            try:
+                bit = slot_bit((course.get('星期'), int(course.get('节次'))))
+            except (TypeError, ValueError):
+                continue
+            if not bit:
+                continue
+            index = bit.bit_length() - 1
+            for field in CONFLICT_RESOURCES:
+                name = resource_name(course, field)
+                if name is not None:
+                    masks[(field, name)] = masks.get((field, name), 0) | bit
+                    owners.setdefault((field, name), {})[index] = FIXED_OWNER
+
+    def _domains(self, masks):
+        """Find the lessons without any free slot and a lower bound on the unplaced lessons
+
+        A lesson whose allowed slots are all taken by fixed courses has an empty
+        domain and is never searched. A teacher, class or location with more
+        lessons than free slots in the union of their domains leaves at least
+        the surplus unplaced, the search stops once all surpluses are.
+        """
+        empty = []
+        resource_lessons = {}
+        for lesson, (allowed, resources) in enumerate(zip(self.lesson_allowed, self.lesson_resources)):
+            busy = 0
+            for resource in resources:
+                busy |= masks.get(resource, 0)
+            domain = allowed & ~busy
+            if not domain:
+                empty.append(lesson)
+                continue
+            for resource in resources:
+                count, union = resource_lessons.get(resource, (0, 0))
+                resource_lessons[resource] = (count + 1, union | domain)
+        # A lesson has one teacher (class, location), the surpluses of one field add up
+        surplus = {}
+        for (field, _), (count, union) in resource_lessons.items():
+            surplus[field] = surplus.get(field, 0) + max(count - count_slots(union), 0)
+        return empty, len(empty) + max(surplus.values(), default=0)
+
+    def solve(self):
+        """Run the search and return the best assignment with its statistics"""
+        started = time.perf_counter()
+        deadline = started + self.time_limit
+        lesson_count = len(self.lesson_requirement)
+        tabu_tenure = SOLVER_CONFIG['tabu_tenure']
+
+        masks = {}
+        owners = {}
+        self._occupy_fixed(masks, owners)
+        unplaceable, lower_bound = self._domains(masks)
+        # Requirement -> lessons placed per day, used to spread a course over the week
+        day_load = {}
+        assignment = [None] * lesson_count
+        tabu = {}
+        stats = {"lessons": lesson_count, "assignments": 0, "evictions": 0, "iterations": 0}
+
+        # Most constrained lessons first: fewest allowed slots, then busiest resources
+        resource_load = {}
+        for resources in self.lesson_resources:
+            for resource in resources:
+                resource_load[resource] = resource_load.get(resource, 0) + 1
+        order = sorted(set(range(lesson_count)) - set(unplaceable))
+        self.random.shuffle(order)
+        order.sort(key=lambda i: (count_slots(self.lesson_allowed[i]),
+                                  -max([resource_load[r] for r in self.lesson_resources[i]] or [0])))
+        queue = deque(order)
+
+        def place(lesson, index):
+            bit = 1 << index
+            for resource in self.lesson_resources[lesson]:
+                masks[resource] = masks.get(resource, 0) | bit
+                owners.setdefault(resource, {})[index] = lesson
+            loads = day_load.setdefault(self.lesson_requirement[lesson], [0] * len(GRID_DAYS))
+            loads[index // PERIODS_PER_DAY] += 1
+            assignment[lesson] = index
+            stats["assignments"] += 1
+
+        def unplace(lesson):
+            index = assignment[lesson]
+            bit = 1 << index
+            for resource in self.lesson_resources[lesson]:
+                masks[resource] &= ~bit
+                del owners[resource][index]
+            day_load[self.lesson_requirement[lesson]][index // PERIODS_PER_DAY] -= 1
+            assignment[lesson] = None
+
+        best_unplaced = None
+        best_assignment = None
+        while queue:
+            if time.perf_counter() > deadline:
+                break
+            stats["iterations"] += 1
+            iteration = stats["iterations"]
+            lesson = queue.popleft()
+            allowed = self.lesson_allowed[lesson]
+            resources = self.lesson_resources[lesson]
+            loads = day_load.get(self.lesson_requirement[lesson]) or [0] * len(GRID_DAYS)
+
+            busy = 0
+            for resource in resources:
+                busy |= masks.get(resource, 0)
+            free = allowed & ~busy
+            if free:
+                # Prefer days where this course has the fewest lessons, random tie break
+                index = min(_bit_indexes(free),
+                            key=lambda i: (loads[i // PERIODS_PER_DAY], self.random.random()))
+                place(lesson, index)
+            else:
+                # Repair: take the allowed slot with the fewest (non fixed, non tabu) blockers
+                best = None
+                for index in _bit_indexes(allowed):
+                    blockers = {owners[resource][index] for resource in resources
+                                if index in owners.get(resource, {})}
+                    if FIXED_OWNER in blockers or tabu.get((lesson, index), 0) > iteration:
+                        continue
+                    cost = (len(blockers), loads[index // PERIODS_PER_DAY], self.random.random())
+                    if best is None or cost < best[0]:
+                        best = (cost, index, blockers)
+                if best is None:
+                    if not any(FIXED_OWNER not in {owners.get(resource, {}).get(index) for resource in resources}
+                               for index in _bit_indexes(allowed)):
+                        # Every allowed slot is taken by fixed courses (or none is allowed)
+                        unplaceable.append(lesson)
+                    else:
+                        queue.append(lesson)
+                    continue
+                _, index, blockers = best
+                for blocker in blockers:
+                    unplace(blocker)
+                    tabu[(blocker, index)] = iteration + tabu_tenure
+                    queue.append(blocker)
+                    stats["evictions"] += 1
+                place(lesson, index)
+
+            # Track the best assignment once every lesson has been tried at least once
+            if iteration >= lesson_count:
+                unplaced = len(queue) + len(unplaceable)
+                if best_unplaced is None or unplaced < best_unplaced:
+                    best_unplaced = unplaced
+                    best_assignment = list(assignment)
+                if unplaced <= lower_bound:
+                    # Nothing better exists
+                    break
+
+        if best_assignment is None or len(queue) + len(unplaceable) <= best_unplaced:
+            best_assignment = assignment
+        return self._build_result(best_assignment, stats, started)
+
+    def _build_result(self, assignment, search_stats, started):
+        """Convert an assignment into course data and search statistics"""
+        courses = []
+        unplaced = {}
+        for lesson, index in enumerate(assignment):
+            requirement = self.requirements[self.lesson_requirement[lesson]]
+            if index is None:
+                unplaced[self.lesson_requirement[lesson]] = unplaced.get(self.lesson_requirement[lesson], 0) + 1
+                continue
+            day, period = _slot_of_bit(index)
+            course = {field: requirement[field] for field in ('课程名称', '教师', '班级', '地点', '备注')
+                      if requirement.get(field)}
+            course['星期'] = day
+            course['节次'] = period
+            courses.append(course)
+
+        # Validate with the same conflict model as /api/courses/conflicts
+        conflicts = detect_conflicts(self.fixed_courses + courses)
+        return {
+            "courses": courses,
+            "unplaced": [dict(self.requirements[index], 未排课时=count) for index, count in unplaced.items()],
+            "conflicts": conflicts,
+            "stats": dict(
+                search_stats,
+                placed=len(courses),
+                unplaced=len(assignment) - len(courses),
+                feasible=not unplaced and not conflicts,
+                seed=self.seed,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+            )
+        }
+
+
+def partition_requirements(requirements):
+    """Split requirements into groups that share no teacher, class or location
+
+    Groups (typically grades or campuses) can be solved independently, the union of
+    their solutions has no clashes.
+    """
+    parent = list(range(len(requirements)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    owner = {}
+    for index, requirement in enumerate(requirements):
+        for field in CONFLICT_RESOURCES:
+            name = resource_name(requirement, field) if isinstance(requirement, dict) else None
+            if name is None:
+                continue
+            if (field, name) in owner:
+                parent[find(index)] = find(owner[(field, name)])
+            else:
+                owner[(field, name)] = index
+
+    groups = {}
+    for index in range(len(requirements)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+def _pack_groups(groups, bins):
+    """Merge independent groups into at most bins groups of similar size (largest first)"""
+    if len(groups) <= bins:
+        return groups
+    packed = [[] for _ in range(bins)]
+    for group in sorted(groups, key=len, reverse=True):
+        min(packed, key=len).extend(group)
+    return [sorted(group) for group in packed]
+
+def _solve_task(requirements, fixed_courses, time_limit, seed):
+    """Run one solver in a worker process"""
+    return TimetableSolver(requirements, fixed_courses=fixed_courses, time_limit=time_limit, seed=seed).solve()
+
+def _is_better(result, best):
+    """Compare solver results: fewer unplaced lessons, then fewer conflicts"""
+    if best is None:
+        return True
+    return (result["stats"]["unplaced"], len(result["conflicts"])) < \
+        (best["stats"]["unplaced"], len(best["conflicts"]))
+
+def iter_portfolio(requirements, fixed_courses=None, time_limit=None, seed=None, workers=None):
+    """Solve with a portfolio of randomized searches across a process pool
+
+    Requirements are partitioned into independent groups and every group is solved
+    with several seeds in parallel. There are exactly as many searches as workers,
+    all running at once (groups beyond the worker count are merged), so the call
+    takes about time_limit. The first feasible (or else the best) result of each
+    group wins. Yields a start event, a progress event per finished search and
+    finally a result event with the merged timetable, validated by detect_conflicts.
+    """
+    # Same validation as a single solver, so bad input fails before the start event
+    TimetableSolver(requirements, fixed_courses=fixed_courses, time_limit=time_limit, seed=seed)
+    if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+        raise ValueError("并行进程数必须是正整数")
+    started = time.perf_counter()
+    workers = min(workers or SOLVER_CONFIG['workers'] or os.cpu_count() or 1, SOLVER_CONFIG['max_workers'])
+    seeder = random.Random(seed)
+    fixed_courses = fixed_courses or []
+    groups = _pack_groups(partition_requirements(requirements), workers)
+    # Spread the workers over the groups, one search each
+    seeds = [workers // len(groups) + (index < workers % len(groups)) for index in range(len(groups))]
+
+    yield {"event": "start", "groups": len(groups), "searches": workers, "workers": workers}
+
+    best = [None] * len(groups)
+    done = [False] * len(groups)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for group_index, group in enumerate(groups):
+            group_requirements = [requirements[index] for index in group]
+            for _ in range(seeds[group_index]):
+                task_seed = seeder.randrange(2 ** 32)
+                future = executor.submit(_solve_task, group_requirements, fixed_courses, time_limit, task_seed)
+                futures[future] = group_index
+
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            group_index = futures[future]
+            result = future.result()
+            if _is_better(result, best[group_index]):
+                best[group_index] = result
+            if result["stats"]["feasible"] and not done[group_index]:
+                done[group_index] = True
+                # First feasible assignment wins, drop the searches still waiting for this group
+                for other, other_group in futures.items():
+                    if other_group == group_index:
+                        other.cancel()
+            yield {
+                "event": "progress",
+                "group": group_index,
+                "groups": len(groups),
+                "seed": result["stats"]["seed"],
+                "placed": result["stats"]["placed"],
+                "unplaced": result["stats"]["unplaced"],
+                "feasible": result["stats"]["feasible"],
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+
+    courses = [course for result in best for course in result["courses"]]
+    unplaced = [requirement for result in best for requirement in result["unplaced"]]
+    conflicts = detect_conflicts(fixed_courses + courses)
+    yield {
+        "event": "result",
+        "courses": courses,
+        "unplaced": unplaced,
+        "conflicts": conflicts,
+        "stats": {
+            "lessons": sum(result["stats"]["lessons"] for result in best),
+            "placed": len(courses),
+            "unplaced": sum(result["stats"]["unplaced"] for result in best),
+            "feasible": not unplaced and not conflicts,
+            "groups": len(groups),
+            "searches": workers,
+            "workers": workers,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    }
+
+def solve_portfolio(requirements, fixed_courses=None, time_limit=None, seed=None, workers=None):
+    """Run the portfolio solver and return only the final result"""
+    result = None
+    for event in iter_portfolio(requirements, fixed_courses, time_limit, seed, workers):
+        result = event
+    result.pop("event")
+    return result
@@ -1,24 +1,99 @@
+import atexit
+import copy
 import json
 import os
-from datetime import datetime
-from threading import Lock
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from config import STATISTICS_CONFIG
+
+try:
+    import fcntl
+except ImportError:
+    # No fcntl (Windows): there is no preforked launcher there, a single process writes the log
+    fcntl = None
+
+# Tracked actions
+ACTIONS = ('export_excel', 'export_word', 'export_image', 'export_print', 'import')
+
+# Rollup granularity -> (length of the ISO timestamp prefix used as bucket key, bucket length)
+BUCKETS = {
+    'minute': (16, timedelta(minutes=1)),
+    'hour': (13, timedelta(hours=1)),
+    'day': (10, timedelta(days=1))
+}
+
+def _local_time(value):
+    """Convert an aware datetime to naive server local time, the zone events are recorded in"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
 
 class StatisticsService:
-    def __init__(self, stats_file='statistics.json'):
-        self.stats_file = stats_file
+    """Usage counters kept in memory and persisted in the background
+
+    Tracking an action only bumps a counter and queues the event under the lock.
+    A flusher thread appends queued events to an NDJSON event log and then
+    atomically replaces the counter snapshot, on a time or queue size threshold.
+    The snapshot records how far into the event log it reaches, so events logged
+    after the last snapshot are replayed on start. With several worker processes
+    the log is shared: each flush first counts the events other workers appended
+    since its previous flush, so every snapshot holds the totals of all workers.
+    Loading, merging and rewriting the snapshot happen under the same file lock
+    as the log appends; a header line with a generation number marks a compacted
+    log, so no process keeps reading it from a stale offset.
+    The snapshot is only read on first use, not at import.
+
+    Next to the lifetime totals every action is counted in per-minute, per-hour
+    and per-day rollups (keyed by ISO timestamp prefix), which answer range
+    queries and let the raw event log be compacted.
+    """
+
+    def __init__(self, stats_file=None, event_log=None, flush_interval=None, flush_size=None):
+        self.stats_file = stats_file or STATISTICS_CONFIG['path']
+        self.event_log = event_log or STATISTICS_CONFIG['event_log']
+        self.flush_interval = flush_interval or STATISTICS_CONFIG['flush_interval']
+        self.flush_size = flush_size or STATISTICS_CONFIG['flush_size']
+        self.retention = STATISTICS_CONFIG['rollup_retention']
+        self.max_log_bytes = STATISTICS_CONFIG['max_log_bytes']
         self.lock = Lock()
-        self.stats = self._load_stats()
-    
-    def _load_stats(self):
-        """Load statistics from file or create initial structure"""
-        if os.path.exists(self.stats_file):
-            try:
-                with open(self.stats_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                pass
-        
-        # Return initial structure
+        self.load_lock = Lock()
+        self.flush_lock = Lock()
+        self.wakeup = Event()
+        self.pending = []
+        self.flusher_pid = None
+        self.log_offset = 0
+        # Bumped by every compaction of the event log
+        self.log_generation = 0
+        self._stats = None
+        atexit.register(self.flush)
+
+    @property
+    def stats(self):
+        """The counters, loaded from the snapshot on first use"""
+        self._ensure_loaded()
+        return self._stats
+
+    def _ensure_loaded(self):
+        """Load the counters if needed, loading takes the event log lock so call it before self.lock"""
+        if self._stats is None:
+            with self.load_lock:
+                if self._stats is None:
+                    self._stats = self._load_stats()
+
+    def _open_log(self):
+        """Open the event log locked for this process
+
+        The lock is held until the file is closed and serializes the snapshot
+        read-merge-write and the log appends of all worker processes.
+        """
+        f = open(self.event_log, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    @staticmethod
+    def _initial_stats():
+        """Create the initial statistics structure"""
         return {
             "export_stats": {
                 "excel": 0,
@@ -29,34 +104,259 @@ class StatisticsService:
             "import_stats": {
                 "total": 0
             },
+            "rollups": {bucket: {} for bucket in BUCKETS},
             "last_updated": None
         }
-    
-    def _save_stats(self):
-        """Save statistics to file"""
-        self.stats["last_updated"] = datetime.now().isoformat()
+
+    @staticmethod
+    def _count_rollups(stats, action, timestamp):
+        """Count one event in the bucket of each rollup granularity"""
+        for bucket, (key_length, _) in BUCKETS.items():
+            counts = stats["rollups"][bucket].setdefault(timestamp[:key_length], {})
+            counts[action] = counts.get(action, 0) + 1
+
+    @classmethod
+    def _count(cls, stats, action, timestamp):
+        """Apply one event to the counters and rollups"""
+        if action not in ACTIONS:
+            return
+        if action == 'import':
+            stats["import_stats"]["total"] += 1
+        else:
+            stats["export_stats"][action[7:]] += 1
+        cls._count_rollups(stats, action, timestamp)
+
+    def _load_stats(self):
+        """Load the snapshot and replay the events logged after it, under the event log lock"""
+        with self._open_log() as f:
+            return self._read_stats(f)
+
+    def _read_stats(self, log):
+        """Load the snapshot and replay the events logged after it from the locked log"""
+        stats = self._initial_stats()
+        snapshot = {}
+        if os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except Exception:
+                pass
+        for section in ("export_stats", "import_stats", "rollups"):
+            stats[section].update(snapshot.get(section, {}))
+        stats["last_updated"] = snapshot.get("last_updated")
+
+        self.log_generation = self._read_generation(log)
+        if 'log_offset' in snapshot:
+            # A snapshot of an older generation was written before the log was compacted,
+            # it already counts every event, the new log is replayed from its start
+            offset = snapshot['log_offset'] if snapshot.get('log_generation', 0) == self.log_generation else 0
+            self.log_offset = self._replay(stats, log, offset)
+        elif snapshot:
+            # Older snapshots carried the whole history inline, it is already part
+            # of the totals and only needs to be rolled up
+            for event in snapshot.get("usage_history", []):
+                if event.get("action") in ACTIONS and event.get("timestamp"):
+                    self._count_rollups(stats, event["action"], event["timestamp"])
+            self.log_offset = log.seek(0, os.SEEK_END)
+            try:
+                self._write_snapshot(stats)
+            except OSError:
+                pass
+        return stats
+
+    def _read_events(self, f, offset):
+        """Read the complete event lines of an open log from offset, returns (events, end offset)"""
+        f.seek(offset)
+        events = []
+        end = offset
+        for line in iter(f.readline, b''):
+            if not line.endswith(b'\n'):
+                # Partially written last line of a crashed process
+                break
+            end += len(line)
+            try:
+                event = json.loads(line)
+                events.append((event["action"], event["timestamp"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return events, end
+
+    @staticmethod
+    def _read_generation(log):
+        """Get the compaction generation from the header line of the log (0 without one)"""
+        log.seek(0)
+        try:
+            return json.loads(log.readline())["generation"]
+        except (ValueError, KeyError, TypeError):
+            return 0
+
+    def _replay(self, stats, log, offset):
+        """Count the events logged after the snapshot, returns the new log offset"""
+        # An offset past the end means the log was compacted after the snapshot
+        events, end = self._read_events(log, min(offset, log.seek(0, os.SEEK_END)))
+        for action, timestamp in events:
+            self._count(stats, action, timestamp)
+            stats["last_updated"] = timestamp
+        return end
+
+    def _write_snapshot(self, stats):
+        """Atomically replace the snapshot file"""
+        snapshot = dict(stats, log_offset=self.log_offset, log_generation=self.log_generation)
+        temp_file = self.stats_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.stats_file)
+
+    def _prune_rollups(self):
+        """Drop the buckets older than the retention of their granularity (caller holds the lock)"""
+        now = datetime.now()
+        for bucket, (key_length, length) in BUCKETS.items():
+            keep = self.retention.get(bucket)
+            if keep is None:
+                continue
+            oldest = (now - length * keep).isoformat()[:key_length]
+            rollup = self._stats["rollups"][bucket]
+            for key in [key for key in rollup if key < oldest]:
+                del rollup[key]
+
+    def flush(self):
+        """Count the events other processes logged, append the queued events and write a new snapshot"""
+        with self.flush_lock:
+            if self._stats is None:
+                # Nothing was tracked or read in this process
+                return
+            events = []
+            try:
+                with self._open_log() as f:
+                    size = f.seek(0, os.SEEK_END)
+                    if self._read_generation(f) != self.log_generation or size < self.log_offset:
+                        # Another process compacted the log (it may have grown past our
+                        # offset again since), its snapshot covers everything before
+                        stats = self._read_stats(f)
+                        with self.lock:
+                            for event in self.pending:
+                                self._count(stats, event["action"], event["timestamp"])
+                            self._stats = stats
+                    foreign, end = self._read_events(f, self.log_offset)
+                    with self.lock:
+                        # The queue is taken together with the counters, so the snapshot
+                        # counts exactly the events up to its log offset
+                        events = self.pending
+                        self.pending = []
+                        if not events and not foreign:
+                            return
+                        for action, timestamp in foreign:
+                            self._count(self._stats, action, timestamp)
+                        self._prune_rollups()
+                        stats = copy.deepcopy(self._stats)
+                    f.seek(0, os.SEEK_END)
+                    if end < size:
+                        # Terminate the torn line of a crashed process so it is skipped as one bad line
+                        f.write(b'\n')
+                    f.writelines((json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8') for event in events)
+                    f.flush()
+                    self.log_offset = f.tell()
+                    self._write_snapshot(stats)
+                    if self.log_offset > self.max_log_bytes:
+                        # Every logged event is in the snapshot rollups, compact the raw log.
+                        # The header tells the other processes their offsets are void; a crash
+                        # before the new snapshot leaves an older generation, replayed from the start.
+                        f.truncate(0)
+                        f.write(json.dumps({"generation": self.log_generation + 1}).encode('utf-8') + b'\n')
+                        f.flush()
+                        self.log_generation += 1
+                        self.log_offset = f.tell()
+                        self._write_snapshot(stats)
+            except OSError:
+                with self.lock:
+                    self.pending[:0] = events
+
+    def _run_flusher(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def _record(self, action):
+        """Count an action and queue it for the event log (O(1))"""
+        timestamp = datetime.now().isoformat()
+        self._ensure_loaded()
         with self.lock:
-            with open(self.stats_file, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, ensure_ascii=False, indent=2)
-    
+            self._count(self._stats, action, timestamp)
+            self._stats["last_updated"] = timestamp
+            self.pending.append({"action": action, "timestamp": timestamp})
+            queued = len(self.pending)
+            # Started lazily, and again in a forked child where the thread does not exist
+            if self.flusher_pid != os.getpid():
+                self.flusher_pid = os.getpid()
+                Thread(target=self._run_flusher, name='statistics-flusher', daemon=True).start()
+        if queued >= self.flush_size:
+            self.wakeup.set()
+
     def track_export(self, export_type):
         """Track export actions"""
         if export_type in self.stats["export_stats"]:
-            self.stats["export_stats"][export_type] += 1
-            self._save_stats()
-    
+            self._record(f"export_{export_type}")
+
     def track_import(self):
         """Track import actions"""
-        self.stats["import_stats"]["total"] += 1
-        self._save_stats()
-    
+        self._record("import")
+
+    def query_range(self, start=None, end=None, bucket='hour'):
+        """Get per-bucket action counts between start and end from the rollups
+
+        start/end are datetimes (end defaults to now, start to 60 buckets before
+        end), aware ones are converted to server local time like the recorded
+        timestamps; every bucket in the range is returned, empty ones as zeros.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"不支持的统计粒度: {bucket}")
+        key_length, length = BUCKETS[bucket]
+        start, end = _local_time(start), _local_time(end)
+        end = end or datetime.now()
+        start = start or end - length * 59
+        if start > end:
+            raise ValueError("开始时间不能晚于结束时间")
+        points = int((end - start) / length) + 1
+        if points > STATISTICS_CONFIG['max_range_points']:
+            raise ValueError(f"查询范围过大，最多{STATISTICS_CONFIG['max_range_points']}个时间段")
+
+        # Step from the start of the first bucket so every bucket key is hit once
+        current = start.replace(second=0, microsecond=0)
+        if bucket != 'minute':
+            current = current.replace(minute=0)
+        if bucket == 'day':
+            current = current.replace(hour=0)
+        series = []
+        totals = dict.fromkeys(ACTIONS, 0)
+        self._ensure_loaded()
+        with self.lock:
+            rollup = self._stats["rollups"][bucket]
+            while current <= end:
+                key = current.isoformat()[:key_length]
+                counts = rollup.get(key, {})
+                series.append(dict({"time": key}, **{action: counts.get(action, 0) for action in ACTIONS}))
+                for action, count in counts.items():
+                    totals[action] = totals.get(action, 0) + count
+                current += length
+        return {
+            "bucket": bucket,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "series": series,
+            "totals": totals
+        }
+
     def get_stats(self):
-        """Get current statistics"""
+        """Get current statistics (lifetime totals)"""
+        self._ensure_loaded()
+        with self.lock:
+            stats = copy.deepcopy({k: v for k, v in self._stats.items() if k != "rollups"})
         # Calculate total usage
-        export_total = sum(self.stats["export_stats"].values())
-        import_total = self.stats["import_stats"]["total"]
-        self.stats["total_usage"] = export_total + import_total
-        return self.stats
+        export_total = sum(stats["export_stats"].values())
+        import_total = stats["import_stats"]["total"]
+        stats["total_usage"] = export_total + import_total
+        return stats
 
 # Create a global instance
-statistics_service = StatisticsService()
\ No newline at end of file
+statistics_service = StatisticsService()
@@ -1,175 +1,153 @@
-import pandas as pd
-from docx import Document
-from docx.shared import Inches
-from docx.oxml import parse_xml
+import logging
+import re
+import time
+import zipfile
+from functools import lru_cache
 from io import BytesIO
-from config import EXPORT_CONFIG, DEFAULT_COLORS
-from services.color_service import get_course_color
+from xml.sax.saxutils import escape
+from docx import Document
+from services.color_service import allocate_colors, color_hex
 from services.base_export_service import BaseExportService
+from services.course_record import bucket_by_slot
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Day columns: (header, day as stored in the courses)
+DAYS = [(day, day.replace('星期', '周')) for day in ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']]
+# Morning, afternoon and evening study: (band label, first period, periods)
+PERIOD_BANDS = [('上午', 1, 4), ('下午', 5, 4), ('晚自习', 9, 4)]
+
+# Every cell is 1.2 inches wide, in twentieths of a point
+CELL_WIDTH = 1728
+# python-docx splits the page width of the default template evenly over the 8 grid columns
+GRID_COLUMN_WIDTH = 1080
+
+# Characters XML 1.0 cannot hold
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_RUN_BREAKS = re.compile('(\t|\r|\n)')
+
+_CENTER = '<w:pPr><w:jc w:val="center"/></w:pPr>'
+_BOLD = '<w:rPr><w:b/></w:rPr>'
+_CELL_WIDTH = f'<w:tcW w:type="dxa" w:w="{CELL_WIDTH}"/>'
+_EMPTY_CELL = f'<w:tc><w:tcPr>{_CELL_WIDTH}</w:tcPr><w:p/></w:tc>'
+
+def _run(text, properties=''):
+    """Run XML of a text, as python-docx writes it: tabs and line breaks as elements, padded text preserved"""
+    parts = ['<w:r>', properties]
+    for piece in _RUN_BREAKS.split(_INVALID_XML_CHARS.sub('', str(text))):
+        if piece == '\t':
+            parts.append('<w:tab/>')
+        elif piece in ('\r', '\n'):
+            parts.append('<w:br/>')
+        elif piece:
+            space = ' xml:space="preserve"' if len(piece.strip()) < len(piece) else ''
+            parts.append(f'<w:t{space}>{escape(piece)}</w:t>')
+    parts.append('</w:r>')
+    return ''.join(parts)
+
+def _cell(text, bold=False, span=None, fill=None):
+    """Centred table cell XML"""
+    properties = _CELL_WIDTH
+    if span:
+        properties += f'<w:gridSpan w:val="{span}"/>'
+    if fill:
+        properties += f'<w:shd w:fill="{fill}"/>'
+    return f'<w:tc><w:tcPr>{properties}</w:tcPr><w:p>{_CENTER}{_run(text, _BOLD if bold else "")}</w:p></w:tc>'
+
+# Everything but the title and the course cells is the same in every export
+_TABLE_START = (
+    '<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>'
+    '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+    '</w:tblPr><w:tblGrid>' + f'<w:gridCol w:w="{GRID_COLUMN_WIDTH}"/>' * 8 + '</w:tblGrid>'
+    '<w:tr>' + ''.join(_cell(header, bold=True) for header in ['节次/星期'] + [day for day, _ in DAYS]) + '</w:tr>'
+)
+_BAND_ROWS = {label: f'<w:tr>{_cell(label, bold=True, span=8)}</w:tr>' for label, _, _ in PERIOD_BANDS}
+_PERIOD_CELLS = {period: _cell(f'第{period}节')
+                 for _, first, count in PERIOD_BANDS for period in range(first, first + count)}
+
+@lru_cache(maxsize=None)
+def _skeleton():
+    """The blank python-docx document, built once per process
+
+    Returns (ZIP archive of every part except word/document.xml, already
+    compressed; document XML up to the body content; document XML after it).
+    """
+    blank = BytesIO()
+    Document().save(blank)
+    archive = BytesIO()
+    with zipfile.ZipFile(blank) as source, zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as target:
+        document = source.read('word/document.xml').decode('utf-8')
+        for info in source.infolist():
+            if info.filename != 'word/document.xml':
+                target.writestr(info, source.read(info))
+    body = document.index('<w:body>') + len('<w:body>')
+    return archive.getvalue(), document[:body], document[document.index('<w:sectPr', body):]
 
 class WordExportService(BaseExportService):
     """Word export service"""
     
-    def generate_word(self, df, output, user_selected_colors, title):
-        """Generate Word file"""
+    def generate_word(self, records, output, user_selected_colors, title):
+        """Generate Word file
+
+        The document XML is written in one pass from precomputed row, cell and
+        shading fragments (the same markup python-docx produces for this table)
+        and added to the cached parts of a blank document.
+        """
         try:
-            # Create document
-            doc = Document()
-            
-            # Add title
-            title_para = doc.add_heading(title, 0)
-            title_para.alignment = 1  # Center alignment
-            
-            # Add table (8 columns: period/weekday + 7 days)
-            table = doc.add_table(rows=1, cols=8)
-            table.style = 'Table Grid'
-            
-            # Set headers
-            headers = ['节次/星期', '星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
-            hdr_cells = table.rows[0].cells
-            for i, header in enumerate(headers):
-                hdr_cells[i].text = header
-                # Set header style
-                for paragraph in hdr_cells[i].paragraphs:
-                    paragraph.alignment = 1  # Center alignment
-                    run = paragraph.runs[0]
-                    run.font.bold = True
-            
             # Create course dictionary for quick lookup
-            course_dict = {}
-            for _, course in df.iterrows():
-                day = course.get('星期', '')
-                period = course.get('节次', '')
-                if day and period:
-                    key = (day, period)
-                    if key not in course_dict:
-                        course_dict[key] = []
-                    course_dict[key].append(course)
-            
-            # Keep track of assigned colors to ensure different courses have different colors
-            assigned_colors = {}
-            
-            # Fill course data
-            # Add data for morning, afternoon, and evening study separately
-            periods_info = [
-                {'name': '上午', 'start': 1, 'count': 4},
-                {'name': '下午', 'start': 5, 'count': 4},
-                {'name': '晚自习', 'start': 9, 'count': 4}
-            ]
-            
-            row_index = 1  # Start from the second row (first row is header)
-            for period_info in periods_info:
-                # Add period identifier row
-                row_cells = table.add_row().cells
-                period_cell = row_cells[0]
-                period_cell.merge(row_cells[7])  # Merge all columns
-                period_cell.text = period_info['name']
-                
-                # Set period identifier style
-                for paragraph in period_cell.paragraphs:
-                    paragraph.alignment = 1  # Center alignment
-                    run = paragraph.runs[0]
-                    run.font.bold = True
-                
-                # Add courses for this period
-                for i in range(period_info['count']):
-                    row_cells = table.add_row().cells
-                    period_num = period_info['start'] + i
-                    
-                    # Set period
-                    row_cells[0].text = f'第{period_num}节'
-                    for paragraph in row_cells[0].paragraphs:
-                        paragraph.alignment = 1  # Center alignment
-                    
-                    # Fill daily courses
-                    days = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
-                    for col, day in enumerate(days, 1):
-                        # Convert "星期一" etc. to "周一" etc. to match data
-                        day_short = day.replace('星期', '周')
-                        key = (day_short, period_num)
-                        
-                        if key in course_dict:
-                            courses = course_dict[key]
-                            # If there are multiple courses at the same time, display all courses
-                            course_texts = []
-                            for course in courses:
-                                course_name = course.get('课程名称', '')
-                                teacher = course.get('教师', '')
-                                location = course.get('地点', '')
-                                start_time = course.get('开始时间', '')
-                                end_time = course.get('结束时间', '')
-                                notes = course.get('备注', '')
-                                
-                                course_text = course_name
-                                if teacher and teacher != '未指定':
-                                    course_text += f"\n教师：{teacher}"
-                                if location and location != '未指定':
-                                    course_text += f"\n地点：{location}"
-                                if start_time and end_time:
-                                    course_text += f"\n时间：{start_time}~{end_time}"
-                                if notes:
-                                    course_text += f"\n备注：{notes}"
-                                course_texts.append(course_text)
-                            
-                            row_cells[col].text = '\n'.join(course_texts)
-                            # Set course cell style
-                            for paragraph in row_cells[col].paragraphs:
-                                paragraph.alignment = 1  # Center alignment
-                            
-                            # Apply background color
-                            first_course = courses[0]
-                            course_name = first_course.get('课程名称', '')
-                            if course_name:
-                                # Check if we've already assigned a color for this course name
-                                if course_name in assigned_colors:
-                                    # Use the already assigned color for consistency
-                                    color_rgb = assigned_colors[course_name]
-                                else:
-                                    # Get color from color service
-                                    color_rgb = get_course_color(course_name, user_selected_colors)
-                                    
-                                    # Ensure this color is not already used by another course
-                                    used_colors = set(assigned_colors.values())
-                                    color_index = 0
-                                    # If the color is already used, find a different one
-                                    while tuple(color_rgb) in used_colors and color_index < len(DEFAULT_COLORS):
-                                        color_rgb = DEFAULT_COLORS[color_index]
-                                        color_index += 1
-                                    
-                                    # Store the assigned color for this course name
-                                    assigned_colors[course_name] = color_rgb
-                                
-                                # Apply background color in Word
-                                shading_el = parse_xml(
-                                    f'<w:shd xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" w:fill="{color_rgb[0]:02X}{color_rgb[1]:02X}{color_rgb[2]:02X}"/>'
-                                )
-                                row_cells[col]._tc.get_or_add_tcPr().append(shading_el)
-                    
-                row_index += 1
-            
-            # Set column widths
-            for i, column in enumerate(table.columns):
-                for cell in column.cells:
-                    cell.width = Inches(1.2)
-            
-            # Save to output stream
-            doc.save(output)
-        except Exception as e:
-            # Record detailed error information
-            import traceback
-            error_info = traceback.format_exc()
-            print(f"Error generating Word: {str(e)}")
-            print(f"Detailed error information:\n{error_info}")
-            raise e
+            started = time.perf_counter()
+            course_dict = bucket_by_slot(records)
+            metrics.observe_phase('word_bucketing', started)
+
+            # Distinct colours per course name, shared with the Excel and image exports
+            colors = allocate_colors((record.name for record in records), user_selected_colors)
+
+            started = time.perf_counter()
+            static_parts, document_start, document_end = _skeleton()
+            title_run = _run(title) if title else ''
+            parts = [document_start,
+                     f'<w:p><w:pPr><w:pStyle w:val="Title"/><w:jc w:val="center"/></w:pPr>{title_run}</w:p>',
+                     _TABLE_START]
+            for label, first, count in PERIOD_BANDS:
+                parts.append(_BAND_ROWS[label])
+                for period in range(first, first + count):
+                    parts.append('<w:tr>')
+                    parts.append(_PERIOD_CELLS[period])
+                    for _, day in DAYS:
+                        courses = course_dict.get((day, period))
+                        if not courses:
+                            parts.append(_EMPTY_CELL)
+                            continue
+                        # If there are multiple courses at the same time, display all courses,
+                        # the cell takes the colour of the first one
+                        course_name = courses[0].name
+                        parts.append(_cell('\n'.join(course.cell_text() for course in courses),
+                                           fill=color_hex(colors[course_name]) if course_name else None))
+                    parts.append('</w:tr>')
+            parts.append('</w:tbl>')
+            parts.append(document_end)
+            metrics.observe_phase('word_styling', started)
+
+            # Save to output stream: the cached parts plus the new main document
+            started = time.perf_counter()
+            archive = BytesIO(static_parts)
+            with zipfile.ZipFile(archive, 'a', zipfile.ZIP_DEFLATED) as docx:
+                docx.writestr('word/document.xml', ''.join(parts))
+            output.write(archive.getvalue())
+            metrics.observe_phase('word_save', started)
+        except Exception:
+            logger.exception("Error generating Word")
+            raise
 
     def create_word_export(self, data):
         """Create Word export"""
-        df, title, raw_data = self.prepare_data(data)
+        records, title, raw_data = self.prepare_data(data)
         user_selected_colors = raw_data.get('userSelectedColors', {})
         
         # Generate Word file to memory
         output = BytesIO()
-        self.generate_word(df, output, user_selected_colors, title)
+        self.generate_word(records, output, user_selected_colors, title)
         output.seek(0)
         
         # Return file stream directly
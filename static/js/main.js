@@ -1089,13 +1089,66 @@ function exportToImage() {
     }
     
     // 显示加载状态
-    const originalText = document.getElementById('export-image').innerHTML;
-    document.getElementById('export-image').innerHTML = '<i class="fas fa-spinner fa-spin mr-1"></i>导出中...';
-    document.getElementById('export-image').disabled = true;
+    const button = document.getElementById('export-image');
+    const originalText = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin mr-1"></i>导出中...';
+    button.disabled = true;
     
     // 获取课表标题
     const timetableTitle = document.getElementById('timetable-title').value || '课程表';
     
+    // 发送请求到后端生成PNG图片
+    fetch('/api/export/image', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            courses: courseData,
+            userSelectedColors: userSelectedColors,
+            title: timetableTitle
+        })
+    })
+    .then(response => {
+        if (response.ok) {
+            // 更新统计数据并重新加载
+            loadStatistics();
+            return response.blob();
+        }
+        if (response.status === 503) {
+            // 服务器无法绘制（如未安装中文字体），改为在浏览器中生成
+            return null;
+        }
+        throw new Error('导出失败');
+    })
+    .then(blob => {
+        if (blob === null) {
+            exportToImageInBrowser(timetableTitle, button, originalText);
+            return;
+        }
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = timetableTitle + '.png';
+        document.body.appendChild(a);
+        a.click();
+        a.remove();
+        window.URL.revokeObjectURL(url);
+        // 恢复按钮状态
+        button.innerHTML = originalText;
+        button.disabled = false;
+    })
+    .catch(error => {
+        console.error('导出图片时出错:', error);
+        alert('导出图片失败: ' + error.message);
+        // 恢复按钮状态
+        button.innerHTML = originalText;
+        button.disabled = false;
+    });
+}
+
+// 在浏览器中用html2canvas生成图片（服务器无法绘制时使用，如未安装中文字体）
+function exportToImageInBrowser(timetableTitle, button, originalText) {
     // 克隆表格以避免影响原始表格
     const table = document.getElementById('course-table');
     const tableClone = table.cloneNode(true);
@@ -1183,8 +1236,8 @@ function exportToImage() {
         height: tempContainer.scrollHeight // 设置画布高度
     }).then(canvas => {
         // 恢复按钮状态
-        document.getElementById('export-image').innerHTML = originalText;
-        document.getElementById('export-image').disabled = false;
+        button.innerHTML = originalText;
+        button.disabled = false;
         
         // 从页面中移除临时容器
         document.body.removeChild(tempContainer);
@@ -1195,26 +1248,12 @@ function exportToImage() {
         link.href = canvas.toDataURL('image/png');
         link.click();
         
-        // 发送请求到后端以跟踪统计数据
-        fetch('/api/export/image', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({})
-        }).then(response => {
-            if (response.ok) {
-                // 更新统计数据并重新加载（自动刷新统计面板）
-                loadStatistics();
-            }
-        }).catch(error => {
-            // 忽略错误，因为我们主要关心前端统计
-            console.log('Failed to track image export on backend');
-        });
+        // 服务端的导出请求已计入统计，刷新统计面板
+        loadStatistics();
     }).catch(error => {
         // 恢复按钮状态
-        document.getElementById('export-image').innerHTML = originalText;
-        document.getElementById('export-image').disabled = false;
+        button.innerHTML = originalText;
+        button.disabled = false;
         
         // 从页面中移除临时容器
         document.body.removeChild(tempContainer);
@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The stores are configured from the environment when config is imported, point them at a scratch directory
+_scratch = tempfile.mkdtemp(prefix='schedule-tests-')
+os.environ.update(
+    SCHEDULE_DB_PATH=os.path.join(_scratch, 'schedule.db'),
+    SCHEDULE_STATS_PATH=os.path.join(_scratch, 'statistics.json'),
+    SCHEDULE_STATS_EVENT_LOG=os.path.join(_scratch, 'statistics.events.ndjson'),
+    SCHEDULE_EXPORT_JOB_DIR=os.path.join(_scratch, 'export_jobs')
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def scratch_dir():
+    return _scratch
+
+@pytest.fixture(scope='session')
+def app():
+    from schedule import create_app
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,75 @@
+import json
+
+TEACHER = "批量测试老师"
+
+def _revision(client):
+    return int(client.get('/api/courses').headers['X-Schedule-Revision'])
+
+def _stored(client, teacher=TEACHER):
+    courses = client.get('/api/courses', query_string={'teacher': teacher}).get_json()
+    return {course['id']: (course['课程名称'], course['星期'], course['节次']) for course in courses}
+
+def _course(name, period, teacher=TEACHER, class_name=None):
+    return {"课程名称": name, "教师": teacher, "班级": class_name or f"{name}班", "星期": "周四", "节次": period}
+
+def _probe(client, course):
+    return client.post('/api/courses/conflicts', json={"course": course}).get_json()["conflicts"]
+
+def test_mixed_batch_is_applied_in_one_revision(client):
+    created = client.post('/api/courses/batch', json=[_course("甲", 1), _course("乙", 2), _course("丙", 3)]).get_json()
+    first, second, third = created["ids"]
+    before = _revision(client)
+
+    result = client.post('/api/courses/batch', json={
+        "create": [_course("丁", 4)],
+        # 乙 moves onto the slot of 甲
+        "update": [dict(_course("乙", 1), id=second)],
+        "delete": [third]
+    }).get_json()
+    assert result["success"] is True
+    assert (result["created"], result["updated"], result["deleted"]) == (1, 1, 1)
+    assert result["revision"] == before + 1 == _revision(client)
+    assert result["conflicts"] == [f"冲突：教师{TEACHER}在周四1节有2门课程"]
+    assert _stored(client) == {
+        first: ("甲", "周四", 1), second: ("乙", "周四", 1), result["ids"][0]: ("丁", "周四", 4)
+    }
+
+    # The conflict index follows the batch: 2 and 3 are free again, 1 and 4 are taken
+    assert _probe(client, _course("戊", 1)) == [f"冲突：教师{TEACHER}在周四1节有3门课程"]
+    assert _probe(client, _course("戊", 2)) == []
+    assert _probe(client, _course("戊", 3)) == []
+    assert _probe(client, _course("戊", 4)) == [f"冲突：教师{TEACHER}在周四4节有2门课程"]
+
+def test_invalid_operation_rolls_back_the_whole_batch(client):
+    teacher = "回滚测试老师"
+    ids = client.post('/api/courses/batch', json=[_course("甲", 5, teacher), _course("乙", 6, teacher)]).get_json()["ids"]
+    before_revision = _revision(client)
+    before = _stored(client, teacher)
+
+    for batch in (
+        # Unknown id to update
+        {"create": [_course("丙", 7, teacher)], "delete": [ids[0]], "update": [dict(_course("乙", 8, teacher), id=999999)]},
+        # The same course updated and deleted
+        {"update": [dict(_course("乙", 8, teacher), id=ids[1])], "delete": [ids[1]]},
+        # Not a course
+        {"create": [_course("丙", 7, teacher), "丁"], "delete": [ids[0]]}
+    ):
+        response = client.post('/api/courses/batch', json=batch)
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
+
+    assert _revision(client) == before_revision
+    assert _stored(client, teacher) == before
+    assert _probe(client, _course("戊", 5, teacher)) == [f"冲突：教师{teacher}在周四5节有2门课程"]
+    assert _probe(client, _course("戊", 7, teacher)) == []
+
+def test_ndjson_batch(client):
+    teacher = "逐行测试老师"
+    ids = client.post('/api/courses/batch', json=[_course("甲", 9, teacher)]).get_json()["ids"]
+    body = "\n".join(json.dumps(line, ensure_ascii=False) for line in (
+        {"op": "create", "course": _course("乙", 10, teacher)},
+        {"op": "update", "id": ids[0], "course": _course("甲", 11, teacher)}
+    ))
+    response = client.post('/api/courses/batch', data=body.encode('utf-8'), content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert sorted(_stored(client, teacher).values()) == [("乙", "周四", 10), ("甲", "周四", 11)]
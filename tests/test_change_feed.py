@@ -0,0 +1,39 @@
+from services.change_feed_service import change_feed
+
+def test_stream_closed_before_reading_unsubscribes(client):
+    before = len(change_feed.subscribers)
+    response = client.get('/api/courses/stream', buffered=False)
+    assert response.status_code == 200
+    assert len(change_feed.subscribers) == before + 1
+    response.close()
+    assert len(change_feed.subscribers) == before
+
+def test_head_does_not_subscribe(client):
+    before = len(change_feed.subscribers)
+    for _ in range(3):
+        response = client.head('/api/courses/stream')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        response.close()
+    assert len(change_feed.subscribers) == before
+
+def test_stream_sends_hello_and_unsubscribes_after_reading(client):
+    before = len(change_feed.subscribers)
+    response = client.get('/api/courses/stream', buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+    assert next(chunks).startswith(b'event: hello')
+    response.close()
+    assert len(change_feed.subscribers) == before
+
+def test_streams_over_the_cap_are_refused(client, monkeypatch):
+    from config import CHANGE_FEED_CONFIG
+    monkeypatch.setitem(CHANGE_FEED_CONFIG, 'max_subscribers', len(change_feed.subscribers) + 1)
+    first = client.get('/api/courses/stream', buffered=False)
+    assert first.status_code == 200
+    refused = client.get('/api/courses/stream', buffered=False)
+    assert refused.status_code == 503
+    first.close()
+    again = client.get('/api/courses/stream', buffered=False)
+    assert again.status_code == 200
+    again.close()
@@ -0,0 +1,65 @@
+import models
+
+TEACHER = "增量测试老师"
+
+def _revision(client):
+    return int(client.get('/api/courses').headers['X-Schedule-Revision'])
+
+def _course(name, period):
+    return {"课程名称": name, "教师": TEACHER, "班级": "增量1班", "星期": "周六", "节次": period}
+
+def _since(client, since):
+    response = client.get('/api/courses', query_string={'since': since})
+    assert response.status_code == 200
+    assert int(response.headers['X-Schedule-Revision']) == response.get_json()["revision"]
+    return response.get_json()
+
+def test_delta_after_writes_and_deletes(client):
+    kept, moved, dropped = [client.post('/api/courses', json=_course(name, period)).get_json()["id"]
+                            for name, period in (("语文", 1), ("数学", 2), ("英语", 3))]
+    # More courses than changes, so the delta is cheaper than a full reload even in an empty store
+    client.post('/api/courses/batch', json=[_course("自习", period) for period in range(8, 14)])
+    since = _revision(client)
+
+    client.put(f'/api/courses/{moved}', json=_course("数学", 4))
+    client.delete(f'/api/courses/{dropped}')
+    added = client.post('/api/courses', json=_course("物理", 5)).get_json()["id"]
+    # Added and deleted again after since, the client never saw it
+    transient = client.post('/api/courses', json=_course("化学", 6)).get_json()["id"]
+    client.delete(f'/api/courses/{transient}')
+
+    delta = _since(client, since)
+    assert (delta["revision"], delta["since"], delta["full"]) == (since + 5, since, False)
+    assert [(course["id"], course["课程名称"], course["节次"]) for course in delta["upserts"]] == [
+        (moved, "数学", 4), (added, "物理", 5)
+    ]
+    assert delta["deletes"] == [dropped, transient]
+    assert kept not in delta["deletes"]
+
+    # Applying the delta to the list at since gives the current list
+    courses = {course["id"]: course for course in client.get('/api/courses', query_string={'revision': since}).get_json()}
+    for course_id in delta["deletes"]:
+        courses.pop(course_id, None)
+    courses.update((course["id"], course) for course in delta["upserts"])
+    assert sorted(courses.values(), key=lambda course: course["id"]) == client.get('/api/courses').get_json()
+
+    current = _since(client, delta["revision"])
+    assert (current["full"], current["upserts"], current["deletes"]) == (False, [], [])
+
+def test_since_older_than_the_log_returns_everything(client, monkeypatch):
+    client.post('/api/courses', json=_course("历史", 7))
+    current = _revision(client)
+    # A store whose change log starts after the client's revision (created before the log existed)
+    monkeypatch.setattr(models, '_history_base', lambda conn: current)
+
+    response = _since(client, current - 1)
+    assert (response["revision"], response["since"], response["full"]) == (current, current - 1, True)
+    assert response["courses"] == client.get('/api/courses').get_json()
+    assert "upserts" not in response
+
+def test_invalid_since_is_rejected(client):
+    current = _revision(client)
+    for query in ({'since': current + 100}, {'since': 'abc'}, {'since': current, 'teacher': TEACHER}):
+        response = client.get('/api/courses', query_string=query)
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
@@ -0,0 +1,63 @@
+import pytest
+from config import DEFAULT_COLORS
+from services import color_service
+from services.color_service import PALETTE, _palette_index, allocate_colors
+
+def _names(count, prefix="课程"):
+    return [f"{prefix}{index}" for index in range(count)]
+
+def test_palette_drops_the_duplicate_default_colours():
+    assert len(set(PALETTE)) == len(PALETTE) < len(DEFAULT_COLORS)
+    assert list(PALETTE) == list(dict.fromkeys(tuple(color) for color in DEFAULT_COLORS))
+
+def test_colours_are_distinct_while_the_palette_lasts():
+    names = _names(len(PALETTE))
+    colors = allocate_colors(names)
+    assert set(colors) == set(names)
+    assert set(colors.values()) == set(PALETTE)
+
+    # Names hashed to the same palette entry still get different colours
+    by_index = {}
+    for name in _names(500, "科目"):
+        by_index.setdefault(_palette_index(name), []).append(name)
+    clashing = next(group for group in by_index.values() if len(group) > 1)[:2]
+    first, second = allocate_colors(clashing).values()
+    assert first != second
+
+def test_allocation_is_deterministic():
+    names = _names(12)
+    colors = allocate_colors(names)
+    assert dict(allocate_colors(reversed(names + ["", None, names[0]]))) == dict(colors)
+    # A lone name keeps its hashed colour
+    assert allocate_colors(["语文"])["语文"] == PALETTE[_palette_index("语文")]
+    with pytest.raises(TypeError):
+        colors[names[0]] = (0, 0, 0)
+
+def test_user_colours_take_priority():
+    names = _names(len(PALETTE) - 1)
+    taken = allocate_colors(names)[names[1]]
+    colors = allocate_colors(names, {names[0]: "%d,%d,%d" % taken, names[2]: list(taken), "不在课表中": [1, 2, 3]})
+    # User colours are kept as chosen, even when shared, and the other courses avoid them
+    assert colors[names[0]] == colors[names[2]] == taken
+    assert "不在课表中" not in colors
+    others = [colors[name] for name in names if name not in (names[0], names[2])]
+    assert taken not in others and len(set(others)) == len(others)
+
+def test_predefined_colours_come_after_user_colours(monkeypatch):
+    color_service._allocate.cache_clear()
+    monkeypatch.setitem(color_service.COLOR_MAP, "音乐", PALETTE[0])
+    try:
+        colors = allocate_colors(["音乐"] + _names(5))
+        assert colors["音乐"] == PALETTE[0]
+        assert PALETTE[0] not in [colors[name] for name in _names(5)]
+        assert allocate_colors(["音乐"], {"音乐": "9,9,9"})["音乐"] == (9, 9, 9)
+    finally:
+        color_service._allocate.cache_clear()
+
+def test_more_names_than_palette_entries():
+    names = sorted(_names(len(PALETTE) + 10))
+    colors = allocate_colors(names)
+    assert set(colors) == set(names) and set(colors.values()) == set(PALETTE)
+    # In name order the first names take every palette colour once, the rest fall back to their hashed colour
+    assert len({colors[name] for name in names[:len(PALETTE)]}) == len(PALETTE)
+    assert all(colors[name] == PALETTE[_palette_index(name)] for name in names[len(PALETTE):])
@@ -0,0 +1,236 @@
+import random
+from itertools import combinations
+import pytest
+from services.conflict_service import CONFLICT_RESOURCES, ConflictIndex, detect_conflicts
+
+DAYS = ['周一', '周二', '周三']
+
+def _random_course(rng, with_times=False):
+    course = {
+        "课程名称": rng.choice(["语文", "数学", "英语"]),
+        "教师": rng.choice(["张老师", "李老师", "王老师", "", "未指定", None]),
+        "班级": rng.choice(["1班", "2班", "3班", ""]),
+        "地点": rng.choice(["101", "102", None]),
+        "星期": rng.choice(DAYS),
+        "节次": rng.choice([1, 2, 3, "2"])
+    }
+    if with_times:
+        start = rng.randrange(8 * 60, 10 * 60, 5)
+        course["开始时间"] = f"{start // 60:02d}:{start % 60:02d}"
+        end = start + rng.choice([30, 45, 60, 90])
+        course["结束时间"] = f"{end // 60:02d}:{end % 60:02d}"
+    return course
+
+def _named(course, field):
+    value = course.get(field)
+    return None if value in (None, '', '未指定') else value
+
+def brute_slot_conflicts(courses):
+    """Every pair of courses compared: resource -> number of courses in one (day, period)"""
+    counts = {}
+    for field in CONFLICT_RESOURCES:
+        for first, second in combinations(courses, 2):
+            name = _named(first, field)
+            if name is None or name != _named(second, field):
+                continue
+            if first["星期"] != second["星期"] or int(first["节次"]) != int(second["节次"]):
+                continue
+            key = (field, name, first["星期"], int(first["节次"]))
+            counts[key] = {id(first), id(second)} | counts.get(key, set())
+    return sorted(f"冲突：{field}{name}在{day}{period}节有{len(ids)}门课程"
+                  for (field, name, day, period), ids in counts.items())
+
+def test_same_slot_is_a_conflict_for_every_shared_resource():
+    courses = [
+        {"课程名称": "语文", "教师": "张老师", "班级": "1班", "地点": "101", "星期": "周一", "节次": 1},
+        {"课程名称": "数学", "教师": "张老师", "班级": "2班", "地点": "101", "星期": "周一", "节次": "1"}
+    ]
+    assert sorted(detect_conflicts(courses)) == [
+        "冲突：地点101在周一1节有2门课程",
+        "冲突：教师张老师在周一1节有2门课程"
+    ]
+
+def test_adjacent_slots_and_unspecified_resources_do_not_conflict():
+    courses = [
+        {"课程名称": "语文", "教师": "张老师", "班级": "1班", "星期": "周一", "节次": 1},
+        {"课程名称": "数学", "教师": "张老师", "班级": "1班", "星期": "周一", "节次": 2},
+        {"课程名称": "英语", "教师": "张老师", "班级": "1班", "星期": "周二", "节次": 1},
+        {"课程名称": "体育", "教师": "未指定", "班级": "", "地点": "101", "星期": "周二", "节次": 2},
+        {"课程名称": "音乐", "教师": "未指定", "班级": "", "地点": "102", "星期": "周二", "节次": 2}
+    ]
+    assert detect_conflicts(courses) == []
+
+@pytest.mark.parametrize('seed', range(20))
+def test_slot_conflicts_match_brute_force(seed):
+    rng = random.Random(seed)
+    courses = [_random_course(rng) for _ in range(40)]
+    assert sorted(detect_conflicts(courses)) == brute_slot_conflicts(courses)
+
+def brute_check(stored, course, exclude_key=None):
+    """Conflicts a course would introduce among the stored courses ({key: course})"""
+    if not course["星期"]:
+        return []
+    messages = []
+    for field in CONFLICT_RESOURCES:
+        name = _named(course, field)
+        if name is None:
+            continue
+        count = sum(1 for key, other in stored.items()
+                    if key != exclude_key and _named(other, field) == name
+                    and other["星期"] == course["星期"] and int(other["节次"]) == int(course["节次"]))
+        if count:
+            messages.append(f"冲突：{field}{name}在{course['星期']}{int(course['节次'])}节有{count + 1}门课程")
+    return sorted(messages)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_index_after_adds_updates_and_removes_matches_brute_force(seed):
+    rng = random.Random(seed)
+    index = ConflictIndex()
+    stored = {}
+    for step in range(100):
+        operation = rng.random()
+        if operation < 0.5 or not stored:
+            course = _random_course(rng)
+            assert sorted(index.add(step, course)) == brute_check(stored, course)
+            stored[step] = course
+        elif operation < 0.8:
+            key = rng.choice(list(stored))
+            course = _random_course(rng)
+            assert sorted(index.check(course, exclude_key=key)) == brute_check(stored, course, exclude_key=key)
+            assert sorted(index.update(key, course)) == brute_check(stored, course, exclude_key=key)
+            stored[key] = course
+        else:
+            key = rng.choice(list(stored))
+            index.remove(key)
+            del stored[key]
+        assert sorted(index.conflicts()) == brute_slot_conflicts(list(stored.values()))
+
+def test_check_excludes_the_course_being_edited():
+    course = {"课程名称": "语文", "教师": "张老师", "班级": "1班", "星期": "周一", "节次": 1}
+    index = ConflictIndex([dict(course, id=1)])
+    assert index.check(course, exclude_key=1) == []
+    assert sorted(index.check(course)) == ["冲突：教师张老师在周一1节有2门课程", "冲突：班级1班在周一1节有2门课程"]
+
+def test_stored_index_follows_updates_and_deletes(client):
+    course = {"课程名称": "物理", "教师": "索引测试老师", "班级": "索引测试1班", "星期": "周五", "节次": 7}
+    first = client.post('/api/courses', json=course).get_json()
+    second = client.post('/api/courses', json=dict(course, 班级="索引测试2班")).get_json()
+    assert second["conflicts"] == ["冲突：教师索引测试老师在周五7节有2门课程"]
+
+    probe = {"course": dict(course, 班级="索引测试3班")}
+    assert client.post('/api/courses/conflicts', json=probe).get_json()["conflicts"] == \
+        ["冲突：教师索引测试老师在周五7节有3门课程"]
+    # Moving one course frees the slot for it
+    assert client.put(f"/api/courses/{second['id']}", json=dict(course, 班级="索引测试2班", 节次=8)).status_code == 200
+    assert client.post('/api/courses/conflicts', json=probe).get_json()["conflicts"] == \
+        ["冲突：教师索引测试老师在周五7节有2门课程"]
+    assert client.delete(f"/api/courses/{first['id']}").status_code == 200
+    assert client.post('/api/courses/conflicts', json=probe).get_json()["conflicts"] == []
+
+def brute_time_overlaps(courses, skip_same_slot=False):
+    """Pairwise overlap graph per (resource, day), each connected group of 2+ lessons is one conflict"""
+    from services.conflict_service import parse_time_to_minutes
+    lessons = {}
+    for course in courses:
+        start, end = parse_time_to_minutes(course.get("开始时间")), parse_time_to_minutes(course.get("结束时间"))
+        if start is None or end is None or end <= start:
+            continue
+        for field in CONFLICT_RESOURCES:
+            name = _named(course, field)
+            if name is not None:
+                lessons.setdefault((field, name, course["星期"]), []).append((start, end, (course["星期"], int(course["节次"]))))
+    messages = []
+    for (field, name, day), items in lessons.items():
+        group = list(range(len(items)))
+
+        def find(i):
+            while group[i] != i:
+                i = group[i]
+            return i
+
+        for i, j in combinations(range(len(items)), 2):
+            if items[i][0] < items[j][1] and items[j][0] < items[i][1]:
+                group[find(i)] = find(j)
+        components = {}
+        for i in range(len(items)):
+            components.setdefault(find(i), []).append(items[i])
+        for members in components.values():
+            if len(members) < 2 or skip_same_slot and len({member[2] for member in members}) == 1:
+                continue
+            start, end = min(m[0] for m in members), max(m[1] for m in members)
+            messages.append(f"冲突：{field}{name}在{day}{start // 60:02d}:{start % 60:02d}~"
+                            f"{end // 60:02d}:{end % 60:02d}有{len(members)}门课程时间重叠")
+    return sorted(messages)
+
+def test_overlapping_times_in_different_periods_conflict():
+    courses = [
+        {"课程名称": "语文", "教师": "张老师", "星期": "周一", "节次": 1, "开始时间": "08:00", "结束时间": "09:00"},
+        {"课程名称": "数学", "教师": "张老师", "星期": "周一", "节次": 2, "开始时间": "08:30", "结束时间": "09:15"},
+        # Touching is not overlapping
+        {"课程名称": "英语", "教师": "张老师", "星期": "周一", "节次": 3, "开始时间": "09:15", "结束时间": "10:00"}
+    ]
+    assert detect_conflicts(courses) == []
+    assert detect_conflicts(courses, 'time') == ["冲突：教师张老师在周一08:00~09:15有2门课程时间重叠"]
+
+def test_all_mode_does_not_report_a_same_slot_clash_twice():
+    courses = [
+        {"课程名称": "语文", "班级": "1班", "星期": "周二", "节次": 1, "开始时间": "08:00", "结束时间": "08:45"},
+        {"课程名称": "数学", "班级": "1班", "星期": "周二", "节次": 1, "开始时间": "08:00", "结束时间": "08:45"}
+    ]
+    assert detect_conflicts(courses, 'all') == ["冲突：班级1班在周二1节有2门课程"]
+
+@pytest.mark.parametrize('seed', range(20))
+def test_time_overlaps_match_brute_force(seed):
+    rng = random.Random(seed)
+    courses = [_random_course(rng, with_times=True) for _ in range(40)]
+    assert sorted(detect_conflicts(courses, 'time')) == brute_time_overlaps(courses)
+    assert sorted(detect_conflicts(courses, 'all')) == \
+        sorted(brute_slot_conflicts(courses) + brute_time_overlaps(courses, skip_same_slot=True))
+
+def _grid():
+    from services.conflict_service import GRID_DAYS, PERIODS_PER_DAY
+    return [(day, period) for day in GRID_DAYS for period in range(1, PERIODS_PER_DAY + 1)]
+
+@pytest.mark.parametrize('seed', range(10))
+def test_free_slots_and_utilisation_match_brute_force(seed):
+    rng = random.Random(seed)
+    index = ConflictIndex()
+    stored = {}
+    for step in range(80):
+        if rng.random() < 0.7 or not stored:
+            stored[step] = _random_course(rng)
+            index.add(step, stored[step])
+        else:
+            key = rng.choice(list(stored))
+            index.remove(key)
+            del stored[key]
+
+    def busy(field, name):
+        return {(course["星期"], int(course["节次"])) for course in stored.values() if _named(course, field) == name}
+
+    for resources in ({"教师": "张老师"}, {"教师": "李老师", "班级": "1班"},
+                      {"教师": "王老师", "班级": "2班", "地点": "101"}, {}):
+        taken = set().union(*[busy(field, name) for field, name in resources.items()])
+        assert index.free_slots(resources) == [slot for slot in _grid() if slot not in taken]
+
+    for field in CONFLICT_RESOURCES:
+        names = {_named(course, field) for course in stored.values()} - {None}
+        expected = sorted((name, len(busy(field, name))) for name in names)
+        assert sorted((row["name"], row["occupied"]) for row in index.utilisation(field)) == expected
+
+def test_free_slots_ignore_courses_outside_the_grid():
+    index = ConflictIndex([
+        {"课程名称": "早读", "教师": "赵老师", "星期": "周一", "节次": 13},
+        {"课程名称": "语文", "教师": "赵老师", "星期": "星期八", "节次": 1},
+        {"课程名称": "数学", "教师": "赵老师", "星期": "周日", "节次": 12}
+    ])
+    free = index.free_slots({"教师": "赵老师"})
+    assert len(free) == len(_grid()) - 1
+    assert ("周日", 12) not in free
+
+def test_free_slots_route(client):
+    course = {"课程名称": "化学", "教师": "空闲测试老师", "班级": "空闲测试班", "星期": "周三", "节次": 5}
+    assert client.post('/api/courses', json=course).status_code == 200
+    free = client.get('/api/occupancy/free', query_string={"teacher": "空闲测试老师"}).get_json()["free_slots"]
+    assert {"星期": "周三", "节次": 5} not in free
+    assert len(free) == len(_grid()) - 1
@@ -0,0 +1,50 @@
+import pytest
+from services.course_record import CourseRecord, bucket_by_slot, to_records
+
+def test_partial_and_malformed_courses_are_normalised():
+    empty, partial, odd = to_records([
+        {},
+        {"课程名称": "语文", "星期": "周一", "节次": "3", "教师": None, "未知字段": 1},
+        {"课程名称": 42, "节次": "第一节", "id": 7}
+    ])
+    assert (empty.name, empty.teacher, empty.day, empty.period, empty.notes, empty.id) == ('', '', '', '', '', None)
+    # Periods given as text are converted, missing fields are empty strings
+    assert (partial.name, partial.day, partial.period, partial.teacher, partial.location) == ("语文", "周一", 3, '', '')
+    assert partial.get("未知字段") is None and partial.get("未知字段", "默认") == "默认"
+    assert partial.get("节次") == 3 and partial.get("教师") == ''
+    # Values that are not strings or periods that are not numbers are kept as they are
+    assert (odd.name, odd.period, odd.get("id")) == (42, "第一节", 7)
+    with pytest.raises(AttributeError):
+        partial.extra = 1
+
+def test_records_pass_through_and_names_are_shared():
+    record = CourseRecord({"课程名称": "数学"})
+    first, second = to_records([record, {"教师": "".join(["王", "老师"])}])
+    assert first is record
+    assert second.teacher is to_records([{"教师": "王老" + "师"}])[0].teacher
+
+def test_cell_text():
+    assert CourseRecord({"课程名称": "语文", "教师": "未指定", "地点": "未指定"}).cell_text() == "语文"
+    assert CourseRecord({"课程名称": "语文", "教师": "王老师", "地点": "101", "开始时间": "08:00",
+                         "结束时间": "08:45", "备注": "单周"}).cell_text() == \
+        "语文\n教师：王老师\n地点：101\n时间：08:00~08:45\n备注：单周"
+    # A start time alone is not shown
+    assert CourseRecord({"课程名称": "语文", "开始时间": "08:00"}).cell_text() == "语文"
+
+def test_bucket_by_slot():
+    records = to_records([
+        {"课程名称": "语文", "星期": "周一", "节次": 1},
+        {"课程名称": "数学", "星期": "周二", "节次": "1"},
+        {"课程名称": "英语", "星期": "周一", "节次": "1"},
+        {"课程名称": "无星期", "节次": 2},
+        {"课程名称": "无节次", "星期": "周三"},
+        {"课程名称": "第零节", "星期": "周三", "节次": 0},
+        {"课程名称": "物理", "星期": "周一", "节次": 1}
+    ])
+    buckets = bucket_by_slot(records)
+    # Slots without a day or period are skipped, input order is kept within a slot
+    assert {slot: [record.name for record in group] for slot, group in buckets.items()} == {
+        ("周一", 1): ["语文", "英语", "物理"],
+        ("周二", 1): ["数学"]
+    }
+    assert bucket_by_slot([]) == {}
@@ -0,0 +1,11 @@
+def test_unparsable_period_is_rejected(client):
+    response = client.get('/api/courses', query_string={'period': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+def test_period_filter(client):
+    course = {"课程名称": "物理", "教师": "周期测试", "班级": "1班", "地点": "101", "星期": "周二", "节次": 3}
+    assert client.post('/api/courses', json=course).status_code in (200, 201)
+    matched = client.get('/api/courses', query_string={'teacher': '周期测试', 'period': '3'}).get_json()
+    assert [c["课程名称"] for c in matched] == ["物理"]
+    assert client.get('/api/courses', query_string={'teacher': '周期测试', 'period': '4'}).get_json() == []
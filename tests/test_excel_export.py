@@ -0,0 +1,83 @@
+from io import BytesIO
+from openpyxl import load_workbook
+from services.color_service import allocate_colors, color_hex
+from services.excel_export_service import SKELETON, TEMPLATE_STYLES, ExcelExportService
+
+COURSES = [
+    {"课程名称": "语文", "教师": "王老师", "地点": "101", "星期": "周一", "节次": 1},
+    {"课程名称": "数学", "星期": "周一", "节次": 1},
+    {"课程名称": "英语", "教师": "李老师", "星期": "周三", "节次": "6"},
+    {"课程名称": "自习", "星期": "周日", "节次": 12}
+]
+USER_COLORS = {"英语": [10, 20, 30]}
+# Course slot -> cell of the template
+CELLS = {("周一", 1): "B4", ("周三", 6): "D10", ("周日", 12): "H17"}
+MERGES = {"A1:H1", "A3:H3", "A8:H8", "A13:H13"}
+
+def _fill(cell):
+    return cell.fill.fgColor.rgb[-6:] if cell.fill.fill_type == "solid" else None
+
+def _check_timetable(ws, title, courses, user_colors=None):
+    """Check one sheet against the template: merges, named styles, texts and course fills"""
+    assert {str(merged) for merged in ws.merged_cells.ranges} == MERGES
+    assert (ws.max_row, ws.max_column) == (17, 8)
+    assert ws["A1"].value == title
+    assert [cell.value for cell in ws[2]] == ['节次/星期', '星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
+    assert [ws[f"A{row}"].value for row in (3, 8, 13)] == ['上午', '下午', '晚自习']
+    assert ws["A14"].value == '第9节'
+    for row, col, value, style in SKELETON['cells']:
+        assert ws.cell(row=row, column=col).style == style
+
+    colors = allocate_colors([course["课程名称"] for course in courses], user_colors)
+    filled = {}
+    for row, col, slot in SKELETON['slots']:
+        cell = ws.cell(row=row, column=col)
+        if cell.value:
+            filled[cell.coordinate] = cell
+            assert cell.style == 'timetable_course'
+            assert cell.alignment.wrap_text
+        else:
+            assert cell.style == 'timetable_empty' and _fill(cell) is None
+    slots = {}
+    for course in courses:
+        slots.setdefault(CELLS[course["星期"], int(course["节次"])], []).append(course)
+    assert set(filled) == set(slots)
+    for coordinate, placed in slots.items():
+        assert filled[coordinate].value.split('\n')[0] == placed[0]["课程名称"]
+        assert _fill(filled[coordinate]) == color_hex(colors[placed[0]["课程名称"]])
+    assert ws.row_dimensions[3].height == 25 and ws.row_dimensions[4].height == 60
+
+def test_excel_export_layout():
+    output, filename = ExcelExportService().create_excel_export(
+        {"courses": COURSES, "title": "一年级课程表", "userSelectedColors": USER_COLORS})
+    assert filename == "一年级课程表.xlsx"
+    wb = load_workbook(BytesIO(output.getvalue()))
+    assert wb.sheetnames == ["一年级课程表"]
+    assert set(TEMPLATE_STYLES) <= set(wb.named_styles)
+    ws = wb.active
+    _check_timetable(ws, "一年级课程表", COURSES, USER_COLORS)
+    assert ws["B4"].value == "语文\n教师：王老师\n地点：101\n数学"
+    assert _fill(ws["D10"]) == "0A141E"
+
+def test_streamed_workbook_sheets():
+    second = [{"课程名称": "物理", "教师": "赵老师", "星期": "周三", "节次": 6},
+              {"课程名称": "化学", "星期": "周一", "节次": 1}]
+    sheets = [("一班", COURSES, "一班课程表"), ("二班", second, "二班课程表"), ("空班", [], "空班课程表")]
+    chunks = list(ExcelExportService().iter_excel_stream(iter(sheets), chunk_size=4096, user_selected_colors=USER_COLORS))
+    assert len(chunks) > 1 and all(len(chunk) <= 4096 for chunk in chunks)
+
+    wb = load_workbook(BytesIO(b''.join(chunks)))
+    assert wb.sheetnames == ["一班", "二班", "空班"]
+    assert set(TEMPLATE_STYLES) <= set(wb.named_styles)
+    for (name, courses, title), ws in zip(sheets, wb.worksheets):
+        _check_timetable(ws, title, courses, USER_COLORS)
+    # Streamed cells read back like the ones of a regular export
+    regular = load_workbook(ExcelExportService().create_excel_export(
+        {"courses": COURSES, "title": "一班课程表", "userSelectedColors": USER_COLORS})[0]).active
+    streamed = wb["一班"]
+    for row in range(1, 18):
+        for col in range(1, 9):
+            expected, actual = regular.cell(row=row, column=col), streamed.cell(row=row, column=col)
+            assert (actual.value or None, actual.style, _fill(actual)) == (expected.value or None, expected.style, _fill(expected))
+    assert {column: streamed.column_dimensions[column].width for column in "ABCDEFGH"} == \
+        {column: regular.column_dimensions[column].width for column in "ABCDEFGH"}
@@ -0,0 +1,52 @@
+from services import export_cache_service
+from services.export_cache_service import ExportCache
+
+def test_evicted_entries_are_written_without_the_lock(tmp_path, monkeypatch):
+    cache = ExportCache(max_entries=1, max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    locked = []
+    replace = export_cache_service.os.replace
+
+    def checked_replace(source, target):
+        locked.append(cache.lock.locked())
+        replace(source, target)
+
+    monkeypatch.setattr(export_cache_service.os, 'replace', checked_replace)
+    cache.put('a', b'first')
+    cache.put('b', b'second')
+    assert locked == [False]
+    assert (tmp_path / 'a.bin').read_bytes() == b'first'
+    assert cache.stats()["disk_entries"] == 1
+    # Read back from disk into memory, which spills b
+    assert cache.get('a') == b'first'
+    assert locked == [False, False]
+    assert cache.get('b') == b'second'
+
+def test_entry_being_spilled_is_still_served(tmp_path, monkeypatch):
+    cache = ExportCache(max_entries=1, max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    served = []
+    replace = export_cache_service.os.replace
+
+    def slow_replace(source, target):
+        # Another request asks for the entry while its file is being written
+        served.append(cache.get('a'))
+        replace(source, target)
+
+    monkeypatch.setattr(export_cache_service.os, 'replace', slow_replace)
+    cache.put('a', b'first')
+    cache.put('b', b'second')
+    assert served[0] == b'first'
+
+def test_disk_limit_removes_oldest_files(tmp_path):
+    cache = ExportCache(max_entries=1, max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=10)
+    for key in 'abc':
+        cache.put(key, b'x' * 6)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['b.bin']
+    assert cache.stats()["disk_bytes"] == 6
+
+def test_missing_spilled_file_is_forgotten(tmp_path):
+    cache = ExportCache(max_entries=1, max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    cache.put('a', b'first')
+    cache.put('b', b'second')
+    (tmp_path / 'a.bin').unlink()
+    assert cache.get('a') is None
+    assert cache.stats()["disk_entries"] == 0
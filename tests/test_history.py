@@ -0,0 +1,91 @@
+TEACHER = "历史测试老师"
+
+def _revision(client):
+    return int(client.get('/api/courses').headers['X-Schedule-Revision'])
+
+def _course(name, period, location="101"):
+    return {"课程名称": name, "教师": TEACHER, "班级": "历史1班", "地点": location, "星期": "周五", "节次": period}
+
+def _stored(client):
+    courses = client.get('/api/courses', query_string={'teacher': TEACHER}).get_json()
+    return {course['id']: course for course in courses}
+
+def _edit(client):
+    """Create 语文/数学/英语, then change, move and delete one each and add 物理: (before, after, ids)"""
+    ids = [client.post('/api/courses', json=_course(name, period)).get_json()["id"]
+           for name, period in (("语文", 1), ("数学", 2), ("英语", 3))]
+    before = _revision(client)
+    client.put(f'/api/courses/{ids[0]}', json=_course("语文", 1, "202"))
+    client.put(f'/api/courses/{ids[1]}', json=_course("数学", 4))
+    client.delete(f'/api/courses/{ids[2]}')
+    ids.append(client.post('/api/courses', json=_course("物理", 5)).get_json()["id"])
+    return before, _revision(client), ids
+
+def test_diff_across_add_update_delete(client):
+    before, after, (chinese, maths, english, physics) = _edit(client)
+    assert after == before + 4
+
+    diff = client.get('/api/history/diff', query_string={'from': before, 'to': after}).get_json()
+    assert (diff["from"], diff["to"]) == (before, after)
+    assert [course["id"] for course in diff["added"]] == [physics]
+    assert [course["id"] for course in diff["removed"]] == [english]
+    assert diff["removed"][0]["课程名称"] == "英语"
+    assert [(move["id"], move["from"], move["to"]) for move in diff["moved"]] == [
+        (maths, {"星期": "周五", "节次": 2}, {"星期": "周五", "节次": 4})
+    ]
+    assert [(change["id"], change["before"]["地点"], change["after"]["地点"]) for change in diff["changed"]] == [
+        (chinese, "101", "202")
+    ]
+    assert diff["by_teacher"] == {TEACHER: {"added": 1, "removed": 1, "moved": 1, "changed": 1}}
+
+    # Without to the diff runs to the current revision, an unchanged range is empty
+    assert client.get('/api/history/diff', query_string={'from': before}).get_json()["to"] == after
+    empty = client.get('/api/history/diff', query_string={'from': after, 'to': after}).get_json()
+    assert empty["added"] == empty["removed"] == empty["moved"] == empty["changed"] == []
+
+    history = client.get('/api/history', query_string={'limit': 4}).get_json()
+    assert history["revision"] == after
+    assert [entry["revision"] for entry in history["revisions"]] == [after, after - 1, after - 2, after - 3]
+    assert [(entry["inserted"], entry["updated"], entry["deleted"]) for entry in history["revisions"]] == [
+        (1, 0, 0), (0, 0, 1), (0, 1, 0), (0, 1, 0)
+    ]
+    older = client.get('/api/history', query_string={'limit': 1, 'before': after - 3}).get_json()
+    assert [entry["revision"] for entry in older["revisions"]] == [after - 4]
+
+def test_revert_to_an_old_revision(client):
+    before, after, (chinese, maths, english, physics) = _edit(client)
+    snapshot = {course["id"]: course for course in
+                client.get('/api/courses', query_string={'revision': before}).get_json()
+                if course.get("教师") == TEACHER}
+    assert {chinese, maths, english} <= set(snapshot) and physics not in snapshot
+
+    response = client.post('/api/history/revert', json={"revision": before})
+    result = response.get_json()
+    assert response.status_code == 200 and result["success"] is True
+    assert result["revision"] == after + 1 == _revision(client)
+    # The deleted course comes back with its id, the added one is gone
+    assert _stored(client) == snapshot
+
+    diff = client.get('/api/history/diff', query_string={'from': before}).get_json()
+    assert diff["added"] == diff["removed"] == diff["moved"] == diff["changed"] == []
+
+    # Reverting to the same content writes no revision
+    again = client.post('/api/history/revert', json={"revision": before}).get_json()
+    assert again["success"] is True and again["revision"] == after + 1 == _revision(client)
+
+def test_unknown_revisions_are_rejected(client):
+    current = _revision(client)
+    for response in (
+        client.get('/api/history/diff', query_string={'from': current + 100}),
+        client.get('/api/history/diff', query_string={'from': 0, 'to': current + 100}),
+        client.get('/api/history/diff', query_string={'from': current, 'to': 0}),
+        client.get('/api/history/diff', query_string={'from': 'abc'}),
+        client.get('/api/history/diff'),
+        client.get('/api/courses', query_string={'revision': current + 100}),
+        client.post('/api/history/revert', json={"revision": current + 100}),
+        client.post('/api/history/revert', json={"revision": -1}),
+        client.post('/api/history/revert', json={})
+    ):
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
+    assert _revision(client) == current
@@ -0,0 +1,35 @@
+import pytest
+from services import image_export_service
+from services.export_cache_service import export_cache
+
+COURSES = [{'课程名称': '语文', '教师': '王老师', '班级': '1班', '地点': '101', '星期': '周一', '节次': 1}]
+
+@pytest.fixture
+def no_font(monkeypatch):
+    monkeypatch.setattr(image_export_service, '_font_path', lambda: None)
+    image_export_service.load_font.cache_clear()
+    image_export_service.get_layout.cache_clear()
+    yield
+    image_export_service.load_font.cache_clear()
+    image_export_service.get_layout.cache_clear()
+
+@pytest.mark.parametrize('url', ['/api/export/image', '/api/export/print'])
+def test_export_without_font_is_unavailable_and_not_cached(client, no_font, url):
+    entries = len(export_cache.entries)
+    response = client.post(url, json={'courses': COURSES, 'title': '课程表'})
+    assert response.status_code == 503
+    assert 'SCHEDULE_FONT_PATH' in response.json['message']
+    assert len(export_cache.entries) == entries
+
+def test_batch_and_job_exports_without_font_are_unavailable(client, no_font):
+    response = client.post('/api/export/batch', json={'courses': COURSES, 'format': 'png', 'group_by': 'class'})
+    assert response.status_code == 503
+    response = client.post('/api/export/jobs', json={'type': 'pdf', 'courses': COURSES})
+    assert response.status_code == 503
+
+def test_tracking_only_request_does_not_need_a_font(client, no_font):
+    assert client.post('/api/export/image', json={}).status_code == 200
+
+def test_font_is_part_of_the_cache_key():
+    data = {'courses': COURSES, 'title': '课程表'}
+    assert export_cache.make_key('png', data, 'a.ttc:1:1') != export_cache.make_key('png', data, 'b.ttc:1:1')
@@ -0,0 +1,74 @@
+import io
+import pytest
+from services.conflict_service import detect_conflicts
+from services.excel_export_service import ExcelExportService
+from services.import_service import ExcelImportService
+
+COURSES = [
+    {"课程名称": "数学", "教师": "张老师", "班级": "高一1班", "地点": "101", "星期": "周一", "节次": 1},
+    {"课程名称": "语文", "教师": "李老师", "班级": "高一1班", "地点": "102", "星期": "周三", "节次": 4},
+    {"课程名称": "数学", "教师": "张老师", "班级": "高一2班", "地点": "101", "星期": "周二", "节次": 2},
+    {"课程名称": "英语", "教师": "王老师", "班级": "高一2班", "地点": "103", "星期": "周一", "节次": 1}
+]
+
+FIELDS = ("课程名称", "教师", "地点", "星期", "节次")
+
+def _workbook(*sheet_names):
+    sheets = [(name, COURSES[:2], "高一1班课程表") for name in sheet_names]
+    return io.BytesIO(b''.join(ExcelExportService().iter_excel_stream(sheets)))
+
+def _parse(content, sheet_as=None):
+    courses, _ = ExcelImportService().parse_workbook(content, sheet_as)
+    return courses
+
+def _parsed(content, sheet_as=None):
+    return sorted((course["课程名称"], course["教师"], course.get("班级")) for course in _parse(content, sheet_as))
+
+def _key(course, fields=FIELDS):
+    return tuple(course.get(field) for field in fields)
+
+def test_sheet_name_is_not_used_by_default():
+    assert _parsed(_workbook("高一1班")) == [("数学", "张老师", None), ("语文", "李老师", None)]
+
+def test_sheet_name_as_class():
+    assert _parsed(_workbook("高一1班"), 'class') == [("数学", "张老师", "高一1班"), ("语文", "李老师", "高一1班")]
+
+def test_sheet_name_as_teacher_keeps_cell_teacher():
+    assert _parsed(_workbook("王老师"), 'teacher') == [("数学", "张老师", None), ("语文", "李老师", None)]
+
+def test_default_sheet_name_is_never_used():
+    assert _parsed(_workbook("Sheet1"), 'class') == [("数学", "张老师", None), ("语文", "李老师", None)]
+
+def test_unknown_sheet_as_is_rejected():
+    with pytest.raises(ValueError):
+        _parse(_workbook("高一1班"), 'room')
+
+def test_round_trip_of_a_single_export(client):
+    response = client.post('/api/export/excel', json={"courses": COURSES, "title": "课程表"})
+    assert response.status_code == 200
+    imported = _parse(io.BytesIO(response.data))
+    assert sorted(map(_key, imported)) == sorted(map(_key, COURSES))
+    # No class is invented from the sheet title, so the import adds no conflicts
+    assert all("班级" not in course for course in imported)
+    assert detect_conflicts(imported) == detect_conflicts([{f: c[f] for f in FIELDS} for c in COURSES])
+
+@pytest.mark.parametrize('group_by, sheet_as, field', [('class', 'class', '班级'), ('teacher', 'teacher', '教师')])
+def test_round_trip_of_a_grouped_workbook(client, group_by, sheet_as, field):
+    response = client.post('/api/export/batch', json={
+        "courses": COURSES, "title": "全校课程表", "format": "excel", "group_by": group_by, "mode": "workbook"
+    })
+    assert response.status_code == 200
+    imported = _parse(io.BytesIO(response.data), sheet_as)
+    assert sorted(_key(course, FIELDS + (field,)) for course in imported) == \
+        sorted(_key(course, FIELDS + (field,)) for course in COURSES)
+    if group_by == 'teacher':
+        # Teacher sheets never end up as classes
+        assert all("班级" not in course for course in imported)
+
+def test_upload_with_sheet_as_fills_class(client):
+    response = client.post('/api/import', data={"file": (_workbook("导入测试班"), "timetable.xlsx"), "sheet_as": "class"},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()["imported"] == 2
+    imported = client.get('/api/courses', query_string={'class': '导入测试班'}).get_json()
+    assert sorted(course["课程名称"] for course in imported) == ["数学", "语文"]
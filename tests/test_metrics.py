@@ -0,0 +1,44 @@
+import os
+import pytest
+from services.metrics_service import MetricsRegistry
+
+def _sample(text, line_start):
+    return [line for line in text.splitlines() if line.startswith(line_start)]
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_workers_are_aggregated(tmp_path):
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: [
+        ('test_hits_total', 'counter', 'Hits', {}, 2),
+        ('test_entries', 'gauge', 'Entries', {}, 1)
+    ])
+    registry.enable_multiprocess(str(tmp_path))
+    pids = []
+    for _ in range(2):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                registry.observe_phase('worker', 0)
+                registry.observe_phase('worker', 0)
+                registry.sync()
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        assert os.waitpid(pid, 0)[1] == 0
+
+    text = registry.render()
+    assert _sample(text, 'schedule_phase_duration_seconds_count{phase="worker"}') == \
+        ['schedule_phase_duration_seconds_count{phase="worker"} 4']
+    # Master and both workers, exited workers still count
+    assert _sample(text, 'test_hits_total') == ['test_hits_total 6']
+    # Gauges of exited workers are dropped, the live process is labelled
+    assert _sample(text, 'test_entries{') == [f'test_entries{{worker="{os.getpid()}"}} 1']
+
+def test_single_process_has_no_worker_label():
+    registry = MetricsRegistry()
+    registry.register_collector(lambda: [('test_entries', 'gauge', 'Entries', {}, 1)])
+    registry.observe_phase('solo', 0)
+    text = registry.render()
+    assert 'schedule_phase_duration_seconds_count{phase="solo"} 1' in text
+    assert 'test_entries 1' in text
@@ -0,0 +1,59 @@
+import pytest
+
+MISSING_NAME = [{"课程名称": "数学", "教师": "张老师", "班级": "1班", "周课时": 1},
+                {"教师": "李老师", "班级": "1班", "周课时": 1}]
+
+@pytest.mark.parametrize('options', [{}, {"workers": 2}, {"stream": True}])
+def test_requirement_without_course_name_is_rejected(client, options):
+    response = client.post('/api/schedule/solve', json=dict(requirements=MISSING_NAME, **options))
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "第2条排课需求缺少课程名称"
+
+def _solve(requirements, fixed_courses=None):
+    from services.solver_service import TimetableSolver
+    return TimetableSolver(requirements, fixed_courses=fixed_courses, time_limit=5, seed=1).solve()
+
+def test_lesson_without_free_slot_is_reported_without_searching():
+    fixed = [{"课程名称": "班会", "教师": "张老师", "班级": "9班", "星期": day, "节次": period}
+             for day in ("周一", "周二") for period in (1, 2)]
+    result = _solve([
+        {"课程名称": "数学", "教师": "张老师", "班级": "1班", "周课时": 1, "可选星期": ["周一", "周二"], "可选节次": [1, 2]},
+        {"课程名称": "语文", "教师": "李老师", "班级": "1班", "周课时": 3}
+    ], fixed)
+    assert [requirement["课程名称"] for requirement in result["unplaced"]] == ["数学"]
+    assert result["stats"]["placed"] == 3
+    assert result["stats"]["elapsed_ms"] < 1000
+
+def test_overbooked_teacher_stops_at_the_unavoidable_surplus():
+    result = _solve([
+        {"课程名称": "数学", "教师": "张老师", "班级": f"{index}班", "周课时": 1, "可选星期": ["周一"], "可选节次": [1, 2, 3]}
+        for index in range(4)
+    ])
+    assert result["stats"]["placed"] == 3
+    assert result["stats"]["unplaced"] == 1
+    assert result["stats"]["elapsed_ms"] < 1000
+
+def _triangle(group):
+    """Three lessons sharing a resource pairwise with two slots: infeasible, but no resource is overbooked"""
+    slots = {"可选星期": ["周一"], "可选节次": [1, 2]}
+    return [
+        dict(slots, 课程名称="数学", 教师=f"T{group}", 班级=f"C{group}"),
+        dict(slots, 课程名称="语文", 教师=f"T{group}", 地点=f"R{group}"),
+        dict(slots, 课程名称="英语", 班级=f"C{group}", 地点=f"R{group}")
+    ]
+
+def test_portfolio_keeps_to_the_time_limit():
+    from services.solver_service import solve_portfolio
+    requirements = [requirement for group in range(4) for requirement in _triangle(group)]
+    result = solve_portfolio(requirements, time_limit=1, seed=1, workers=2)
+    assert result["stats"]["searches"] == 2
+    assert result["stats"]["unplaced"] == 4
+    assert result["stats"]["elapsed_ms"] < 1800
+
+@pytest.mark.parametrize('workers', [0, -1, "2", 1.5, True])
+def test_invalid_workers_are_rejected_before_streaming(client, workers):
+    response = client.post('/api/schedule/solve', json={
+        "requirements": MISSING_NAME[:1], "workers": workers, "stream": True
+    })
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "并行进程数必须是正整数"
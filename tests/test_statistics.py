@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+from datetime import datetime, timezone
+from threading import Thread
+import pytest
+from services.statistics_service import StatisticsService, fcntl
+
+def test_range_accepts_timezone_aware_bounds(client):
+    response = client.get('/api/statistics', query_string={
+        'from': '2026-10-18T00:00:00+08:00', 'to': '2026-10-20T00:00:00Z', 'bucket': 'day'
+    })
+    assert response.status_code == 200
+    result = response.get_json()["range"]
+    local = lambda *args: datetime(*args, tzinfo=timezone.utc).astimezone().replace(tzinfo=None).isoformat()
+    assert result["from"] == local(2026, 10, 17, 16)
+    assert result["to"] == local(2026, 10, 20)
+
+def test_range_mixing_aware_and_naive_bounds(client):
+    response = client.get('/api/statistics', query_string={
+        'from': '2026-10-18T00:00:00+08:00', 'to': '2026-10-19T00:00:00', 'bucket': 'hour'
+    })
+    assert response.status_code == 200
+
+def test_range_rejects_bad_time(client):
+    response = client.get('/api/statistics', query_string={'from': 'yesterday'})
+    assert response.status_code == 400
+
+def _track_and_flush(stats_file, event_log, count):
+    service = StatisticsService(stats_file, event_log, flush_interval=3600, flush_size=10 ** 6)
+    # Compact every few flushes so loads and flushes race with compaction too
+    service.max_log_bytes = 2048
+    recorder = Thread(target=lambda: [service.track_export('excel') for _ in range(count)])
+    recorder.start()
+    while recorder.is_alive():
+        service.flush()
+    recorder.join()
+    service.flush()
+
+@pytest.mark.skipif(fcntl is None, reason='needs flock()')
+def test_concurrent_workers_do_not_lose_counts(tmp_path):
+    stats_file, event_log = str(tmp_path / 'statistics.json'), str(tmp_path / 'events.ndjson')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_track_and_flush, args=(stats_file, event_log, 500)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    stats = StatisticsService(stats_file, event_log).get_stats()
+    assert stats["export_stats"]["excel"] == 1000
+    with open(stats_file, encoding='utf-8') as f:
+        day_counts = json.load(f)["rollups"]["day"].values()
+    assert sum(counts.get("export_excel", 0) for counts in day_counts) == 1000
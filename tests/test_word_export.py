@@ -0,0 +1,77 @@
+from io import BytesIO
+from docx import Document
+from docx.oxml.ns import qn
+from services.color_service import allocate_colors, color_hex
+from services.word_export_service import DAYS, PERIOD_BANDS, WordExportService
+
+COURSES = [
+    {"课程名称": "语文", "教师": "王老师", "地点": "101", "星期": "周一", "节次": 1,
+     "开始时间": "08:00", "结束时间": "08:45"},
+    {"课程名称": "数学", "教师": "未指定", "星期": "周一", "节次": 1},
+    {"课程名称": "英语", "教师": "李老师", "备注": "单周\t<带>&符号", "星期": "周三", "节次": "6"},
+    {"课程名称": "自习", "星期": "周日", "节次": 12},
+    # Without a slot, not placed
+    {"课程名称": "体育", "星期": "", "节次": 2}
+]
+USER_COLORS = {"英语": "10,20,30"}
+
+def _fill(cell):
+    shading = cell._tc.tcPr.find(qn('w:shd'))
+    return None if shading is None else shading.get(qn('w:fill'))
+
+def _export(courses=COURSES, title="一年级课程表"):
+    output, filename = WordExportService().create_word_export(
+        {"courses": courses, "title": title, "userSelectedColors": USER_COLORS})
+    return Document(BytesIO(output.getvalue())), filename
+
+def test_document_opens_with_the_timetable():
+    document, filename = _export()
+    assert filename == "一年级课程表.docx"
+    assert document.paragraphs[0].text == "一年级课程表"
+    assert document.paragraphs[0].style.name == "Title"
+
+    [table] = document.tables
+    # Header, then per band its label row and its periods
+    assert len(table.rows) == 1 + sum(1 + count for _, _, count in PERIOD_BANDS) == 16
+    assert len(table.columns) == 8
+    assert [cell.text for cell in table.rows[0].cells] == ['节次/星期'] + [day for day, _ in DAYS]
+
+    row = 1
+    grid = {}
+    for label, first, count in PERIOD_BANDS:
+        # Band labels span the whole row
+        assert [cell.text for cell in table.rows[row].cells] == [label] * 8
+        assert len(table.rows[row]._tr.tc_lst) == 1
+        for period in range(first, first + count):
+            cells = table.rows[row + 1 + period - first].cells
+            assert cells[0].text == f'第{period}节'
+            for (_, day), cell in zip(DAYS, cells[1:]):
+                grid[day, period] = cell
+        row += 1 + count
+
+    colors = allocate_colors([course["课程名称"] for course in COURSES], USER_COLORS)
+    filled = {key: cell for key, cell in grid.items() if cell.text}
+    assert set(filled) == {("周一", 1), ("周三", 6), ("周日", 12)}
+    # Courses of one slot share the cell, which takes the colour of the first
+    assert filled["周一", 1].text == "语文\n教师：王老师\n地点：101\n时间：08:00~08:45\n数学"
+    assert _fill(filled["周一", 1]) == color_hex(colors["语文"])
+    assert filled["周三", 6].text == "英语\n教师：李老师\n备注：单周\t<带>&符号"
+    assert _fill(filled["周三", 6]) == "0A141E"
+    assert filled["周日", 12].text == "自习"
+    assert _fill(filled["周日", 12]) == color_hex(colors["自习"])
+    assert all(_fill(cell) is None for key, cell in grid.items() if key not in filled)
+
+def test_document_matches_python_docx_output():
+    """The hand-written XML reads back like a table python-docx built itself"""
+    document, _ = _export([{"课程名称": "化学\x01", "星期": "周五", "节次": 9}], title="")
+    assert document.paragraphs[0].text == ""
+    cell = document.tables[0].rows[12].cells[5]
+    assert cell.text == "化学"
+    assert cell.paragraphs[0].alignment == 1
+    assert document.tables[0].style.name == "Table Grid"
+    # The document survives a python-docx save and reload unchanged
+    saved = BytesIO()
+    document.save(saved)
+    reloaded = Document(saved)
+    assert [[cell.text for cell in row.cells] for row in reloaded.tables[0].rows] == \
+        [[cell.text for cell in row.cells] for row in document.tables[0].rows]